@@ -1,5 +1,5 @@
 from dateutil.relativedelta import relativedelta
-from django.db.models import F
+from django.db.models import F, Count
 from django.utils import timezone
 from django_filters import MultipleChoiceFilter, ModelMultipleChoiceFilter
 from django_filters.constants import EMPTY_VALUES
@@ -66,6 +66,38 @@ class ModelMultipleChoiceCommaSeparatedIdFilter(CSVWidgetFilterMixin, ModelMulti
         return super().filter(qs, [o.id if not isinstance(o, int) else o for o in value])
 
 
+class ModelMultipleChoiceCommaSeparatedAllFilter(ModelMultipleChoiceCommaSeparatedFilter):
+    """
+    Все значения сразу (как `conjoined=True`), но одним подзапросом
+    `GROUP BY pk HAVING COUNT(DISTINCT field) = N` вместо JOIN на каждое значение
+    """
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        ids = {o.pk if hasattr(o, 'pk') else o for o in value}
+        return qs.filter(pk__in=qs.model._default_manager.filter(**{
+            f'{self.field_name}__in': ids
+        }).order_by().values('pk').annotate(
+            all_filter_matched_count=Count(self.field_name, distinct=True)
+        ).filter(all_filter_matched_count=len(ids)).values('pk'))
+
+
+class ModelMultipleChoiceCommaSeparatedArrayFilter(ModelMultipleChoiceCommaSeparatedFilter):
+    """
+    Значения в ArrayField одним условием по GIN индексу: `overlap` (ANY, `&&`) или `contains` (ALL, `@>`)
+    """
+
+    def __init__(self, *args, lookup_expr='overlap', **kwargs):
+        super().__init__(*args, lookup_expr=lookup_expr, **kwargs)
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        ids = sorted({o.pk if hasattr(o, 'pk') else o for o in value})
+        return qs.filter(**{f'{self.field_name}__{self.lookup_expr}': ids})
+
+
 class DateRangeWidget(DateRangeWidgetBase):
     suffixes = ['from', 'to']
 
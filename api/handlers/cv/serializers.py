@@ -112,6 +112,14 @@ class CvTimeSlotReadSerializer(CvTimeSlotSerializer):
             'request_requirement_id', 'request_requirement_name', 'request_id', 'request_title',
             'organization_project_id', 'organization_project_name',
         ]
+        fields_prefetch_related = {
+            'request_requirement_id': 'request_requirement_link__request_requirement',
+            'request_requirement_name': 'request_requirement_link__request_requirement',
+            'request_id': 'request_requirement_link__request_requirement__request',
+            'request_title': 'request_requirement_link__request_requirement__request',
+            'organization_project_id': 'request_requirement_link__request_requirement__request__organization_project',
+            'organization_project_name': 'request_requirement_link__request_requirement__request__organization_project',
+        }
 
 
 ########################################################################################################################
@@ -183,6 +191,14 @@ class CvPositionSerializer(CvLinkedObjectBaseSerializer):
         return data
 
 
+class CvPositionCardSerializer(CvPositionSerializer):
+    position = dictionary_serializers.PositionSerializer(read_only=True)
+    competencies = CvPositionCompetenceReadSerializer(many=True, read_only=True)
+
+    class Meta(CvPositionSerializer.Meta):
+        fields = CvPositionSerializer.Meta.fields + ['position', 'competencies']
+
+
 class CvPositionReadSerializer(CvPositionSerializer):
     position = dictionary_serializers.PositionSerializer(read_only=True)
     files = CvPositionFileReadSerializer(read_only=True, many=True)
@@ -474,6 +490,9 @@ class CvDetailReadFullSerializer(CvDetailReadBaseSerializer):
             'contacts', 'time_slots', 'positions', 'career', 'projects', 'education', 'certificates', 'files',
             'rating',
         ]
+        fields_prefetch_related = {
+            'requests_requirements': 'requests_requirements_links__request_requirement',
+        }
 
     def get_fields(self):
         fields = super().get_fields()
@@ -482,6 +501,8 @@ class CvDetailReadFullSerializer(CvDetailReadBaseSerializer):
 
     def to_representation(self, instance: cv_models.CV):
         result = super().to_representation(instance)
+        if 'requests_requirements' not in self.fields:
+            return result
         result['requests_requirements'] = self.get_requests_requirements_serializer_class()(
             [
                 row.request_requirement
@@ -490,6 +511,7 @@ class CvDetailReadFullSerializer(CvDetailReadBaseSerializer):
             many=True,
             read_only=True,
             context=self.context,
+            fields_tree=(self.fields_tree or {}).get('requests_requirements') or None,
         ).data
         return result
 
@@ -542,3 +564,29 @@ class CvInlineShortSerializer(CvDetailReadBaseSerializer):
                 'physical_limitations_ids', 'types_of_employment_ids', 'linked_ids',
             ]
         ]
+
+
+class CvListReadCardSerializer(CvInlineShortSerializer):
+    country = dictionary_serializers.CountrySerializer(read_only=True, allow_null=True)
+    city = dictionary_serializers.CitySerializer(read_only=True, allow_null=True)
+    citizenship = dictionary_serializers.CitizenshipSerializer(read_only=True, allow_null=True)
+    positions = CvPositionCardSerializer(many=True, read_only=True)
+    rating = serializers.IntegerField(source='info.rating', allow_null=True)
+
+    class Meta(CvInlineShortSerializer.Meta):
+        fields = CvInlineShortSerializer.Meta.fields + ['country', 'city', 'citizenship', 'positions', 'rating']
+
+
+class CvFacetValueSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    count = serializers.IntegerField()
+
+
+class CvFacetsSerializer(serializers.Serializer):
+    total = serializers.IntegerField()
+    organization_contractor_id = CvFacetValueSerializer(many=True, required=False)
+    country_id = CvFacetValueSerializer(many=True, required=False)
+    city_id = CvFacetValueSerializer(many=True, required=False)
+    citizenship_id = CvFacetValueSerializer(many=True, required=False)
+    position_id = CvFacetValueSerializer(many=True, required=False)
+    competence_id = CvFacetValueSerializer(many=True, required=False)
@@ -20,14 +20,19 @@ from drf_yasg.utils import swagger_auto_schema, no_body
 from dictionary import models as dictionary_models
 from main import models as main_models
 from cv import models as cv_models
+from cv.services.cv_facets import CvFacetsService
 
 from api.filters import (
     OrderingFilterNullsLast,
     ModelMultipleChoiceCommaSeparatedFilter,
+    ModelMultipleChoiceCommaSeparatedArrayFilter,
     DateRangeWidget, ModelMultipleChoiceCommaSeparatedIdFilter,
 )
 from api.serializers import StatusSerializer
-from api.views import ViewSetFilteredByUserMixin, ReadWriteSerializersMixin
+from api.views import (
+    ViewSetFilteredByUserMixin, ReadWriteSerializersMixin, ViewSetSparseFieldsMixin, ViewSetExportMixin,
+    sparse_fields_parameter,
+)
 from api.backends import FilterBackend
 from api.handlers.cv import serializers as cv_serializers
 
@@ -35,7 +40,7 @@ cv_viewsets_http_method_names = ['get', 'post', 'patch', 'delete']
 cv_linked_filter_cv_field = openapi.Parameter('cv_id', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=False)
 
 
-class CvViewSet(ViewSetFilteredByUserMixin, viewsets.ModelViewSet):
+class CvViewSet(ViewSetExportMixin, ViewSetSparseFieldsMixin, ViewSetFilteredByUserMixin, viewsets.ModelViewSet):
     class Filter(filters.FilterSet):
         id = ModelMultipleChoiceCommaSeparatedIdFilter(queryset=cv_models.CV.objects)
         organization_contractor_id = ModelMultipleChoiceCommaSeparatedFilter(
@@ -43,37 +48,73 @@ class CvViewSet(ViewSetFilteredByUserMixin, viewsets.ModelViewSet):
         country_id = ModelMultipleChoiceCommaSeparatedFilter(queryset=dictionary_models.Country.objects)
         city_id = ModelMultipleChoiceCommaSeparatedFilter(queryset=dictionary_models.City.objects)
         citizenship_id = ModelMultipleChoiceCommaSeparatedFilter(queryset=dictionary_models.Citizenship.objects)
-        positions_ids_any = ModelMultipleChoiceCommaSeparatedFilter(
-            field_name='positions__position_id',
+        positions_ids_any = ModelMultipleChoiceCommaSeparatedArrayFilter(
+            field_name='position_ids',
             queryset=dictionary_models.Position.objects,
         )
-        positions_ids_all = ModelMultipleChoiceCommaSeparatedFilter(
-            field_name='positions__position_id',
-            conjoined=True,
+        positions_ids_all = ModelMultipleChoiceCommaSeparatedArrayFilter(
+            field_name='position_ids',
+            lookup_expr='contains',
             queryset=dictionary_models.Position.objects,
         )
-        competencies_ids_any = ModelMultipleChoiceCommaSeparatedFilter(
-            field_name='positions__competencies__competence_id',
+        competencies_ids_any = ModelMultipleChoiceCommaSeparatedArrayFilter(
+            field_name='competence_ids',
             queryset=dictionary_models.Competence.objects
         )
-        competencies_ids_all = ModelMultipleChoiceCommaSeparatedFilter(
-            field_name='positions__competencies__competence_id',
-            conjoined=True,
+        competencies_ids_all = ModelMultipleChoiceCommaSeparatedArrayFilter(
+            field_name='competence_ids',
+            lookup_expr='contains',
+            queryset=dictionary_models.Competence.objects,
+        )
+        competencies_subtree_any = ModelMultipleChoiceCommaSeparatedFilter(
+            queryset=dictionary_models.Competence.objects,
+            method='filter_competencies_subtree',
+        )
+        competencies_subtree_all = ModelMultipleChoiceCommaSeparatedFilter(
             queryset=dictionary_models.Competence.objects,
+            method='filter_competencies_subtree',
         )
         years = filters.NumberFilter()
+        q = filters.CharFilter()
+        available_from = filters.DateFilter()
+        available_to = filters.DateFilter()
+        rating_from = filters.NumberFilter(field_name='info__rating', lookup_expr='gte')
+        rating_to = filters.NumberFilter(field_name='info__rating', lookup_expr='lte')
         request_id = ModelMultipleChoiceCommaSeparatedIdFilter(
             queryset=main_models.Request.objects,
-            field_name='requests_requirements_links__request_requirement__request_id',
+            method='filter_requests_requirements_links',
         )
         request_requirement_id = ModelMultipleChoiceCommaSeparatedIdFilter(
-            queryset=main_models.Request.objects,
-            field_name='requests_requirements_links__request_requirement_id',
+            queryset=main_models.RequestRequirement.objects,
+            method='filter_requests_requirements_links',
         )
 
+        def filter_requests_requirements_links(self, queryset, name, value):
+            field_name = {
+                'request_id': 'request_requirement__request_id',
+                'request_requirement_id': 'request_requirement_id',
+            }[name]
+            return queryset.filter(id__in=main_models.RequestRequirementCv.objects.filter(**{
+                f'{field_name}__in': [o.id for o in value]
+            }).values('cv_id'))
+
+        def filter_competencies_subtree(self, queryset, name, value):
+            competencies_ids = [competence.id for competence in value]
+            if name == 'competencies_subtree_all':
+                return queryset.filter_by_competencies_subtree_all(competencies_ids)
+            return queryset.filter_by_competencies_subtree_any(competencies_ids)
+
         def filter_queryset(self, queryset):
             if years := self.form.cleaned_data.pop('years'):
                 queryset = queryset.filter_by_position_years(years)
+            if q := self.form.cleaned_data.pop('q'):
+                queryset = queryset.filter_by_search_query(q)
+            available_from = self.form.cleaned_data.pop('available_from')
+            available_to = self.form.cleaned_data.pop('available_to')
+            if available_from and available_to and available_from > available_to:
+                raise ValidationError({'available_to': [_('Дата окончания периода не может быть раньше даты начала')]})
+            if available_from or available_to:
+                queryset = queryset.filter_by_available(available_from, available_to)
             return super().filter_queryset(queryset)
 
     http_method_names = cv_viewsets_http_method_names
@@ -82,26 +123,75 @@ class CvViewSet(ViewSetFilteredByUserMixin, viewsets.ModelViewSet):
     search_fields = ['first_name', 'middle_name', 'last_name', 'positions__title', 'positions__position__name']
     ordering_fields = list(itertools.chain(*[
         [k, f'-{k}']
-        for k in ['id', 'first_name', 'middle_name', 'last_name', 'created_at', 'updated_at']
+        for k in ['id', 'first_name', 'middle_name', 'last_name', 'created_at', 'updated_at', 'info__rating']
     ]))
     ordering = ['-id']
-    queryset = cv_models.CV.objects.distinct()
+    queryset = cv_models.CV.objects
+    export_filename = 'cv'
+    export_fields = {
+        'id': 'id',
+        'last_name': 'last_name',
+        'first_name': 'first_name',
+        'middle_name': 'middle_name',
+        'gender': 'gender',
+        'birth_date': 'birth_date',
+        'organization_contractor': 'organization_contractor__name',
+        'country': 'country__name',
+        'city': 'city__name',
+        'citizenship': 'citizenship__name',
+        'price': 'price',
+        'is_verified': 'is_verified',
+        'position_ids': 'position_ids',
+        'competence_ids': 'competence_ids',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    }
 
     def get_queryset(self):
+        if self.is_list_view_card():
+            return super().get_queryset().only(
+                *cv_models.CV.objects.get_queryset_card_only(),
+            ).select_related(
+                *cv_models.CV.objects.get_queryset_card_select_related(),
+            ).prefetch_related(
+                *cv_models.CV.objects.get_queryset_card_prefetch_related(),
+            )
         return super().get_queryset().prefetch_related(
             *cv_models.CV.objects.get_queryset_prefetch_related(),
             *cv_models.CV.objects.get_queryset_request_requirements_prefetch_related(),
         )
 
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        # по rank только если фильтр `q` действительно применен: пустое после очистки значение его пропускает
+        if 'search_rank' in queryset.query.annotations and not self.request.query_params.get('ordering'):
+            queryset = queryset.order_by('-search_rank', '-id')
+        return queryset
+
     def get_serializer_class(self):
         if self.action == 'list':
+            if self.is_list_view_card():
+                return cv_serializers.CvListReadCardSerializer
             return cv_serializers.CvListReadFullSerializer
         if self.request.method in SAFE_METHODS:
             return cv_serializers.CvDetailReadFullSerializer
         return cv_serializers.CvDetailWriteSerializer
 
+    def is_list_view_card(self) -> bool:
+        return self.action == 'list' and self.request.query_params.get('view') == 'card'
+
     @swagger_auto_schema(
         manual_parameters=[
+            openapi.Parameter(
+                'view',
+                openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                enum=['full', 'card'],
+                default='full',
+                description='`card` – облегченная карточка анкеты для списка',
+                required=False
+            ),
+            sparse_fields_parameter,
             openapi.Parameter(
                 'id',
                 openapi.IN_QUERY,
@@ -174,6 +264,34 @@ class CvViewSet(ViewSetFilteredByUserMixin, viewsets.ModelViewSet):
                 description='`ALL`',
                 required=False,
             ),
+            openapi.Parameter(
+                'competencies_subtree_any',
+                openapi.IN_QUERY,
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Items(type=openapi.TYPE_INTEGER),
+                description='`ANY`, с учетом дочерних компетенций',
+                required=False,
+            ),
+            openapi.Parameter(
+                'competencies_subtree_all',
+                openapi.IN_QUERY,
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Items(type=openapi.TYPE_INTEGER),
+                description='`ALL`, с учетом дочерних компетенций',
+                required=False,
+            ),
+            openapi.Parameter(
+                'rating_from',
+                openapi.IN_QUERY,
+                type=openapi.TYPE_NUMBER,
+                required=False,
+            ),
+            openapi.Parameter(
+                'rating_to',
+                openapi.IN_QUERY,
+                type=openapi.TYPE_NUMBER,
+                required=False,
+            ),
             openapi.Parameter(
                 'request_id',
                 openapi.IN_QUERY,
@@ -197,11 +315,56 @@ class CvViewSet(ViewSetFilteredByUserMixin, viewsets.ModelViewSet):
                 required=False,
                 description='Search in: `[%s]`' % ', '.join(search_fields)
             ),
+            openapi.Parameter(
+                'available_from',
+                openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATE,
+                required=False,
+                description='нет занятых таймслотов в периоде `available_from` – `available_to`',
+            ),
+            openapi.Parameter(
+                'available_to',
+                openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATE,
+                required=False,
+            ),
+            openapi.Parameter(
+                'q',
+                openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                required=False,
+                description='Полнотекстовый поиск (ФИО, роли, компетенции, карьера, проекты), '
+                            'без `ordering` сортирует по релевантности'
+            ),
         ],
     )
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                'facets',
+                openapi.IN_QUERY,
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Items(type=openapi.TYPE_STRING, enum=CvFacetsService.get_facets_names()),
+                description='по умолчанию все',
+                required=False,
+            ),
+        ],
+        responses={
+            status.HTTP_200_OK: cv_serializers.CvFacetsSerializer()
+        },
+    )
+    @action(detail=False, methods=['get'], url_path='facets')
+    def facets(self, request, *args, **kwargs):
+        facets = list(filter(None, request.query_params.get('facets', '').split(',')))
+        return Response(cv_serializers.CvFacetsSerializer(
+            CvFacetsService(self.filter_queryset(self.get_queryset())).get_facets(facets)
+        ).data)
+
     @swagger_auto_schema(
         request_body=cv_serializers.CvFileSerializer,
         responses={
@@ -272,7 +435,9 @@ class CvLinkedObjectFilterBackend(FilterBackend):
         return super().get_filterset_class(view, queryset) or CvLinkedObjectFilter
 
 
-class CvLinkedObjectViewSet(ViewSetFilteredByUserMixin, ReadWriteSerializersMixin, viewsets.ModelViewSet):
+class CvLinkedObjectViewSet(
+    ViewSetSparseFieldsMixin, ViewSetFilteredByUserMixin, ReadWriteSerializersMixin, viewsets.ModelViewSet
+):
     http_method_names = cv_viewsets_http_method_names
     filter_backends = [CvLinkedObjectFilterBackend, OrderingFilterNullsLast, SearchFilter]
 
@@ -330,18 +495,9 @@ class CvTimeSlotViewSet(CvLinkedObjectViewSet):
                 super().__init__(widget=DateRangeWidget, *args, **kwargs)
 
             def filter(self, qs, value):
-                condition = Q()
-                if value is not None:
-                    if value.start is not None and value.stop is not None:
-                        condition = Q(
-                            Q(date_from__range=[value.start, value.stop])
-                            | Q(date_to__range=[value.start, value.stop])
-                        )
-                    elif value.start is not None:
-                        condition = Q(date_from__gte=value.start)
-                    elif value.stop is not None:
-                        condition = Q(date_to__lte=value.stop)
-                return qs.filter(condition)
+                if value is None or (value.start is None and value.stop is None):
+                    return qs
+                return qs.filter_by_period_overlap(value.start, value.stop)
 
         country_id = ModelMultipleChoiceCommaSeparatedFilter(queryset=dictionary_models.Country.objects)
         city_id = ModelMultipleChoiceCommaSeparatedFilter(queryset=dictionary_models.City.objects)
@@ -1,8 +1,12 @@
 import itertools
 
+from django.conf import settings
+from django.core.cache import cache
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
-from rest_framework import viewsets, mixins
+from rest_framework import viewsets, mixins, status
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
 from django_filters import rest_framework as filters
 from rest_framework.filters import SearchFilter
 from rest_framework.viewsets import ModelViewSet
@@ -139,6 +143,52 @@ class CompetenceViewSet(DictionaryBaseViewSet):
 
 
 class CompetenceTreeViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
-    queryset = dictionary_models.Competence.objects.filter(mptt_level=0).prefetch_related('children')
+    """
+    Дерево собирается из одного запроса и кешируется целиком по версии дерева компетенций,
+    версия же отдается как ETag
+    """
+    CACHE_KEY = 'dictionary:competence-tree:%s:%s:%s'
+
+    queryset = dictionary_models.Competence.objects
     serializer_class = dictionary_serializers.CompetenceTreeSerializer
     pagination_class = None
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                'root',
+                openapi.IN_QUERY,
+                type=openapi.TYPE_INTEGER,
+                description='id узла, отдать только его поддерево',
+                required=False
+            ),
+            openapi.Parameter(
+                'depth',
+                openapi.IN_QUERY,
+                type=openapi.TYPE_INTEGER,
+                description='сколько уровней отдать, считая от корня',
+                required=False
+            ),
+        ],
+    )
+    def list(self, request, *args, **kwargs):
+        try:
+            root_id = int(request.query_params.get('root') or 0) or None
+            depth = max(int(request.query_params.get('depth') or 0), 0) or None
+        except ValueError:
+            raise ValidationError({'root': 'integer expected', 'depth': 'integer expected'})
+        version = dictionary_models.Competence.objects.get_tree_version()
+        etag = f'"{version}-{root_id or 0}-{depth or 0}"'
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+        if etag in request.headers.get('If-None-Match', ''):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        cache_key = self.CACHE_KEY % (version, root_id, depth)
+        data = cache.get(cache_key)
+        if data is None:
+            try:
+                tree = dictionary_models.Competence.objects.get_tree(root_id, depth)
+            except dictionary_models.Competence.DoesNotExist:
+                raise NotFound()
+            data = self.get_serializer(tree, many=True).data
+            cache.set(cache_key, data, settings.DICTIONARY_COMPETENCE_TREE_CACHE_TIMEOUT)
+        return Response(data, headers=headers)
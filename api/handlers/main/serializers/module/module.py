@@ -1,3 +1,4 @@
+from django.db import models
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
@@ -6,6 +7,7 @@ from acc.models import User
 from api.handlers.acc.serializers import UserInlineSerializer
 from dictionary import models as dictionary_models
 from main import models as main_models
+from main.services.module import set_modules_difficulty_factors
 from api.fields import PrimaryKeyRelatedIdField
 from api.serializers import ModelSerializerWithCallCleanMethod
 from api.handlers.dictionary import serializers as dictionary_serializers
@@ -110,6 +112,13 @@ class ModuleWriteSerializer(ModelSerializerWithCallCleanMethod):
         ]
 
 
+class ModuleReadListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        modules = list(data.all() if isinstance(data, models.Manager) else data)
+        set_modules_difficulty_factors(modules)
+        return super().to_representation(modules)
+
+
 class ModuleReadSerializer(ModuleWriteSerializer):
     organization_project = OrganizationProjectInlineSerializer(read_only=True)
     fun_points = ModuleFunPointInlineSerializer(many=True, read_only=True)
@@ -120,6 +129,7 @@ class ModuleReadSerializer(ModuleWriteSerializer):
         fields = ModuleWriteSerializer.Meta.fields + [
             'difficulty_factor', 'organization_project', 'fun_points', 'positions_labor_estimates',
         ]
+        list_serializer_class = ModuleReadListSerializer
 
 
 class ModuleInlineSerializer(ModuleReadSerializer):
@@ -7,7 +7,7 @@ from api.fields import PrimaryKeyRelatedIdField
 from api.serializers import ModelSerializerWithCallCleanMethod, ModelSerializer
 from api.handlers.acc.serializers import UserInlineSerializer
 from api.handlers.dictionary import serializers as dictionary_serializers
-from api.handlers.cv.serializers import CvInlineShortSerializer
+from api.handlers.cv.serializers import CvInlineShortSerializer, CvListReadCardSerializer
 from api.handlers.main.serializers.module import ModuleInlineSerializer
 
 __all__ = [
@@ -21,6 +21,7 @@ __all__ = [
     'RequestRequirementSerializer',
     'RequestRequirementReadSerializer',
     'RequestRequirementInlineSerializer',
+    'RequestRequirementCandidateSerializer',
     'RequestSerializer',
     'RequestReadSerializer',
     'RequestInlineSerializer',
@@ -93,6 +94,15 @@ class RequestRequirementCvReadSerializer(RequestRequirementCvSerializer):
         fields = RequestRequirementCvSerializer.Meta.fields + ['cv']
 
 
+class RequestRequirementCandidateSerializer(serializers.Serializer):
+    cv = CvListReadCardSerializer(read_only=True)
+    score = serializers.FloatField(read_only=True)
+    position_years = serializers.FloatField(read_only=True, allow_null=True)
+    competencies_matched_count = serializers.IntegerField(read_only=True)
+    is_city_matched = serializers.BooleanField(read_only=True)
+    is_type_of_employment_matched = serializers.BooleanField(read_only=True)
+
+
 class RequestRequirementSerializer(ModelSerializerWithCallCleanMethod):
     request_id = PrimaryKeyRelatedIdField(
         queryset=main_models.Request.objects,
@@ -135,6 +145,9 @@ class RequestRequirementReadSerializer(RequestRequirementSerializer):
         fields = RequestRequirementSerializer.Meta.fields + [
             'position', 'status', 'type_of_employment', 'work_location_city', 'competencies', 'cv_list_ids', 'cv_list',
         ]
+        fields_prefetch_related = {
+            'cv_list_ids': 'cv_links',
+        }
 
 
 class RequestRequirementInlineSerializer(RequestRequirementSerializer):
@@ -182,6 +195,9 @@ class RequestReadSerializer(RequestSerializer):
         fields = RequestSerializer.Meta.fields + [
             'module', 'type', 'industry_sector', 'manager_rm', 'requirements_count_sum', 'requirements',
         ]
+        fields_prefetch_related = {
+            'requirements_count_sum': 'requirements',
+        }
 
     def get_requirements_count_sum(self, instance: main_models.Request) -> int:
         return sum(row.count or 0 for row in instance.requirements.all()) or 0
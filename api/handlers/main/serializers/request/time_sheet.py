@@ -1,3 +1,5 @@
+from rest_framework import serializers
+
 from cv import models as cv_models
 from main import models as main_models
 from api.fields import PrimaryKeyRelatedIdField
@@ -9,6 +11,9 @@ __all__ = [
     'TimeSheetRowCreateSerializer',
     'TimeSheetRowUpdateSerializer',
     'TimeSheetRowReadSerializer',
+    'TimeSheetRowBulkCreateItemSerializer',
+    'TimeSheetRowBulkCreateErrorSerializer',
+    'TimeSheetRowBulkCreateResultSerializer',
 ]
 
 
@@ -57,3 +62,25 @@ class TimeSheetRowReadSerializer(TimeSheetRowUpdateSerializer):
         fields = TimeSheetRowUpdateSerializer.Meta.fields + [
             'request', 'cv',
         ]
+
+
+class TimeSheetRowBulkCreateItemSerializer(ModelSerializer):
+    """
+    Без запросов в БД на строку: существование запроса и анкеты проверяются пакетно
+    """
+    request_id = serializers.IntegerField()
+    cv_id = serializers.IntegerField()
+
+    class Meta:
+        model = main_models.TimeSheetRow
+        fields = ['request_id', 'cv_id', 'date_from', 'date_to', 'task_name', 'task_description', 'work_time']
+
+
+class TimeSheetRowBulkCreateErrorSerializer(serializers.Serializer):
+    index = serializers.IntegerField()
+    errors = serializers.DictField(child=serializers.ListField(child=serializers.CharField()))
+
+
+class TimeSheetRowBulkCreateResultSerializer(serializers.Serializer):
+    created = TimeSheetRowUpdateSerializer(many=True)
+    errors = TimeSheetRowBulkCreateErrorSerializer(many=True)
@@ -2,6 +2,7 @@ import itertools
 
 from typing import Type
 
+from django.db import transaction
 from django_filters import rest_framework as filters
 from rest_framework import mixins, status
 from rest_framework.decorators import action
@@ -185,6 +186,54 @@ class OrganizationProjectViewSet(ViewSetFilteredByUserMixin, MainBaseViewSet):
     def get_saved_labor_estimate(self, request, pk, *args, **kwargs):
         return self._get_labor_estimate_response_by_method('get_saved_labor_estimate')
 
+    @swagger_auto_schema(
+        responses={
+            status.HTTP_200_OK: main_serializers.ModulePositionLaborEstimateWorkersAndHoursSerializer(many=True)
+        },
+        operation_description='Получение расчётной оценки трудозатрат на основе ф-х точек по всем модулям'
+    )
+    @action(detail=True, methods=['get'], url_path='get-expected-labor-estimate')
+    def get_expected_labor_estimate(self, request, pk, *args, **kwargs):
+        return self._get_labor_estimate_response_by_method('get_expected_labor_estimate')
+
+    @swagger_auto_schema(
+        responses={
+            status.HTTP_200_OK: main_serializers.ModulePositionLaborEstimateWorkersSerializer(many=True)
+        },
+        operation_description='Получение запрошенной оценки трудозатрат по всем модулям'
+    )
+    @action(detail=True, methods=['get'], url_path='get-requested-labor-estimate')
+    def get_requested_labor_estimate(self, request, pk, *args, **kwargs):
+        return self._get_labor_estimate_response_by_method(
+            'get_requested_labor_estimate',
+            serializer_class=main_serializers.ModulePositionLaborEstimateWorkersSerializer
+        )
+
+    @swagger_auto_schema(
+        responses={
+            status.HTTP_200_OK: main_serializers.ModulePositionLaborEstimateWorkersAndHoursSerializer(many=True)
+        },
+        operation_description='Получение разницы расчётной и сохранённой оценок трудозатрат по всем модулям'
+                              '<br>`расчётная - сохранённая`'
+    )
+    @action(detail=True, methods=['get'], url_path='get-expected-minus-saved-labor-estimate')
+    def get_expected_minus_saved_labor_estimate(self, request, pk, *args, **kwargs):
+        return self._get_labor_estimate_response_by_method('get_expected_minus_saved_labor_estimate')
+
+    @swagger_auto_schema(
+        responses={
+            status.HTTP_200_OK: main_serializers.ModulePositionLaborEstimateWorkersSerializer(many=True)
+        },
+        operation_description='Получение разницы сохранённой и запрошенной оценок трудозатрат по всем модулям'
+                              '<br>`сохранённая – запрошенная`'
+    )
+    @action(detail=True, methods=['get'], url_path='get-saved-minus-requested-labor-estimate')
+    def get_saved_minus_requested_labor_estimate(self, request, pk, *args, **kwargs):
+        return self._get_labor_estimate_response_by_method(
+            'get_saved_minus_requested_labor_estimate',
+            serializer_class=main_serializers.ModulePositionLaborEstimateWorkersSerializer
+        )
+
     def _get_labor_estimate_response_by_method(
             self,
             method_name: str,
@@ -318,9 +367,7 @@ class OrganizationProjectCardItemViewSet(
 
     filterset_class = Filter
     http_method_names = ['get', 'post', 'patch', 'delete']
-    queryset = main_models.OrganizationProjectCardItem.objects.prefetch_related(
-        'children'
-    )
+    queryset = main_models.OrganizationProjectCardItem.objects
     pagination_class = None
     serializer_class = main_serializers.OrganizationProjectCardItemSerializer
     serializer_read_class = main_serializers.OrganizationProjectCardItemReadTreeSerializer
@@ -352,7 +399,8 @@ class OrganizationProjectCardItemViewSet(
         ],
     )
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        roots = self.filter_queryset(self.get_queryset()).get_trees()
+        return Response(self.get_serializer(roots, many=True).data)
 
     @swagger_auto_schema(
         request_body=no_body,
@@ -367,6 +415,7 @@ class OrganizationProjectCardItemViewSet(
                  '/(?P<organization_project_id>[0-9]+)'
                  '/(?P<template_root_card_item_id>[0-9]+)'
     )
+    @transaction.atomic
     def create_tree_by_template(
             self,
             request,
@@ -1,5 +1,6 @@
 import json
 import itertools
+import dataclasses
 from typing import Dict
 
 from django.db import transaction
@@ -19,8 +20,14 @@ from acc.models import User
 from dictionary import models as dictionary_models
 from cv import models as cv_models
 from main import models as main_models
+from main.services.request_requirement_candidates import RequestRequirementCandidatesService
+from main.services.time_sheet import TimeSheetRowsBulkCreateService, TimeSheetReportService
 from api.backends import FilterBackend
-from api.views import ReadWriteSerializersMixin, ReadCreateUpdateSerializersMixin, ViewSetFilteredByUserMixin
+from api.streaming import STREAMING_FORMATS, streaming_response
+from api.views import (
+    ReadWriteSerializersMixin, ReadCreateUpdateSerializersMixin, ViewSetFilteredByUserMixin, ViewSetSparseFieldsMixin,
+    ViewSetExportMixin, sparse_fields_parameter,
+)
 from api.filters import OrderingFilterNullsLast, ModelMultipleChoiceCommaSeparatedFilter
 from api.handlers.main import serializers as main_serializers
 from api.handlers.main.views.base import MainBaseViewSet
@@ -38,7 +45,9 @@ class RequestTypeViewSet(MainBaseViewSet):
     serializer_class = main_serializers.RequestTypeSerializer
 
 
-class RequestViewSet(ReadWriteSerializersMixin, ViewSetFilteredByUserMixin, ModelViewSet):
+class RequestViewSet(
+    ViewSetExportMixin, ViewSetSparseFieldsMixin, ReadWriteSerializersMixin, ViewSetFilteredByUserMixin, ModelViewSet
+):
     class Filter(filters.FilterSet):
         organization_customer_id = ModelMultipleChoiceCommaSeparatedFilter(
             queryset=main_models.Organization.objects,
@@ -85,9 +94,28 @@ class RequestViewSet(ReadWriteSerializersMixin, ViewSetFilteredByUserMixin, Mode
         for k in ['id', 'type', 'title', 'priority', 'start_date', 'deadline_date']
     ]))
     ordering = ['priority', '-id']
+    export_filename = 'requests'
+    export_fields = {
+        'id': 'id',
+        'title': 'title',
+        'status': 'status',
+        'priority': 'priority',
+        'type': 'type__name',
+        'industry_sector': 'industry_sector__name',
+        'organization_customer': 'module__organization_project__organization_customer__name',
+        'organization_project_id': 'module__organization_project_id',
+        'organization_project': 'module__organization_project__name',
+        'module_id': 'module_id',
+        'module': 'module__name',
+        'start_date': 'start_date',
+        'deadline_date': 'deadline_date',
+        'manager_rm': 'manager_rm__email',
+        'created_at': 'created_at',
+    }
 
     @swagger_auto_schema(
         manual_parameters=[
+            sparse_fields_parameter,
             openapi.Parameter(
                 'organization_customer_id',
                 openapi.IN_QUERY,
@@ -186,7 +214,9 @@ class RequestViewSet(ReadWriteSerializersMixin, ViewSetFilteredByUserMixin, Mode
         return super().list(request, *args, **kwargs)
 
 
-class RequestRequirementViewSet(ReadWriteSerializersMixin, ViewSetFilteredByUserMixin, ModelViewSet):
+class RequestRequirementViewSet(
+    ViewSetExportMixin, ViewSetSparseFieldsMixin, ReadWriteSerializersMixin, ViewSetFilteredByUserMixin, ModelViewSet
+):
     class Filter(filters.FilterSet):
         organization_customer_id = ModelMultipleChoiceCommaSeparatedFilter(
             queryset=main_models.Organization.objects,
@@ -243,9 +273,26 @@ class RequestRequirementViewSet(ReadWriteSerializersMixin, ViewSetFilteredByUser
         for k in ['id', 'sorting', 'name', 'count', 'position__name']
     ]))
     ordering = ['sorting', 'name']
+    export_filename = 'requests-requirements'
+    export_fields = {
+        'id': 'id',
+        'request_id': 'request_id',
+        'request': 'request__title',
+        'name': 'name',
+        'status': 'status',
+        'position': 'position__name',
+        'experience_years': 'experience_years',
+        'count': 'count',
+        'type_of_employment': 'type_of_employment__name',
+        'work_location_city': 'work_location_city__name',
+        'max_price': 'max_price',
+        'date_from': 'date_from',
+        'date_to': 'date_to',
+    }
 
     @swagger_auto_schema(
         manual_parameters=[
+            sparse_fields_parameter,
             openapi.Parameter(
                 'organization_customer_id',
                 openapi.IN_QUERY,
@@ -380,6 +427,38 @@ class RequestRequirementViewSet(ReadWriteSerializersMixin, ViewSetFilteredByUser
             status=status.HTTP_200_OK
         )
 
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=False, default=20),
+        ],
+        responses={
+            status.HTTP_200_OK: main_serializers.RequestRequirementCandidateSerializer(many=True)
+        },
+    )
+    @action(detail=True, methods=['get'], url_path='candidates')
+    def candidates(self, request, pk: int, *args, **kwargs):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            raise ValidationError({'limit': 'integer expected'})
+        candidates = RequestRequirementCandidatesService(self.get_object()).get_candidates(request.user, limit)
+        cv_by_id = cv_models.CV.objects.only(
+            *cv_models.CV.objects.get_queryset_card_only(),
+        ).select_related(
+            *cv_models.CV.objects.get_queryset_card_select_related(),
+        ).prefetch_related(
+            *cv_models.CV.objects.get_queryset_card_prefetch_related(),
+        ).in_bulk([candidate.cv_id for candidate in candidates])
+        return Response(main_serializers.RequestRequirementCandidateSerializer(
+            [
+                {**dataclasses.asdict(candidate), 'cv': cv_by_id[candidate.cv_id]}
+                for candidate in candidates
+                if candidate.cv_id in cv_by_id
+            ],
+            many=True,
+            context={'request': request}
+        ).data)
+
     @swagger_auto_schema(
         request_body=main_serializers.RequestRequirementCompetenceReplaceSerializer(many=True),
         responses={
@@ -436,7 +515,13 @@ class RequestRequirementViewSet(ReadWriteSerializersMixin, ViewSetFilteredByUser
         ))
 
 
-class TimeSheetRowViewSet(ReadCreateUpdateSerializersMixin, ViewSetFilteredByUserMixin, ModelViewSet):
+class TimeSheetRowViewSet(
+    ViewSetExportMixin,
+    ViewSetSparseFieldsMixin,
+    ReadCreateUpdateSerializersMixin,
+    ViewSetFilteredByUserMixin,
+    ModelViewSet
+):
     class Filter(filters.FilterSet):
         task_name = filters.CharFilter()
         cv_id = ModelMultipleChoiceCommaSeparatedFilter(
@@ -485,9 +570,25 @@ class TimeSheetRowViewSet(ReadCreateUpdateSerializersMixin, ViewSetFilteredByUse
         for k in ['id', 'date_from', 'date_to', 'cv_id', 'reques_id', 'task_name']
     ]))
     ordering = ['-date_from', '-id']
+    export_filename = 'time-sheet'
+    export_fields = {
+        'id': 'id',
+        'date_from': 'date_from',
+        'date_to': 'date_to',
+        'organization_project': 'request__module__organization_project__name',
+        'module': 'request__module__name',
+        'request_id': 'request_id',
+        'request': 'request__title',
+        'cv_id': 'cv_id',
+        'cv_last_name': 'cv__last_name',
+        'cv_first_name': 'cv__first_name',
+        'task_name': 'task_name',
+        'work_time': 'work_time',
+    }
 
     @swagger_auto_schema(
         manual_parameters=[
+            sparse_fields_parameter,
             openapi.Parameter(
                 'cv_id',
                 openapi.IN_QUERY,
@@ -541,6 +642,56 @@ class TimeSheetRowViewSet(ReadCreateUpdateSerializersMixin, ViewSetFilteredByUse
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                'group_by',
+                openapi.IN_QUERY,
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Items(type=openapi.TYPE_STRING, enum=list(TimeSheetReportService.GROUP_BY_COLUMNS)),
+                description='Измерения в порядке вложенности итогов: `organization_project,cv`',
+                required=False,
+            ),
+            openapi.Parameter(
+                'period',
+                openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                enum=TimeSheetReportService.PERIODS,
+                required=False,
+            ),
+            openapi.Parameter(
+                'output_format',
+                openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                enum=STREAMING_FORMATS,
+                default='json',
+                required=False,
+            ),
+        ],
+        responses={
+            status.HTTP_200_OK: openapi.Response(
+                'Строки отчета: `<group>_id...`, `period`, `grouping` (маска `GROUPING()`, 0 - детальная строка), '
+                '`work_time`, `rows_count`'
+            )
+        },
+    )
+    @action(detail=False, methods=['get'], url_path='report')
+    def report(self, request, *args, **kwargs):
+        output_format = request.query_params.get('output_format') or 'json'
+        if output_format not in STREAMING_FORMATS:
+            raise ValidationError({'output_format': f'one of {STREAMING_FORMATS} expected'})
+        try:
+            service = TimeSheetReportService(
+                queryset=self.filter_queryset(self.get_queryset()),
+                group_by=list(filter(None, request.query_params.get('group_by', '').split(','))),
+                period=request.query_params.get('period') or None,
+            )
+        except DjangoValidationError as e:
+            raise ValidationError(e.message_dict)
+        return streaming_response(
+            service.get_columns(), service.iterate(), output_format, filename='time-sheet-report'
+        )
+
     @swagger_auto_schema(
         responses={
             status.HTTP_201_CREATED: main_serializers.TimeSheetRowUpdateSerializer(many=True)
@@ -557,3 +708,28 @@ class TimeSheetRowViewSet(ReadCreateUpdateSerializersMixin, ViewSetFilteredByUse
             raise serializers.ValidationError(e.args[0])
         response_serializer = main_serializers.TimeSheetRowUpdateSerializer(instance=time_sheet_rows, many=True)
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
+
+    @swagger_auto_schema(
+        request_body=main_serializers.TimeSheetRowBulkCreateItemSerializer(many=True),
+        responses={
+            status.HTTP_200_OK: main_serializers.TimeSheetRowBulkCreateResultSerializer()
+        }
+    )
+    @action(detail=False, methods=['post'], url_path='bulk-create')
+    def bulk_create(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            raise serializers.ValidationError({'non_field_errors': ['list expected']})
+        rows = {}
+        errors = {}
+        for i, row in enumerate(request.data):
+            item_serializer = main_serializers.TimeSheetRowBulkCreateItemSerializer(data=row)
+            if item_serializer.is_valid():
+                rows[i] = item_serializer.validated_data
+            else:
+                errors[i] = item_serializer.errors
+        result = TimeSheetRowsBulkCreateService(request.user).create(rows)
+        errors.update(result.errors)
+        return Response(main_serializers.TimeSheetRowBulkCreateResultSerializer({
+            'created': result.created,
+            'errors': [{'index': i, 'errors': errors[i]} for i in sorted(errors)],
+        }).data)
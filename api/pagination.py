@@ -1,16 +1,233 @@
+import base64
+import binascii
+import functools
+import json
+import operator
 from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+import coreapi
+import coreschema
+from cacheops import cached_as
+from django.conf import settings
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import F, Q, OrderBy, QuerySet
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+def get_queryset_count_estimate(queryset) -> int:
+    """
+    Оценка числа строк планировщиком (`EXPLAIN`), для таблицы без фильтров это `pg_class.reltuples`
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def get_queryset_total(queryset) -> Tuple[int, bool]:
+    """
+    (итог, оценка ли) из кэша cacheops: ключ - SQL запроса без сортировки, в нем уже видимость пользователя
+    и все фильтры, сброс - по изменениям моделей запроса.
+    Выше `API_PAGINATION_TOTAL_ESTIMATE_THRESHOLD` по оценке планировщика `COUNT(*)` не выполняется
+    """
+    queryset = queryset.order_by()
+
+    @cached_as(queryset, timeout=settings.API_PAGINATION_TOTAL_CACHE_TIMEOUT)
+    def _get_total() -> Tuple[int, bool]:
+        estimate = get_queryset_count_estimate(queryset)
+        if estimate > settings.API_PAGINATION_TOTAL_ESTIMATE_THRESHOLD:
+            return estimate, True
+        return queryset.nocache().count(), False
+
+    return tuple(_get_total())
+
+
+class CachedTotalPaginator(Paginator):
+    total_is_estimated = False
+
+    @cached_property
+    def count(self) -> int:
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        count, self.total_is_estimated = get_queryset_total(self.object_list)
+        return count
+
+    def validate_number(self, number):
+        if not (self.count and self.total_is_estimated):
+            return super().validate_number(number)
+        # по оценке последняя страница неизвестна, за ее пределами просто пустой список
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_('That page number is not an integer'))
+        if number < 1:
+            raise EmptyPage(_('That page number is less than 1'))
+        return number
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Пагинация по ключу (`?cursor=`): следующая страница выбирается условием по значениям сортировки
+    последней строки вместо OFFSET, поэтому глубокие страницы не медленнее первых.
+    Сортировка любая из `OrderingFilterNullsLast`, в конец добавляется `id` для однозначности. Только вперед.
+    Итог по `?total=none|estimate|exact`, по умолчанию не считается
+    """
+    page_size = 100
+    max_page_size = 1000
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    total_query_param = 'total'
+    total_modes = ['none', 'estimate', 'exact']
+
+    KEY_PREFIX = '_keyset_'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.total = None
+        self.total_is_estimated = False
+        self.next_cursor = None
+
+        total_mode = request.query_params.get(self.total_query_param) or 'none'
+        if total_mode not in self.total_modes:
+            raise ValidationError({self.total_query_param: f'one of {self.total_modes} expected'})
+        if total_mode == 'exact':
+            self.total = queryset.count()
+        elif total_mode == 'estimate':
+            self.total = get_queryset_count_estimate(queryset)
+            self.total_is_estimated = True
+
+        ordering = self.get_ordering(queryset)
+        keys = [F(f'{self.KEY_PREFIX}{i}') for i in range(len(ordering))]
+        queryset = queryset.annotate(**{
+            key.name: F(name)
+            for key, (name, _) in zip(keys, ordering)
+        }).order_by(*[
+            key.desc(nulls_last=True) if is_desc else key.asc(nulls_last=True)
+            for key, (_, is_desc) in zip(keys, ordering)
+        ])
+        if cursor := request.query_params.get(self.cursor_query_param):
+            queryset = queryset.filter(self.get_after_q(ordering, self.decode_cursor(cursor, ordering)))
+
+        rows = list(queryset[:self.page_size + 1])
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            self.next_cursor = self.encode_cursor(ordering, [
+                getattr(rows[-1], f'{self.KEY_PREFIX}{i}')
+                for i in range(len(ordering))
+            ])
+        return rows
+
+    def get_ordering(self, queryset) -> List[Tuple[str, bool]]:
+        """
+        [(поле, по убыванию), ...] из сортировки queryset
+        """
+        ordering = []
+        query = queryset.query
+        for o in query.order_by or (query.default_ordering and queryset.model._meta.ordering) or []:
+            if isinstance(o, OrderBy) and isinstance(o.expression, F):
+                ordering.append((o.expression.name, o.descending))
+            elif isinstance(o, str) and o != '?':
+                ordering.append((o.lstrip('-'), o.startswith('-')))
+            else:
+                raise ValidationError({self.cursor_query_param: f'ordering <{o}> is not supported'})
+        if not {'pk', queryset.model._meta.pk.name} & {name for name, _ in ordering}:
+            ordering.append(('pk', False))
+        return ordering
+
+    def get_after_q(self, ordering: List[Tuple[str, bool]], values: List[Any]) -> Q:
+        """
+        Строки после курсора при `NULLS LAST`:
+        (k1 после c1) OR (k1 = c1 AND k2 после c2) OR ...
+        """
+        terms = []
+        equal = Q()
+        for i, ((_, is_desc), value) in enumerate(zip(ordering, values)):
+            key = f'{self.KEY_PREFIX}{i}'
+            if value is None:
+                equal &= Q(**{f'{key}__isnull': True})
+                continue
+            after = Q(**{f'{key}__{"lt" if is_desc else "gt"}': value}) | Q(**{f'{key}__isnull': True})
+            terms.append(equal & after)
+            equal &= Q(**{key: value})
+        if not terms:
+            return Q(pk__in=[])
+        return functools.reduce(operator.or_, terms)
+
+    def encode_cursor(self, ordering: List[Tuple[str, bool]], values: List[Any]) -> str:
+        data = json.dumps(
+            {'o': ordering, 'v': values},
+            default=lambda v: v.isoformat() if hasattr(v, 'isoformat') else str(v),
+            separators=(',', ':'),
+        )
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def decode_cursor(self, cursor: str, ordering: List[Tuple[str, bool]]) -> List[Any]:
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, ValueError):
+            raise NotFound('Invalid cursor')
+        if not isinstance(data, dict) or not isinstance(data.get('o'), list) or not isinstance(data.get('v'), list):
+            raise NotFound('Invalid cursor')
+        if [tuple(o) if isinstance(o, list) else o for o in data['o']] != ordering:
+            # курсор от другой сортировки
+            raise NotFound('Invalid cursor')
+        if len(data['v']) != len(ordering):
+            raise NotFound('Invalid cursor')
+        return data['v']
+
+    def get_next_link(self) -> Optional[str]:
+        if not self.next_cursor:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('total', self.total),
+            ('total_is_estimated', self.total_is_estimated),
+            ('max_page_size', self.max_page_size),
+            ('page_size', self.page_size),
+            ('cursor_next', self.next_cursor),
+            ('page_next', self.get_next_link()),
+            ('page_previous', None),
+            ('results', data)
+        ]))
 
 
 class DefaultPagination(PageNumberPagination):
+    """
+    По номеру страницы, с `?cursor=` (пустой - первая страница) - `KeysetPagination`.
+    Итог кэшируется, для больших выборок - оценка планировщика (`total_is_estimated`)
+    """
+    django_paginator_class = CachedTotalPaginator
     page_size = 100
     max_page_size = 1000
     page_size_query_param = 'page_size'
 
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
     def get_paginated_response(self, data):
+        if self.keyset:
+            return self.keyset.get_paginated_response(data)
         return Response(OrderedDict([
             ('total', self.page.paginator.count),
+            ('total_is_estimated', self.page.paginator.total_is_estimated),
             ('max_page_size', self.max_page_size),
             ('page_size', self.page.paginator.per_page),
             ('page_number', self.page.number),
@@ -18,3 +235,25 @@ class DefaultPagination(PageNumberPagination):
             ('page_previous', self.get_previous_link()),
             ('results', data)
         ]))
+
+    def get_schema_fields(self, view):
+        return [
+            *super().get_schema_fields(view),
+            coreapi.Field(
+                name=KeysetPagination.cursor_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.String(
+                    description='Пагинация по ключу: пустой - первая страница, дальше `cursor_next`'
+                ),
+            ),
+            coreapi.Field(
+                name=KeysetPagination.total_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.Enum(
+                    KeysetPagination.total_modes,
+                    description='Итог при `cursor`: не считать, оценка планировщика, точный `COUNT(*)`',
+                ),
+            ),
+        ]
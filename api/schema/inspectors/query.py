@@ -15,14 +15,16 @@ class DefaultPaginationRestResponsePagination(DjangoRestResponsePagination):
             paged_schema = openapi.Schema(
                 type=openapi.TYPE_OBJECT,
                 properties=OrderedDict((
-                    ('total', s(type=openapi.TYPE_INTEGER)),
+                    ('total', s(type=openapi.TYPE_INTEGER, x_nullable=True)),
+                    ('total_is_estimated', s(type=openapi.TYPE_BOOLEAN)),
                     ('max_page_size', s(type=openapi.TYPE_INTEGER)),
                     ('page_size', s(type=openapi.TYPE_INTEGER)),
                     ('page_number', s(type=openapi.TYPE_INTEGER)),
+                    ('cursor_next', s(type=openapi.TYPE_STRING, x_nullable=True)),
                     ('page_next', s(type=openapi.TYPE_STRING, format=openapi.FORMAT_URI, x_nullable=True)),
                     ('page_previous', s(type=openapi.TYPE_STRING, format=openapi.FORMAT_URI, x_nullable=True)),
                     ('results', response_schema),
                 )),
-                required=['total', 'max_page_size', 'page_size', 'page_number', 'results']
+                required=['total', 'max_page_size', 'page_size', 'results']
             )
         return paged_schema
@@ -1,14 +1,16 @@
 import copy
-from typing import Dict, Optional
+from typing import Dict, Optional, Set
 
 from django.core.exceptions import ValidationError, FieldDoesNotExist
-from django.db.models import ManyToManyField
+from django.db.models import ManyToManyField, QuerySet, Prefetch
+from django.utils.functional import cached_property
 from rest_framework import serializers
 
 from api.fields import PrimaryKeyRelatedIdField
 
 __all__ = [
     'ModelSerializer', 'ModelSerializerWithCallCleanMethod', 'StatusSerializer', 'EmptySerializer', 'IdSerializer',
+    'parse_fields_tree', 'get_serializer_source_paths', 'prune_queryset_related_by_source_paths',
 ]
 
 
@@ -38,7 +40,89 @@ class IdSerializer(serializers.Serializer):
         return fields
 
 
+def parse_fields_tree(value: str) -> Dict[str, Dict]:
+    """
+    `id,last_name,positions.position` -> `{'id': {}, 'last_name': {}, 'positions': {'position': {}}}`
+    Пустой словарь означает «все поля»
+    """
+    result = {}
+    for path in value.split(','):
+        node = result
+        for name in filter(None, map(str.strip, path.split('.'))):
+            node = node.setdefault(name, {})
+    return result
+
+
+def get_serializer_source_paths(serializer: serializers.Serializer, prefix: str = '') -> Set[str]:
+    fields_prefetch_related = getattr(getattr(serializer, 'Meta', None), 'fields_prefetch_related', {})
+    result = set()
+    for field_name, field in serializer.fields.items():
+        if field_name in fields_prefetch_related:
+            path = prefix + fields_prefetch_related[field_name]
+        elif field.source == '*':
+            path = prefix[:-2]
+        else:
+            path = prefix + field.source.replace('.', '__')
+        if path:
+            result.add(path)
+        if isinstance(field, serializers.ListSerializer):
+            field = field.child
+        if isinstance(field, serializers.Serializer):
+            result |= get_serializer_source_paths(field, f'{path}__' if path else '')
+    return result
+
+
+def prune_queryset_related_by_source_paths(queryset: QuerySet, source_paths: Set[str]) -> QuerySet:
+    def is_required(lookup: str) -> bool:
+        return any(path == lookup or path.startswith(f'{lookup}__') for path in source_paths)
+
+    def flat_select_related(tree: Dict, prefix: str = ''):
+        for k, v in tree.items():
+            yield f'{prefix}{k}'
+            yield from flat_select_related(v, f'{prefix}{k}__')
+
+    prefetch_related = [
+        lookup
+        for lookup in queryset._prefetch_related_lookups
+        if is_required(lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup)
+    ]
+    queryset = queryset.prefetch_related(None).prefetch_related(*prefetch_related)
+    if isinstance(queryset.query.select_related, dict):
+        select_related = [
+            lookup
+            for lookup in flat_select_related(queryset.query.select_related)
+            if is_required(lookup)
+        ]
+        queryset = queryset.select_related(None).select_related(*select_related)
+    return queryset
+
+
 class ModelSerializer(serializers.ModelSerializer):
+    """
+    `fields_tree` – дерево запрошенных полей (см. `parse_fields_tree`), `None` – все поля.
+    Для вычисляемых полей `Meta.fields_prefetch_related` задаёт путь связи, от которой они зависят
+    """
+
+    def __init__(self, *args, fields_tree: Optional[Dict] = None, **kwargs):
+        self.fields_tree = fields_tree
+        super().__init__(*args, **kwargs)
+
+    @cached_property
+    def fields(self):
+        fields = super().fields
+        if not self.fields_tree:
+            return fields
+        for field_name in list(fields.keys()):
+            if field_name not in self.fields_tree:
+                del fields[field_name]
+                continue
+            field = fields[field_name]
+            if isinstance(field, serializers.ListSerializer):
+                field = field.child
+            if isinstance(field, ModelSerializer):
+                field.fields_tree = self.fields_tree[field_name] or None
+        return fields
+
     def to_representation(self, instance):
         result = super().to_representation(instance)
         for field in self._readable_fields:
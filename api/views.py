@@ -1,4 +1,36 @@
+from typing import Dict, Optional
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import SAFE_METHODS
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+
+from api.serializers import (
+    ModelSerializer, parse_fields_tree, get_serializer_source_paths, prune_queryset_related_by_source_paths,
+)
+from api.streaming import streaming_response
+
+sparse_fields_parameter = openapi.Parameter(
+    'fields',
+    openapi.IN_QUERY,
+    type=openapi.TYPE_STRING,
+    description='Only these fields, nested via dot: `id,last_name,positions.position`',
+    required=False,
+)
+
+EXPORT_FORMATS = ['csv', 'xlsx']
+
+export_format_parameter = openapi.Parameter(
+    'output_format',
+    openapi.IN_QUERY,
+    type=openapi.TYPE_STRING,
+    enum=EXPORT_FORMATS,
+    default='csv',
+    required=False,
+)
 
 
 class ViewSetFilteredByUserMixin:
@@ -15,6 +47,32 @@ class ViewSetQuerySetPrefetchRelatedMixin:
         return super().get_queryset()
 
 
+class ViewSetSparseFieldsMixin:
+    """
+    `?fields=id,last_name,positions.position` – отдает только запрошенные поля
+    и подгружает (prefetch_related / select_related) только нужные для них связи
+    """
+    sparse_fields_query_param = 'fields'
+
+    def get_sparse_fields_tree(self) -> Optional[Dict]:
+        if getattr(self, 'swagger_fake_view', False) or self.request.method not in SAFE_METHODS:
+            return None
+        if value := self.request.query_params.get(self.sparse_fields_query_param):
+            return parse_fields_tree(value)
+
+    def get_serializer(self, *args, **kwargs):
+        fields_tree = self.get_sparse_fields_tree()
+        if fields_tree and issubclass(self.get_serializer_class(), ModelSerializer):
+            kwargs.setdefault('fields_tree', fields_tree)
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if not self.get_sparse_fields_tree() or not issubclass(self.get_serializer_class(), ModelSerializer):
+            return queryset
+        return prune_queryset_related_by_source_paths(queryset, get_serializer_source_paths(self.get_serializer()))
+
+
 class ReadWriteSerializersMixin:
     serializer_class = None
     serializer_read_class = None
@@ -49,3 +107,32 @@ class ReadCreateUpdateSerializersMixin:
         if self.request.method in ('PATCH', 'PUT'):
             return self.serializer_update_class
         return self.serializer_read_class
+
+
+class ViewSetExportMixin:
+    """
+    `GET .../export?output_format=csv|xlsx` – выгрузка списка с теми же фильтрами и сортировкой.
+    Строки читаются серверным курсором через `values_list` без сериализаторов и пишутся в ответ потоком.
+    harakiri uwsgi считает весь ответ, для этого маршрута он поднят в docker/entry-point (`UWSGI_EXPORT_HARAKIRI`)
+    """
+    export_fields: Dict[str, str] = {}
+    """{ колонка: путь ORM }, только связи к одному объекту, иначе строки задвоятся"""
+    export_filename = 'export'
+
+    @swagger_auto_schema(
+        manual_parameters=[export_format_parameter],
+        responses={
+            status.HTTP_200_OK: openapi.Response('csv / xlsx')
+        },
+    )
+    @action(detail=False, methods=['get'], url_path='export', pagination_class=None)
+    def export(self, request, *args, **kwargs):
+        output_format = request.query_params.get('output_format') or 'csv'
+        if output_format not in EXPORT_FORMATS:
+            raise ValidationError({'output_format': f'one of {EXPORT_FORMATS} expected'})
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        max_rows = settings.API_EXPORT_XLSX_MAX_ROWS
+        if output_format == 'xlsx' and queryset[:max_rows + 1].count() > max_rows:
+            raise ValidationError({'output_format': f'xlsx is limited to {max_rows} rows, use csv'})
+        rows = queryset.values_list(*self.export_fields.values()).iterator(chunk_size=settings.API_EXPORT_CHUNK_SIZE)
+        return streaming_response(list(self.export_fields), rows, output_format, filename=self.export_filename)
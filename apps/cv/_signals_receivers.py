@@ -0,0 +1,49 @@
+from django.db.models import signals
+
+from project.contrib.disable_for_loaddata import disable_for_loaddata
+from cv import models as cv_models
+from cv.services.cv_features_index import CvFeaturesIndex
+
+__all__ = ['setup']
+
+CV_DENORMALIZED_SOURCE_FIELDS = {'first_name', 'middle_name', 'last_name'}
+
+
+@disable_for_loaddata
+def cv_post_save(sender, instance: cv_models.CV, created: bool = False, update_fields=None, **kwargs) -> None:
+    CvFeaturesIndex.invalidate()
+    if update_fields is not None and not CV_DENORMALIZED_SOURCE_FIELDS.intersection(update_fields):
+        return
+    cv_models.CV.objects.refresh_denormalized([instance.id])
+
+
+@disable_for_loaddata
+def cv_linked_object_changed(sender, instance, **kwargs) -> None:
+    CvFeaturesIndex.invalidate()
+    cv_models.CV.objects.refresh_denormalized([instance.cv_id])
+
+
+@disable_for_loaddata
+def cv_position_competence_changed(sender, instance: cv_models.CvPositionCompetence, **kwargs) -> None:
+    CvFeaturesIndex.invalidate()
+    cv_models.CV.objects.refresh_denormalized(
+        cv_models.CvPosition.objects.filter(id=instance.cv_position_id).values_list('cv_id', flat=True)
+    )
+
+
+@disable_for_loaddata
+def cv_features_changed(sender, **kwargs) -> None:
+    CvFeaturesIndex.invalidate()
+
+
+def setup():
+    signals.post_save.connect(cv_post_save, sender=cv_models.CV)
+    for model in [cv_models.CvPosition, cv_models.CvCareer, cv_models.CvProject]:
+        signals.post_save.connect(cv_linked_object_changed, sender=model)
+        signals.post_delete.connect(cv_linked_object_changed, sender=model)
+    signals.post_save.connect(cv_position_competence_changed, sender=cv_models.CvPositionCompetence)
+    signals.post_delete.connect(cv_position_competence_changed, sender=cv_models.CvPositionCompetence)
+    signals.post_delete.connect(cv_features_changed, sender=cv_models.CV)
+    signals.m2m_changed.connect(cv_features_changed, sender=cv_models.CV.types_of_employment.through)
+    signals.post_save.connect(cv_features_changed, sender=cv_models.CvTimeSlot)
+    signals.post_delete.connect(cv_features_changed, sender=cv_models.CvTimeSlot)
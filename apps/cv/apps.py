@@ -6,3 +6,7 @@ class CvConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cv'
     verbose_name = _('Анкеты')
+
+    def ready(self):
+        from cv._signals_receivers import setup as signals_receivers_setup
+        signals_receivers_setup()
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from cv import models as cv_models
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчет денормализованных полей анкет: поисковый документ, массивы ролей / компетенций '
+        '(например после переименования ролей / компетенций в справочниках)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', dest='batch_size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        cv_ids = list(cv_models.CV.objects.nocache().order_by('id').values_list('id', flat=True))
+        for i in range(0, len(cv_ids), options['batch_size']):
+            cv_models.CV.objects.refresh_denormalized(cv_ids[i:i + options['batch_size']])
+            self.stdout.write(f'{min(i + options["batch_size"], len(cv_ids))} / {len(cv_ids)}')
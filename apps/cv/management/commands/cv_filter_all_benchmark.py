@@ -0,0 +1,64 @@
+import time
+from typing import Callable, Dict, List
+
+import numpy
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from api.filters import ModelMultipleChoiceCommaSeparatedAllFilter, ModelMultipleChoiceCommaSeparatedArrayFilter
+from cv import models as cv_models
+
+
+class Command(BaseCommand):
+    help = (
+        'Регрессионный замер фильтров "все из" по компетенциям: '
+        'JOIN на каждый id, GROUP BY ... HAVING и `@>` по массиву `competence_ids`'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids-count', dest='ids_counts', nargs='+', type=int, default=[1, 2, 5, 8, 10, 15, 20])
+        parser.add_argument('--repeat', dest='repeat', type=int, default=5)
+        parser.add_argument('--limit', dest='limit', type=int, default=100)
+
+    def handle(self, *args, **options):
+        field_name = 'positions__competencies__competence_id'
+        competencies_ids = list(
+            cv_models.CvPositionCompetence.objects.nocache().values('competence_id').annotate(
+                cv_count=Count('cv_position__cv_id', distinct=True)
+            ).order_by('-cv_count').values_list('competence_id', flat=True)[:max(options['ids_counts'])]
+        )
+        self.stdout.write('%6s %-10s %8s %10s %10s' % ('ids', 'filter', 'found', 'p50, ms', 'p95, ms'))
+        for ids_count in options['ids_counts']:
+            ids = competencies_ids[:ids_count]
+            for name, build in [
+                ['conjoined', lambda qs: self.filter_conjoined(qs, field_name, ids)],
+                ['having', lambda qs: ModelMultipleChoiceCommaSeparatedAllFilter(
+                    field_name=field_name).filter(qs, ids)],
+                ['array', lambda qs: ModelMultipleChoiceCommaSeparatedArrayFilter(
+                    field_name='competence_ids', lookup_expr='contains').filter(qs, ids)],
+            ]:
+                result = self.measure(build, options['repeat'], options['limit'])
+                self.stdout.write('%6s %-10s %8s %10.1f %10.1f' % (
+                    ids_count, name, result['found'], result['p50'], result['p95'],
+                ))
+
+    @classmethod
+    def filter_conjoined(cls, queryset, field_name: str, ids: List[int]):
+        for competence_id in ids:
+            queryset = queryset.filter(**{field_name: competence_id})
+        return queryset.distinct()
+
+    @classmethod
+    def measure(cls, build: Callable, repeat: int, limit: int) -> Dict:
+        timings = []
+        found = 0
+        for _ in range(repeat):
+            queryset = build(cv_models.CV.objects.nocache())
+            started_at = time.perf_counter()
+            found = len(list(queryset.values_list('id', flat=True)[:limit]))
+            timings.append((time.perf_counter() - started_at) * 1000)
+        return {
+            'found': found,
+            'p50': numpy.percentile(timings, 50),
+            'p95': numpy.percentile(timings, 95),
+        }
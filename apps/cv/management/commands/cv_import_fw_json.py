@@ -10,6 +10,12 @@ class Command(BaseCommand):
         parser.add_argument('filepath', nargs='*')
         parser.add_argument('--no-skills', dest='without_skills', action='store_true')
         parser.add_argument('--skip-exists', dest='skip_exists', action='store_true')
+        parser.add_argument('--workers', type=int, default=1, help='процессов для загрузки кусков')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument(
+            '--checkpoint', type=Path, default=None,
+            help='файл загруженных кусков, по умолчанию <filepath>.checkpoint.json'
+        )
 
     def handle(self, *args, **options):
         for filepath in options['filepath']:
@@ -17,4 +23,7 @@ class Command(BaseCommand):
                 Path(filepath),
                 without_skills=options['without_skills'],
                 skip_exists=options['skip_exists'],
+                workers=options['workers'],
+                chunk_size=options['chunk_size'],
+                checkpoint_path=options['checkpoint'],
             ).do_import()
@@ -0,0 +1,71 @@
+import time
+from typing import Dict, List
+from urllib.parse import parse_qsl
+
+import numpy
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from acc.models import User
+from api.handlers.cv.views import CvViewSet
+
+
+class Command(BaseCommand):
+    help = 'Замер списка анкет: кол-во запросов, размер ответа и p50/p95 времени ответа'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', dest='user_id', type=int)
+        parser.add_argument('--view', dest='views', nargs='+', default=['full', 'card'])
+        parser.add_argument('--page-size', dest='page_sizes', nargs='+', type=int, default=[100, 1000])
+        parser.add_argument('--repeat', dest='repeat', type=int, default=10)
+        parser.add_argument('--with-cache', dest='with_cache', action='store_true')
+        parser.add_argument(
+            '--scenario', dest='scenarios', action='append', default=None,
+            help='доп. query string, например `search=java` или `q=java`, можно указать несколько раз'
+        )
+
+    def handle(self, *args, **options):
+        if options['user_id']:
+            user = User.objects.get(id=options['user_id'])
+        else:
+            user = User.objects.filter(is_superuser=True).order_by('id').first()
+        if not user:
+            raise CommandError('User not found')
+        self.stdout.write('%-24s %-6s %10s %8s %12s %10s %10s' % (
+            'scenario', 'view', 'page_size', 'queries', 'bytes', 'p50, ms', 'p95, ms'
+        ))
+        for scenario in options['scenarios'] or ['']:
+            for page_size in options['page_sizes']:
+                for view in options['views']:
+                    params = {'view': view, 'page_size': page_size, **dict(parse_qsl(scenario))}
+                    with override_settings(CACHEOPS_ENABLED=options['with_cache']):
+                        result = self.measure(user, params, options['repeat'])
+                    self.stdout.write('%-24s %-6s %10s %8s %12s %10.1f %10.1f' % (
+                        scenario or '-', view, page_size,
+                        result['queries'], result['bytes'], result['p50'], result['p95'],
+                    ))
+
+    @classmethod
+    def measure(cls, user: User, params: Dict, repeat: int) -> Dict:
+        view = CvViewSet.as_view({'get': 'list'})
+        timings: List[float] = []
+        queries = content_length = 0
+        for _ in range(repeat):
+            request = APIRequestFactory().get('/api/cv/cv/', params)
+            force_authenticate(request, user=user)
+            with CaptureQueriesContext(connection) as context:
+                started_at = time.perf_counter()
+                response = view(request)
+                response.render()
+                timings.append((time.perf_counter() - started_at) * 1000)
+            queries = len(context.captured_queries)
+            content_length = len(response.content)
+        return {
+            'queries': queries,
+            'bytes': content_length,
+            'p50': numpy.percentile(timings, 50),
+            'p95': numpy.percentile(timings, 95),
+        }
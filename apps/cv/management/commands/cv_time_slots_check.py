@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from main.models import RequestRequirementCv
+from cv import models as cv_models
+from cv.services.cv_time_slot import CvTimeSlotService
+
+
+class Command(BaseCommand):
+    help = 'Поиск анкет, у которых таймслоты по запросам разошлись с ожидаемыми (--fix - пересчитать)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', dest='fix', action='store_true')
+        parser.add_argument('--batch-size', dest='batch_size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        cv_ids = sorted(
+            set(RequestRequirementCv.objects.nocache().values_list('cv_id', flat=True))
+            | set(cv_models.CvTimeSlot.objects.nocache().filter(
+                request_requirement_link__isnull=False
+            ).values_list('cv_id', flat=True))
+        )
+        drifted_cv_ids = set()
+        totals = {'created': 0, 'updated': 0, 'deleted': 0}
+        for i in range(0, len(cv_ids), options['batch_size']):
+            result = CvTimeSlotService.sync_requests_slots_for_cv_ids(
+                cv_ids[i:i + options['batch_size']],
+                dry_run=not options['fix'],
+            )
+            drifted_cv_ids |= result.cv_ids
+            for k in totals:
+                totals[k] += getattr(result, k)
+        self.stdout.write('checked cv: %s, drifted cv: %s, slots to create: %s, to update: %s, to delete: %s%s' % (
+            len(cv_ids), len(drifted_cv_ids), totals['created'], totals['updated'], totals['deleted'],
+            ' (fixed)' if options['fix'] else '',
+        ))
+        if drifted_cv_ids:
+            self.stdout.write('drifted cv ids: %s' % ', '.join(map(str, sorted(drifted_cv_ids))))
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.11 on 2022-02-07 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0028_round6'),
+        ('cv', '0018_alter_cv_attributes'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='CvInfo',
+        ),
+        migrations.RunSQL(
+            'DROP VIEW IF EXISTS v_cv_info',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.CreateModel(
+            name='CvInfo',
+            fields=[
+                ('cv', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='info', serialize=False, to='cv.cv')),
+                ('rating', models.FloatField(db_index=True, null=True, verbose_name='рейтинг')),
+                ('rating_count', models.IntegerField(default=0, verbose_name='кол-во оценок')),
+            ],
+            options={
+                'verbose_name': 'анкета / сводная информация',
+                'verbose_name_plural': 'анкеты / сводная информация',
+            },
+        ),
+        migrations.RunSQL(
+            '''
+            INSERT INTO cv_cvinfo (cv_id, rating, rating_count)
+            SELECT cv_id, AVG(rating), COUNT(rating)
+            FROM main_requestrequirementcv
+            GROUP BY cv_id
+            ''',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
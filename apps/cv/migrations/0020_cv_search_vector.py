@@ -0,0 +1,54 @@
+# Generated by Django 3.2.11 on 2022-02-08 12:00
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dictionary', '0007_attributes'),
+        ('cv', '0019_cvinfo_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cv',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='поисковый документ'),
+        ),
+        migrations.AddIndex(
+            model_name='cv',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='cv_cv_search__a86b5f_gin'),
+        ),
+        migrations.RunSQL(
+            '''
+            UPDATE cv_cv SET search_vector =
+                setweight(to_tsvector('russian', concat_ws(' ', cv_cv.last_name, cv_cv.first_name, cv_cv.middle_name)), 'A')
+                || setweight(to_tsvector('russian', coalesce((
+                    SELECT string_agg(concat_ws(' ', p.title, d.name), ' ')
+                    FROM cv_cvposition p LEFT JOIN dictionary_position d ON d.id = p.position_id
+                    WHERE p.cv_id = cv_cv.id
+                ), '')), 'B')
+                || setweight(to_tsvector('russian', coalesce((
+                    SELECT string_agg(c.name, ' ')
+                    FROM cv_cvposition p
+                    JOIN cv_cvpositioncompetence pc ON pc.cv_position_id = p.id
+                    JOIN dictionary_competence c ON c.id = pc.competence_id
+                    WHERE p.cv_id = cv_cv.id
+                ), '')), 'B')
+                || setweight(to_tsvector('russian', coalesce((
+                    SELECT string_agg(concat_ws(' ', t.title, t.description), ' ')
+                    FROM cv_cvcareer t
+                    WHERE t.cv_id = cv_cv.id
+                ), '')), 'C')
+                || setweight(to_tsvector('russian', coalesce((
+                    SELECT string_agg(t.name, ' ')
+                    FROM cv_cvproject t
+                    WHERE t.cv_id = cv_cv.id
+                ), '')), 'C')
+            ''',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
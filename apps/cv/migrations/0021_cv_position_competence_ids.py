@@ -0,0 +1,56 @@
+# Generated by Django 3.2.11 on 2022-02-09 12:00
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cv', '0020_cv_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cv',
+            name='position_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, editable=False, size=None, verbose_name='роли (денормализация)'),
+        ),
+        migrations.AddField(
+            model_name='cv',
+            name='competence_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, editable=False, size=None, verbose_name='компетенции (денормализация)'),
+        ),
+        migrations.AddField(
+            model_name='cv',
+            name='positions_year_started_min',
+            field=models.IntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='мин. год начала практики'),
+        ),
+        migrations.AddIndex(
+            model_name='cv',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['position_ids'], name='cv_cv_positio_08f040_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='cv',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['competence_ids'], name='cv_cv_compete_22d23f_gin'),
+        ),
+        migrations.RunSQL(
+            '''
+            UPDATE cv_cv SET
+                position_ids = ARRAY(
+                    SELECT DISTINCT p.position_id FROM cv_cvposition p
+                    WHERE p.cv_id = cv_cv.id AND p.position_id IS NOT NULL
+                    ORDER BY 1
+                ),
+                competence_ids = ARRAY(
+                    SELECT DISTINCT pc.competence_id
+                    FROM cv_cvposition p JOIN cv_cvpositioncompetence pc ON pc.cv_position_id = p.id
+                    WHERE p.cv_id = cv_cv.id
+                    ORDER BY 1
+                ),
+                positions_year_started_min = (SELECT MIN(p.year_started) FROM cv_cvposition p WHERE p.cv_id = cv_cv.id)
+            ''',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
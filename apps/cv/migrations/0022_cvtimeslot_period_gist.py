@@ -0,0 +1,39 @@
+# Generated by Django 3.2.11 on 2022-02-10 12:00
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.expressions
+import project.contrib.db.models
+
+
+def check_inverted_periods(apps, schema_editor):
+    """
+    Перевернутые периоды ломают daterange() в индексе, данные сами не правим - их нужно исправить вручную
+    """
+    CvTimeSlot = apps.get_model('cv', 'CvTimeSlot')
+    inverted = CvTimeSlot.objects.filter(date_from__gt=models.F('date_to'))
+    ids = list(inverted.order_by('id').values_list('id', flat=True)[:100])
+    if ids:
+        raise ValueError(
+            f'cv_cvtimeslot: {inverted.count()} rows with date_from > date_to, fix them before migrating. '
+            f'ids: {ids}'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cv', '0021_cv_position_competence_ids'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_inverted_periods, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cvtimeslot',
+            constraint=models.CheckConstraint(check=models.Q(('date_from__lte', django.db.models.expressions.F('date_to')), ('date_from__isnull', True), ('date_to__isnull', True), _connector='OR'), name='cv_cvtimeslot_date_from_lte_date_to'),
+        ),
+        migrations.AddIndex(
+            model_name='cvtimeslot',
+            index=django.contrib.postgres.indexes.GistIndex(project.contrib.db.models.DateRangeFromTo('date_from', 'date_to'), name='cv_cvtimeslot_period_gist'),
+        ),
+    ]
@@ -1,17 +1,25 @@
+import datetime
+import itertools
 from django.core.exceptions import ValidationError
-from typing import TYPE_CHECKING, Optional, List, Dict
+from typing import TYPE_CHECKING, Optional, List, Dict, Union, Iterable
 from pathlib import Path
 
 from django.db import models, transaction
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
 from django.utils import timezone
-from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, GistIndex
+from django.contrib.postgres.search import SearchVectorField, SearchQuery, SearchRank
 from django.utils.translation import gettext_lazy as _
 import reversion
 
-from project.contrib.db.models import DatesModelBase
+from psycopg2.extras import DateRange
+
+from project.contrib.db.models import DatesModelBase, DateRangeFromTo
 from project.contrib.is_call_from_admin import is_call_from_admin
 from acc.models import User
-from main.models import OrganizationContractor
+from main.models.visibility import UserVisibilityScope
 from cv import models_upload_to as upload_to
 
 if TYPE_CHECKING:
@@ -108,23 +116,122 @@ class CV(DatesModelBase):
         default=dict, verbose_name=_('доп. атрибуты'), editable=False,
         help_text=_('если вы не до конца понимаете назначение этого поля, вам лучше избежать редактирования')
     )
+    search_vector = SearchVectorField(null=True, editable=False, verbose_name=_('поисковый документ'))
+    position_ids = ArrayField(
+        models.IntegerField(), default=list, blank=True, editable=False, verbose_name=_('роли (денормализация)')
+    )
+    competence_ids = ArrayField(
+        models.IntegerField(), default=list, blank=True, editable=False, verbose_name=_('компетенции (денормализация)')
+    )
+    positions_year_started_min = models.IntegerField(
+        null=True, blank=True, db_index=True, editable=False, verbose_name=_('мин. год начала практики')
+    )
+
+    SEARCH_CONFIG = 'russian'
+    SEARCH_VECTOR_SQL = '''
+        setweight(to_tsvector('russian', concat_ws(' ', cv_cv.last_name, cv_cv.first_name, cv_cv.middle_name)), 'A')
+        || setweight(to_tsvector('russian', coalesce((
+            SELECT string_agg(concat_ws(' ', p.title, d.name), ' ')
+            FROM cv_cvposition p LEFT JOIN dictionary_position d ON d.id = p.position_id
+            WHERE p.cv_id = cv_cv.id
+        ), '')), 'B')
+        || setweight(to_tsvector('russian', coalesce((
+            SELECT string_agg(c.name, ' ')
+            FROM cv_cvposition p
+            JOIN cv_cvpositioncompetence pc ON pc.cv_position_id = p.id
+            JOIN dictionary_competence c ON c.id = pc.competence_id
+            WHERE p.cv_id = cv_cv.id
+        ), '')), 'B')
+        || setweight(to_tsvector('russian', coalesce((
+            SELECT string_agg(concat_ws(' ', t.title, t.description), ' ')
+            FROM cv_cvcareer t
+            WHERE t.cv_id = cv_cv.id
+        ), '')), 'C')
+        || setweight(to_tsvector('russian', coalesce((
+            SELECT string_agg(t.name, ' ')
+            FROM cv_cvproject t
+            WHERE t.cv_id = cv_cv.id
+        ), '')), 'C')
+    '''
+    POSITION_IDS_SQL = '''
+        ARRAY(
+            SELECT DISTINCT p.position_id FROM cv_cvposition p
+            WHERE p.cv_id = cv_cv.id AND p.position_id IS NOT NULL
+            ORDER BY 1
+        )
+    '''
+    COMPETENCE_IDS_SQL = '''
+        ARRAY(
+            SELECT DISTINCT pc.competence_id
+            FROM cv_cvposition p JOIN cv_cvpositioncompetence pc ON pc.cv_position_id = p.id
+            WHERE p.cv_id = cv_cv.id
+            ORDER BY 1
+        )
+    '''
+    POSITIONS_YEAR_STARTED_MIN_SQL = '''
+        (SELECT MIN(p.year_started) FROM cv_cvposition p WHERE p.cv_id = cv_cv.id)
+    '''
 
     class Meta:
         ordering = ['-id']
         indexes = [
-            GinIndex(fields=['attributes'])
+            GinIndex(fields=['attributes']),
+            GinIndex(fields=['search_vector']),
+            GinIndex(fields=['position_ids']),
+            GinIndex(fields=['competence_ids']),
         ]
         verbose_name = _('анкета')
         verbose_name_plural = _('анкеты')
 
     class QuerySet(models.QuerySet):
         def filter_by_user(self, user: User):
-            if user.is_superuser or user.is_staff:
-                return self
-            return self.filter(organization_contractor__in=OrganizationContractor.objects.filter_by_user(user))
+            return UserVisibilityScope.for_user(user).filter_by_organization_contractor(self)
 
         def filter_by_position_years(self, years: int) -> 'CV.QuerySet':
-            return self.filter(positions__year_started__lte=timezone.now().year - years)
+            return self.filter(positions_year_started_min__lte=timezone.now().year - years)
+
+        def filter_by_competencies_subtree_any(self, competencies_ids: Iterable[int]) -> 'CV.QuerySet':
+            from dictionary.models import Competence
+
+            subtree_ids = Competence.objects.get_subtree_ids(competencies_ids)
+            return self.filter(competence_ids__overlap=sorted(set(itertools.chain(*subtree_ids.values()))))
+
+        def filter_by_competencies_subtree_all(self, competencies_ids: Iterable[int]) -> 'CV.QuerySet':
+            """
+            В анкете есть компетенция из каждого поддерева, по `&&` на каждое поддерево в GIN индексе `competence_ids`
+            """
+            from dictionary.models import Competence
+
+            subtree_ids = Competence.objects.get_subtree_ids(competencies_ids)
+            if not subtree_ids:
+                return self.none()
+            queryset = self
+            for ids in subtree_ids.values():
+                queryset = queryset.filter(competence_ids__overlap=ids)
+            return queryset
+
+        def filter_by_available(
+                self,
+                date_from: Optional[datetime.date],
+                date_to: Optional[datetime.date]
+        ) -> 'CV.QuerySet':
+            """
+            Нет ни одного занятого таймслота, пересекающегося с периодом (anti-join по GiST индексу периода)
+            """
+            return self.filter(~models.Exists(
+                CvTimeSlot.objects.filter(
+                    cv_id=models.OuterRef('id'),
+                    is_free=False,
+                ).filter_by_period_overlap(date_from, date_to)
+            ))
+
+        def filter_by_search_query(self, value: str) -> 'CV.QuerySet':
+            query = SearchQuery(value, config=CV.SEARCH_CONFIG, search_type='websearch')
+            # ts_rank - real (float4), в double precision: иначе курсор keyset-пагинации (Python float)
+            # не совпадет с rank при сравнении и строки на границе страниц повторятся или пропадут
+            return self.filter(search_vector=query).annotate(
+                search_rank=Cast(SearchRank(models.F('search_vector'), query), models.FloatField())
+            )
 
     class Manager(models.Manager.from_queryset(QuerySet)):
         @classmethod
@@ -160,6 +267,47 @@ class CV(DatesModelBase):
                 'certificates__education_speciality', 'certificates__competencies',
             ]
 
+        @classmethod
+        def get_queryset_card_only(cls) -> List[str]:
+            return [
+                'id', 'organization_contractor', 'manager_rm', 'user', 'last_name', 'first_name', 'middle_name',
+                'photo', 'gender', 'birth_date', 'country', 'city', 'citizenship', 'days_to_contact',
+                'time_to_contact_from', 'time_to_contact_to', 'price',
+            ]
+
+        @classmethod
+        def get_queryset_card_select_related(cls) -> List[str]:
+            return ['info', 'country', 'city', 'citizenship']
+
+        @classmethod
+        def get_queryset_card_prefetch_related(cls) -> List[Union[str, models.Prefetch]]:
+            return [
+                models.Prefetch(
+                    'positions',
+                    queryset=CvPosition.objects.prefetch_related(None).select_related('position'),
+                ),
+                models.Prefetch(
+                    'positions__competencies',
+                    queryset=CvPositionCompetence.objects.select_related('competence'),
+                ),
+            ]
+
+        def refresh_denormalized(self, cv_ids: Iterable[int]) -> None:
+            """
+            Пересчет поискового документа и массивов ролей / компетенций одним UPDATE
+            """
+            cv_ids = set(filter(None, cv_ids))
+            if not cv_ids:
+                return
+            self.filter(id__in=cv_ids).update(
+                search_vector=RawSQL(CV.SEARCH_VECTOR_SQL, []),
+                position_ids=RawSQL(CV.POSITION_IDS_SQL, [], output_field=ArrayField(models.IntegerField())),
+                competence_ids=RawSQL(CV.COMPETENCE_IDS_SQL, [], output_field=ArrayField(models.IntegerField())),
+                positions_year_started_min=RawSQL(
+                    CV.POSITIONS_YEAR_STARTED_MIN_SQL, [], output_field=models.IntegerField()
+                ),
+            )
+
         @classmethod
         def get_queryset_request_requirements_prefetch_related(cls) -> List[str]:
             from main.models import Request, RequestRequirement
@@ -232,7 +380,8 @@ class CV(DatesModelBase):
 
 class CvLinkedObjectQuerySet(models.QuerySet):
     def filter_by_user(self, user: User):
-        return self.filter(cv__in=CV.objects.filter_by_user(user))
+        return UserVisibilityScope.for_user(user).filter_by_organization_contractor(
+            self, 'cv__organization_contractor_id')
 
 
 class CvLinkedObjectManager(models.Manager.from_queryset(CvLinkedObjectQuerySet)):
@@ -314,10 +463,34 @@ class CvTimeSlot(DatesModelBase):
         index_together = [
             [v.replace('-', '') for v in ordering]
         ]
+        indexes = [
+            GistIndex(DateRangeFromTo('date_from', 'date_to'), name='cv_cvtimeslot_period_gist'),
+        ]
+        constraints = [
+            # daterange(date_from, date_to) при date_from > date_to - ошибка Postgres, строку нельзя проиндексировать
+            models.CheckConstraint(
+                check=(
+                    models.Q(date_from__lte=models.F('date_to'))
+                    | models.Q(date_from__isnull=True)
+                    | models.Q(date_to__isnull=True)
+                ),
+                name='cv_cvtimeslot_date_from_lte_date_to',
+            ),
+        ]
         verbose_name = _('таймслот')
         verbose_name_plural = _('таймслоты')
 
-    class Manager(CvLinkedObjectManager):
+    class QuerySet(CvLinkedObjectQuerySet):
+        def filter_by_period_overlap(
+                self,
+                date_from: Optional[datetime.date],
+                date_to: Optional[datetime.date]
+        ) -> 'CvTimeSlot.QuerySet':
+            return self.alias(
+                period=DateRangeFromTo('date_from', 'date_to'),
+            ).filter(period__overlap=DateRange(date_from, date_to, bounds='[]'))
+
+    class Manager(CvLinkedObjectManager.from_queryset(QuerySet)):
         @classmethod
         def get_queryset_prefetch_related(cls) -> List[str]:
             return (
@@ -331,6 +504,11 @@ class CvTimeSlot(DatesModelBase):
 
     objects = Manager()
 
+    def clean(self):
+        super().clean()
+        if self.date_from and self.date_to and self.date_from > self.date_to:
+            raise ValidationError({'date_to': _('Дата окончания периода не может быть раньше даты начала')})
+
     def __str__(self):
         return f'{self.date_from} – {self.date_to} < {self.cv_id} / {self.id} >'
 
@@ -400,14 +578,19 @@ class CvPositionCompetence(DatesModelBase):
     class Manager(models.Manager):
         @transaction.atomic()
         def set_for_position(self, cv_position: CvPosition, data: List[Dict[str, int]]) -> List['CvPositionCompetence']:
+            from cv.services.cv_features_index import CvFeaturesIndex
+
             self.filter(cv_position=cv_position).delete()
-            return self.bulk_create([
+            result = self.bulk_create([
                 self.model(
                     cv_position=cv_position,
                     **{k: v for k, v in row.items() if k not in ['years']}
                 )
                 for row in data
             ])
+            CV.objects.refresh_denormalized([cv_position.cv_id])
+            CvFeaturesIndex.invalidate()
+            return result
 
     objects = Manager()
 
@@ -486,7 +669,8 @@ class CvCareerFile(FileModelAbstract):
 
     class QuerySet(models.QuerySet):
         def filter_by_user(self, user: User):
-            return self.filter(cv_career__in=CvCareer.objects.filter_by_user(user))
+            return UserVisibilityScope.for_user(user).filter_by_organization_contractor(
+                self, 'cv_career__cv__organization_contractor_id')
 
     objects = QuerySet.as_manager()
 
@@ -620,9 +804,36 @@ class CvFile(FileModelAbstract):
 
 
 class CvInfo(models.Model):
-    cv = models.OneToOneField('cv.CV', primary_key=True, on_delete=models.DO_NOTHING, related_name='info')
-    rating = models.IntegerField(null=True)
+    """
+    Обновляется сигналами RequestRequirementCv
+    """
+    cv = models.OneToOneField('cv.CV', primary_key=True, on_delete=models.CASCADE, related_name='info')
+    rating = models.FloatField(null=True, db_index=True, verbose_name=_('рейтинг'))
+    rating_count = models.IntegerField(default=0, verbose_name=_('кол-во оценок'))
 
     class Meta:
-        managed = False
-        db_table = 'v_cv_info'
+        verbose_name = _('анкета / сводная информация')
+        verbose_name_plural = _('анкеты / сводная информация')
+
+    class Manager(models.Manager):
+        def refresh_rating(self, cv_ids: Iterable[int]) -> None:
+            from main.models import RequestRequirementCv
+
+            cv_ids = list(CV.objects.filter(id__in=set(filter(None, cv_ids))).nocache().values_list('id', flat=True))
+            ratings = {
+                row['cv_id']: row
+                for row in RequestRequirementCv.objects.filter(cv_id__in=cv_ids).nocache().values('cv_id').annotate(
+                    rating=models.Avg('rating'),
+                    rating_count=models.Count('rating'),
+                ).order_by()
+            }
+            for cv_id in cv_ids:
+                self.update_or_create(cv_id=cv_id, defaults={
+                    'rating': ratings.get(cv_id, {}).get('rating'),
+                    'rating_count': ratings.get(cv_id, {}).get('rating_count') or 0,
+                })
+
+    objects = Manager()
+
+    def __str__(self):
+        return f'< {self.cv_id} >'
@@ -0,0 +1,68 @@
+from dataclasses import dataclass
+from typing import ClassVar, Dict, Iterable, List, Optional
+
+from django.db import connections
+
+from cv.models import CV
+
+__all__ = [
+    'CvFacetsService',
+]
+
+
+@dataclass
+class CvFacetsService:
+    """
+    Гистограммы по всем фасетам для отфильтрованного списка анкет одним SQL запросом:
+    отфильтрованные анкеты в CTE, по каждому фасету GROUP BY, все через UNION ALL
+    """
+    queryset: CV.QuerySet
+
+    FACETS_COLUMNS: ClassVar[Dict[str, str]] = {
+        'organization_contractor_id': 'organization_contractor_id',
+        'country_id': 'country_id',
+        'city_id': 'city_id',
+        'citizenship_id': 'citizenship_id',
+    }
+    FACETS_ARRAY_COLUMNS: ClassVar[Dict[str, str]] = {
+        'position_id': 'position_ids',
+        'competence_id': 'competence_ids',
+    }
+
+    @classmethod
+    def get_facets_names(cls) -> List[str]:
+        return [*cls.FACETS_COLUMNS, *cls.FACETS_ARRAY_COLUMNS]
+
+    def get_facets(self, facets: Optional[Iterable[str]] = None) -> Dict:
+        facets = [f for f in (facets or self.get_facets_names()) if f in self.get_facets_names()]
+        columns = sorted({
+            self.FACETS_COLUMNS.get(f) or self.FACETS_ARRAY_COLUMNS.get(f)
+            for f in facets
+        })
+        filtered_sql, filtered_params = self.queryset.order_by().values('id', *columns).query.sql_with_params()
+
+        parts = ['SELECT %s AS facet, NULL AS value, COUNT(*) AS count FROM f']
+        params = ['total']
+        for facet in facets:
+            if column := self.FACETS_COLUMNS.get(facet):
+                parts.append(
+                    f'SELECT %s, f.{column}, COUNT(*) FROM f WHERE f.{column} IS NOT NULL GROUP BY f.{column}'
+                )
+            else:
+                column = self.FACETS_ARRAY_COLUMNS[facet]
+                parts.append(
+                    f'SELECT %s, v.value, COUNT(*) FROM f CROSS JOIN LATERAL unnest(f.{column}) AS v(value) '
+                    f'GROUP BY v.value'
+                )
+            params.append(facet)
+        sql = 'WITH f AS (%s) %s ORDER BY 1, 3 DESC, 2' % (filtered_sql, ' UNION ALL '.join(parts))
+
+        result = {'total': 0, **{facet: [] for facet in facets}}
+        with connections[self.queryset.db].cursor() as cursor:
+            cursor.execute(sql, [*filtered_params, *params])
+            for facet, value, count in cursor.fetchall():
+                if facet == 'total':
+                    result['total'] = count
+                else:
+                    result[facet].append({'id': value, 'count': count})
+        return result
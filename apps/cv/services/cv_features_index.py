@@ -0,0 +1,173 @@
+import datetime
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import ClassVar, Iterable, Optional, Tuple
+
+import numpy
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from cv.models import CV, CvPosition, CvPositionCompetence, CvTimeSlot
+
+__all__ = [
+    'CvFeaturesIndex',
+    'CvFeaturesPairs',
+]
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CvFeaturesPairs:
+    """
+    Пары (строка анкеты в индексе, id признака, значение), отсортированы по id признака
+    """
+    rows: numpy.ndarray
+    ids: numpy.ndarray
+    values: numpy.ndarray
+
+    @classmethod
+    def build(cls, rows: numpy.ndarray, ids: numpy.ndarray, values: numpy.ndarray) -> 'CvFeaturesPairs':
+        order = numpy.argsort(ids, kind='stable')
+        return cls(rows=rows[order], ids=ids[order], values=values[order])
+
+    def get(self, feature_id: int) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        left = numpy.searchsorted(self.ids, feature_id, side='left')
+        right = numpy.searchsorted(self.ids, feature_id, side='right')
+        return self.rows[left:right], self.values[left:right]
+
+
+@dataclass
+class CvFeaturesIndex:
+    """
+    Признаки всех анкет для подбора кандидатов в numpy массивах, одна строка на анкету.
+    Собирается в памяти процесса, пересобирается если сигналы подняли версию и индекс старше
+    `CV_FEATURES_INDEX_MAX_AGE` секунд
+    """
+    version: int
+    built_at: float
+    cv_ids: numpy.ndarray
+    organization_contractor_ids: numpy.ndarray
+    city_ids: numpy.ndarray
+    prices: numpy.ndarray
+    positions: CvFeaturesPairs
+    """значение - опыт лет"""
+    competencies: CvFeaturesPairs
+    """значение - опыт лет"""
+    types_of_employment: CvFeaturesPairs
+    busy_rows: numpy.ndarray
+    busy_date_from: numpy.ndarray
+    busy_date_to: numpy.ndarray
+    """занятые периоды, даты как date.toordinal()"""
+
+    VERSION_CACHE_KEY: ClassVar[str] = 'cv:features-index:version'
+
+    _instance: ClassVar[Optional['CvFeaturesIndex']] = None
+    _lock: ClassVar[threading.Lock] = threading.Lock()
+
+    @classmethod
+    def get(cls) -> 'CvFeaturesIndex':
+        version = cache.get(cls.VERSION_CACHE_KEY, 0)
+        instance = cls._instance
+        if instance is None or (
+                instance.version != version
+                and time.monotonic() - instance.built_at > settings.CV_FEATURES_INDEX_MAX_AGE
+        ):
+            with cls._lock:
+                if cls._instance is instance:
+                    cls._instance = cls.build(version)
+            instance = cls._instance
+        return instance
+
+    @classmethod
+    def invalidate(cls) -> None:
+        transaction.on_commit(cls._bump_version)
+
+    @classmethod
+    def _bump_version(cls) -> None:
+        try:
+            cache.incr(cls.VERSION_CACHE_KEY)
+        except ValueError:
+            cache.set(cls.VERSION_CACHE_KEY, 1, None)
+
+    @classmethod
+    def build(cls, version: int) -> 'CvFeaturesIndex':
+        started_at = time.monotonic()
+        current_year = timezone.now().year
+
+        cv_rows = list(CV.objects.nocache().order_by('id').values_list(
+            'id', 'organization_contractor_id', 'city_id', 'price'
+        ))
+        cv_ids = numpy.fromiter((row[0] for row in cv_rows), dtype=numpy.int64, count=len(cv_rows))
+
+        def _rows(values: Iterable[int]) -> Tuple[numpy.ndarray, numpy.ndarray]:
+            ids = numpy.fromiter(values, dtype=numpy.int64)
+            rows = numpy.searchsorted(cv_ids, ids)
+            is_valid = rows < len(cv_ids)
+            is_valid[is_valid] = cv_ids[rows[is_valid]] == ids[is_valid]
+            return rows, is_valid
+
+        def _pairs(items: list) -> CvFeaturesPairs:
+            rows, is_valid = _rows(row[0] for row in items)
+            ids = numpy.fromiter((row[1] for row in items), dtype=numpy.int64, count=len(items))
+            values = numpy.fromiter(
+                (current_year - row[2] if row[2] else 0 for row in items), dtype=numpy.float64, count=len(items)
+            )
+            return CvFeaturesPairs.build(rows[is_valid], ids[is_valid], values[is_valid])
+
+        busy = list(CvTimeSlot.objects.nocache().filter(is_free=False).values_list('cv_id', 'date_from', 'date_to'))
+        busy_rows, busy_is_valid = _rows(row[0] for row in busy)
+
+        instance = cls(
+            version=version,
+            built_at=time.monotonic(),
+            cv_ids=cv_ids,
+            organization_contractor_ids=numpy.fromiter(
+                (row[1] or 0 for row in cv_rows), dtype=numpy.int64, count=len(cv_rows)),
+            city_ids=numpy.fromiter((row[2] or 0 for row in cv_rows), dtype=numpy.int64, count=len(cv_rows)),
+            prices=numpy.fromiter(
+                (numpy.nan if row[3] is None else row[3] for row in cv_rows), dtype=numpy.float64, count=len(cv_rows)),
+            positions=_pairs(list(
+                CvPosition.objects.nocache().filter(position__isnull=False).values_list(
+                    'cv_id', 'position_id', 'year_started')
+            )),
+            competencies=_pairs(list(
+                CvPositionCompetence.objects.nocache().values_list(
+                    'cv_position__cv_id', 'competence_id', 'year_started')
+            )),
+            types_of_employment=_pairs(list(
+                (cv_id, type_of_employment_id, None)
+                for cv_id, type_of_employment_id in CV.types_of_employment.through.objects.nocache().values_list(
+                    'cv_id', 'typeofemployment_id')
+            )),
+            busy_rows=busy_rows[busy_is_valid],
+            busy_date_from=numpy.fromiter(
+                (row[1].toordinal() if row[1] else datetime.date.min.toordinal() for row in busy),
+                dtype=numpy.int64, count=len(busy),
+            )[busy_is_valid],
+            busy_date_to=numpy.fromiter(
+                (row[2].toordinal() if row[2] else datetime.date.max.toordinal() for row in busy),
+                dtype=numpy.int64, count=len(busy),
+            )[busy_is_valid],
+        )
+        logger.info('CvFeaturesIndex.build', extra={
+            'version': version,
+            'cv_count': len(cv_ids),
+            'seconds': round(time.monotonic() - started_at, 3),
+        })
+        return instance
+
+    def get_rows(self, cv_ids: Iterable[int]) -> numpy.ndarray:
+        ids = numpy.fromiter(cv_ids, dtype=numpy.int64)
+        rows = numpy.searchsorted(self.cv_ids, ids)
+        rows = rows[rows < len(self.cv_ids)]
+        return rows[numpy.isin(self.cv_ids[rows], ids)]
+
+    def get_busy_rows(self, date_from: Optional[datetime.date], date_to: Optional[datetime.date]) -> numpy.ndarray:
+        date_from = (date_from or datetime.date.min).toordinal()
+        date_to = (date_to or datetime.date.max).toordinal()
+        return numpy.unique(self.busy_rows[(self.busy_date_from <= date_to) & (self.busy_date_to >= date_from)])
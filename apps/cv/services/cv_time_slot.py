@@ -1,62 +1,119 @@
+import datetime
 import logging
-from dataclasses import dataclass
-from django.db import transaction
+from dataclasses import dataclass, field
+from typing import ClassVar, Dict, Iterable, List, Optional, Set, Tuple
 
-from main.models import RequestRequirementCvStatus
+from django.db import models, transaction
+from django.utils import timezone
 
-from cv.models import CV, CvTimeSlot
+from main.models import RequestRequirementCv, RequestRequirementCvStatus
+
+from cv.models import CV, CvTimeSlot, CvTimeSlotKind
+from cv.services.cv_features_index import CvFeaturesIndex
 
 __all__ = [
     'CvTimeSlotService',
+    'CvTimeSlotSyncResult',
 ]
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class CvTimeSlotSyncResult:
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+    cv_ids: Set[int] = field(default_factory=set)
+    """анкеты, у которых таймслоты отличались от ожидаемых"""
+
+
 @dataclass
 class CvTimeSlotService:
     cv: CV
 
+    SYNC_FIELDS: ClassVar[List[str]] = ['cv_id', 'kind', 'type_of_employment_id', 'date_from', 'date_to', 'is_free']
+
     @transaction.atomic
     def setup_requests_slots(self):
         logger.debug('CvTimeSlotService.setup', extra={'cv': self.cv})
-        self._clean_requests_slots()
-        self._setup_requests_slots()
-
-    def _clean_requests_slots(self):
-        self.cv.time_slots.filter(request_requirement_link__isnull=False).delete()
-
-    def _setup_requests_slots(self):
-        for_create = []
-        for request_requirement_link in (
-                self.cv.requests_requirements_links
-                        .filter(status=RequestRequirementCvStatus.WORKER)
-                        .prefetch_related('request_requirement')
-        ):
-            date_from = None
-            date_to = None
-            if (
-                    request_requirement_link.date_from
-                    or request_requirement_link.date_to
-            ):
-                date_from = request_requirement_link.date_from
-                date_to = request_requirement_link.date_to
-            elif (
-                    request_requirement_link.request_requirement.date_from
-                    or request_requirement_link.request_requirement.date_to
-            ):
-                date_from = request_requirement_link.request_requirement.date_from
-                date_to = request_requirement_link.request_requirement.date_to
-            if date_from and date_to:
-                for_create.append(
-                    CvTimeSlot(
-                        cv=self.cv,
-                        request_requirement_link=request_requirement_link,
-                        type_of_employment=request_requirement_link.request_requirement.type_of_employment,
-                        date_from=date_from,
-                        date_to=date_to,
-                        is_free=False,
-                    )
-                )
+        self.sync_requests_slots(RequestRequirementCv.objects.filter(cv=self.cv))
+
+    @classmethod
+    def sync_requests_slots_for_cv_ids(cls, cv_ids: Iterable[int], dry_run: bool = False) -> CvTimeSlotSyncResult:
+        return cls.sync_requests_slots(RequestRequirementCv.objects.filter(cv_id__in=set(cv_ids)), dry_run=dry_run)
+
+    @classmethod
+    @transaction.atomic
+    def sync_requests_slots(cls, links: models.QuerySet, dry_run: bool = False) -> CvTimeSlotSyncResult:
+        """
+        Приводит таймслоты связей анкет с требованиями к ожидаемым: меняет только отличающиеся.
+        `dry_run` - только посчитать расхождения
+        """
+        result = CvTimeSlotSyncResult()
+        expected = cls._get_expected_slots(links)
+        for_update = []
+        for_delete = []
+        for slot in CvTimeSlot.objects.prefetch_related(None).nocache().filter(
+                request_requirement_link__in=links.values('id')
+        ).order_by('id'):
+            slot_expected = expected.pop(slot.request_requirement_link_id, None)
+            if slot_expected is None:
+                for_delete.append(slot.id)
+                result.cv_ids.add(slot.cv_id)
+                continue
+            changed = {k: v for k, v in slot_expected.items() if getattr(slot, k) != v}
+            if changed:
+                result.cv_ids.update([slot.cv_id, slot_expected['cv_id']])
+                for k, v in changed.items():
+                    setattr(slot, k, v)
+                slot.updated_at = timezone.now()
+                for_update.append(slot)
+        for_create = [
+            CvTimeSlot(request_requirement_link_id=link_id, **slot_expected)
+            for link_id, slot_expected in expected.items()
+        ]
+        result.cv_ids.update(slot.cv_id for slot in for_create)
+        result.created, result.updated, result.deleted = len(for_create), len(for_update), len(for_delete)
+        if dry_run:
+            return result
+        if for_delete:
+            CvTimeSlot.objects.filter(id__in=for_delete).delete()
+        if for_update:
+            CvTimeSlot.objects.bulk_update(for_update, [*cls.SYNC_FIELDS, 'updated_at'])
         if for_create:
             CvTimeSlot.objects.bulk_create(for_create)
+        if for_create or for_update or for_delete:
+            CvFeaturesIndex.invalidate()
+        logger.debug('CvTimeSlotService.sync', extra={
+            'created': result.created, 'updated': result.updated, 'deleted': result.deleted,
+        })
+        return result
+
+    @classmethod
+    def _get_expected_slots(cls, links: models.QuerySet) -> Dict[int, Dict]:
+        expected = {}
+        for link in links.filter(status=RequestRequirementCvStatus.WORKER).select_related('request_requirement'):
+            date_from, date_to = cls._get_link_period(link)
+            if date_from and date_to and date_from > date_to:
+                # такой слот нарушит ограничение периода таймслота, остальные слоты анкеты все равно синхронизируем
+                logger.warning('cv time slot skipped: inverted period', extra={
+                    'request_requirement_cv_id': link.id, 'date_from': date_from, 'date_to': date_to,
+                })
+                continue
+            if date_from and date_to:
+                expected[link.id] = {
+                    'cv_id': link.cv_id,
+                    'kind': CvTimeSlotKind.REQUEST_REQUIREMENT,
+                    'type_of_employment_id': link.request_requirement.type_of_employment_id,
+                    'date_from': date_from,
+                    'date_to': date_to,
+                    'is_free': False,
+                }
+        return expected
+
+    @classmethod
+    def _get_link_period(cls, link: RequestRequirementCv) -> Tuple[Optional[datetime.date], Optional[datetime.date]]:
+        if link.date_from or link.date_to:
+            return link.date_from, link.date_to
+        return link.request_requirement.date_from, link.request_requirement.date_to
@@ -1,9 +1,19 @@
 import datetime
-from typing import List, Optional, Dict
+import functools
+import multiprocessing
+import operator
+import time
+from concurrent import futures
+from dataclasses import dataclass, field
+from json import JSONDecoder, JSONDecodeError
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 import re
 import logging
 import ujson as json
 from pathlib import Path
+from cacheops import invalidate_model
+from django.db import connections, models, transaction
+from django.utils import timezone
 from transliterate import translit
 from dateutil.parser import parse as date_parse
 
@@ -11,268 +21,98 @@ from main import models as main_models
 from dictionary import models as dictionary_models
 
 from cv import models as cv_models
+from cv.services.cv_features_index import CvFeaturesIndex
 
 logger = logging.getLogger(__name__)
 
-
-class ImportFwCvJson:
-    filepath: Path
-    skip_exists: bool
-    without_skills: bool
-    rows: List[Dict]
-    rows_len: int
-
-    organization_contractor: main_models.OrganizationContractor
-    fw_skills_root: dictionary_models.Competence
-
-    idents: Dict[str, int] = {}
-
-    countries: Dict[str, dictionary_models.Country] = {}
-    cities: Dict[str, dictionary_models.City] = {}
-    contact_types: Dict[str, dictionary_models.ContactType] = {}
-    competencies: Dict[str, dictionary_models.Competence] = {}
-    organizations: Dict[str, main_models.Organization] = {}
-    education_places: Dict[str, dictionary_models.EducationPlace] = {}
-    education_specialities: Dict[str, dictionary_models.EducationSpecialty] = {}
-
-    def __init__(self, filepath: Path, without_skills: bool = False, skip_exists: bool = False):
-        self.filepath = filepath
-        self.without_skills = without_skills
-        self.skip_exists = skip_exists
-        self.organization_contractor = main_models.OrganizationContractor.objects.get(id=42977)
-        self.fw_skills_root = dictionary_models.Competence.objects.get_or_create(name='FW import')[0]
-
-    def do_import(self) -> None:
-        logger.info('import FW .json', extra={'path': self.filepath})
-        self.rows = json.load(self.filepath.open())
-        self.rows_len = len(self.rows)
-
-        for i, row in enumerate(self.rows):
+JSON_ARRAY_SEPARATOR_RE = re.compile(r'[\s,]*')
+
+
+def _forget_inherited_db_connections() -> None:
+    """
+    Форк получает сокет соединения родителя: его нельзя ни использовать, ни закрывать (закроется у родителя),
+    просто забываем - Django откроет свое соединение при первом запросе
+    """
+    for connection in connections.all():
+        connection.connection = None
+
+
+def iter_json_array(filepath: Path, read_size: int = 1024 * 1024) -> Iterator[Dict]:
+    """
+    Элементы JSON массива верхнего уровня по одному, файл читается кусками по `read_size`
+    """
+    decoder = JSONDecoder()
+    with filepath.open(encoding='utf-8') as f:
+        buffer = f.read(read_size)
+        position = re.compile(r'\s*').match(buffer).end()
+        if not buffer.startswith('[', position):
+            raise ValueError(f'{filepath}: JSON array expected')
+        position += 1
+        is_eof = False
+        while True:
+            position = JSON_ARRAY_SEPARATOR_RE.match(buffer, position).end()
+            if buffer.startswith(']', position):
+                return
             try:
-                self._do_one(i, row)
-            except Exception:
-                raise Exception(json.dumps(row, indent=4, ensure_ascii=False))
-
-        print()
-        for ident, ident_rows_count in self.idents.items():
-            if ident_rows_count < 2:
+                item, position = decoder.raw_decode(buffer, position)
+            except JSONDecodeError:
+                if is_eof:
+                    raise
+                chunk = f.read(read_size)
+                is_eof = not chunk
+                buffer, position = buffer[position:] + chunk, 0
                 continue
-            logger.warning(f'{ident}: {ident_rows_count}')
-
-        # exit()
-
-    def _do_one(self, i: int, row: Dict) -> cv_models.CV:
-        ident = self._get_row_ident(row)
-        if ident not in self.idents:
-            self.idents[ident] = 0
-        self.idents[ident] += 1
+            yield item
 
-        cv = cv_models.CV.objects.filter(attributes__contains={'fw_json_import_ident': ident}).first()
-        cv_created = False
-        if not cv:
-            cv_created = True
-            cv = cv_models.CV(attributes={'fw_json_import_ident': ident})
 
-        log_msg = f'{i + 1}/{self.rows_len}\t{"+" if cv_created else ""}\t{ident}'
-
-        if not cv_created and self.skip_exists:
-            logger.info(log_msg + '\tSKIP')
-            return cv
-
-        cv.organization_contractor = self.organization_contractor
-        cv.last_name = row['lastName'] or None
-        cv.first_name = row['firstName'] or None
-        cv.middle_name = row['middleName'] or None
-        cv.attributes['fw_json'] = row
-
-        if row['birthDate']:
-            cv.birth_date = date_parse(row['birthDate'])
+class FwCvJsonRowParser:
+    @classmethod
+    def _str_prepare(cls, value: Optional[str]) -> Optional[str]:
+        if not value:
+            return value
+        return value.replace('\/', '/').replace('<br />', '\n').replace('<br>', '\n').strip()
 
-        country_name = self._str_prepare(row['location']['countryName'])
-        country = None
-        if country_name:
-            country = self.countries.get(country_name)
-            if not country:
-                country = dictionary_models.Country.objects.get_or_create(name=country_name)[0]
-                self.countries[country_name] = country
-            cv.country = country
-
-        city_name = self._str_prepare(row['location']['name'])
-        if city_name:
-            city = self.cities.get(city_name)
-            if not city:
-                city = dictionary_models.City.objects.get_or_create(
-                    name=city_name,
-                    country_id=country.id if country else 1  # Россия
-                )[0]
-                self.cities[city_name] = city
-            cv.city = city
-
-        cv.save()
-
-        if not cv_created:
-            cv_models.CvContact.objects.filter(cv=cv).delete()
-            cv_models.CvPosition.objects.filter(cv=cv).delete()
-            cv_models.CvCareer.objects.filter(cv=cv).delete()
-            cv_models.CvEducation.objects.filter(cv=cv).delete()
-            cv_models.CvCertificate.objects.filter(cv=cv).delete()
+    @classmethod
+    def _get_row_contact_by_type(cls, row: Dict, contact_type: str) -> Optional[str]:
+        for _ in row['contacts']:
+            if _['type'].lower() == contact_type:
+                return _['value']
 
-        contacts_for_create = []
+    @classmethod
+    def _get_row_contacts(cls, row: Dict) -> List[Tuple[str, str]]:
+        contacts = []
         for contact_type_name, contact_value in [
-            ['email', self._get_row_contact_by_type(row, 'email')],
-            ['Телефон', self._get_row_contact_by_type(row, 'mobile')],
+            ['email', cls._get_row_contact_by_type(row, 'email')],
+            ['Телефон', cls._get_row_contact_by_type(row, 'mobile')],
             *[
                 [_['type_field'], _['value']] for _ in row['links']
             ]
         ]:
-            if not contact_value:
-                continue
-            contact_type_name = self._str_prepare(contact_type_name)
-            contact_type = self.contact_types.get(contact_type_name)
-            if not contact_type:
-                contact_type = dictionary_models.ContactType.objects.get_or_create(name=contact_type_name)[0]
-                self.contact_types[contact_type_name] = contact_type
-            contacts_for_create.append(
-                cv_models.CvContact(cv=cv, value=contact_value, contact_type=contact_type)
-            )
-        if contacts_for_create:
-            cv_models.CvContact.objects.bulk_create(contacts_for_create)
+            contact_type_name = cls._str_prepare(contact_type_name)
+            if contact_value and contact_type_name:
+                contacts.append((contact_type_name, contact_value))
+        return contacts
 
-        position_name = self._str_prepare(row['position'])
+    @classmethod
+    def _get_row_position(cls, row: Dict) -> Tuple[Optional[str], Optional[int]]:
+        position_name = cls._str_prepare(row['position'])
         position_year_started = None
-        cv_position = None
         if not position_name:
             if row['experience']:
-                position_name = self._str_prepare(row['experience'][0]['position'])
+                position_name = cls._str_prepare(row['experience'][0]['position'])
                 position_year_started = row['experience'][0]['fromYear']
                 for _ in row['experience']:
-                    if position_name == self._str_prepare(_['position']):
+                    if position_name == cls._str_prepare(_['position']):
                         position_year_started = min(position_year_started, _['fromYear'])
-        if position_name:
-            cv_position = cv_models.CvPosition.objects.create(
-                cv=cv, title=position_name, year_started=position_year_started)
-        if cv_position and not self.without_skills:
-            skills = set(list(map(lambda x: x[:499], map(self._str_prepare, row['skills']))))
-            if skills:
-                for skill in skills - (set(self.competencies.keys()) & skills):
-                    competence = dictionary_models.Competence.objects.filter(name=skill).first()
-                    if not competence:
-                        competence = dictionary_models.Competence.objects.create(
-                            name=skill,
-                            parent=self.fw_skills_root
-                        )
-                    self.competencies[skill] = competence
-                competencies_for_create = [
-                    cv_models.CvPositionCompetence(
-                        cv_position=cv_position,
-                        competence=self.competencies[skill]
-                    )
-                    for skill in skills
-                ]
-                if competencies_for_create:
-                    cv_models.CvPositionCompetence.objects.bulk_create(competencies_for_create)
-
-        career_for_create = []
-        for experience in row['experience']:
-            organization_name = (self._str_prepare(experience['company']) or 'ИП Тайна П.М.')[:499]
-            organization = self.organizations.get(organization_name)
-            if not organization:
-                organization = main_models.Organization.objects.get_or_create(
-                    name=organization_name)[0]
-                self.organizations[organization_name] = organization
-            career_for_create.append(
-                cv_models.CvCareer(
-                    cv=cv,
-                    organization=organization,
-                    title=experience['position'],
-                    description=experience['description'],
-                    date_from=(
-                        datetime.date(year=experience['fromYear'], month=max(experience['fromMonth'] or -1, 1), day=1)
-                        if experience['fromYear'] and experience['fromYear'] > 0
-                        else None
-                    ),
-                    date_to=(
-                        datetime.date(year=experience['toYear'], month=max(experience['toMonth'] or -1, 1), day=1)
-                        if experience['toYear'] and experience['toYear'] > 0
-                        else None
-                    ),
-                )
-            )
-        if career_for_create:
-            cv_models.CvCareer.objects.bulk_create(career_for_create)
-
-        education_for_create = []
-        for education in row['education']:
-            education_place_name = self._str_prepare(education['university'])
-            education_place = None
-            if education_place_name:
-                education_place = self.education_places.get(education_place_name)
-                if not education_place:
-                    education_place = dictionary_models.EducationPlace.objects.get_or_create(
-                        name=education_place_name)[0]
-                    self.education_places[education_place] = education_place
-            education_speciality_name = self._str_prepare(education['faculty'])
-            education_speciality = None
-            if education_speciality_name:
-                education_speciality = self.education_specialities.get(education_speciality_name)
-                if not education_speciality:
-                    education_speciality = dictionary_models.EducationSpecialty.objects.get_or_create(
-                        name=education_speciality_name)[0]
-                    self.education_specialities[education_speciality_name] = education_speciality
-            education_for_create.append(
-                cv_models.CvEducation(
-                    cv=cv,
-                    education_place=education_place,
-                    education_speciality=education_speciality,
-                    date_to=(
-                        datetime.date(year=education['graduateYear'], month=6, day=15)
-                        if education['graduateYear'] and education['graduateYear'] > 0 else None
-                    )
-                )
-            )
-        if education_for_create:
-            cv_models.CvEducation.objects.bulk_create(education_for_create)
-
-        certificate_for_create = []
-        for course in row['courses']:
-            education_place_name = self._str_prepare(course['organization'])
-            education_place = None
-            if education_place_name:
-                education_place = self.education_places.get(education_place_name)
-                if not education_place:
-                    education_place = dictionary_models.EducationPlace.objects.get_or_create(
-                        name=education_place_name)[0]
-                    self.education_places[education_place] = education_place
-            certificate_for_create.append(
-                cv_models.CvCertificate(
-                    cv=cv,
-                    education_place=education_place,
-                    date=(
-                        datetime.date(year=course['year'], month=6, day=15)
-                        if course['year'] and course['year'] > -1
-                        else None
-                    ),
-                    name=course['name'],
-                )
-            )
-        if certificate_for_create:
-            cv_models.CvCertificate.objects.bulk_create(certificate_for_create)
-
-        logger.info(log_msg)
-
-        return cv
+        return position_name, position_year_started
 
     @classmethod
-    def _str_prepare(cls, value: Optional[str]) -> Optional[str]:
-        if not value:
-            return value
-        return value.replace('\/', '/').replace('<br />', '\n').replace('<br>', '\n').strip()
+    def _get_row_skills(cls, row: Dict) -> Set[str]:
+        return set(map(lambda x: x[:499], filter(None, map(cls._str_prepare, row['skills']))))
 
     @classmethod
-    def _get_row_contact_by_type(cls, row: Dict, contact_type: str) -> Optional[str]:
-        for _ in row['contacts']:
-            if _['type'].lower() == contact_type:
-                return _['value']
+    def _get_experience_organization_name(cls, experience: Dict) -> str:
+        return (cls._str_prepare(experience['company']) or 'ИП Тайна П.М.')[:499]
 
     @classmethod
     def _get_row_ident(cls, row: Dict) -> str:
@@ -297,3 +137,435 @@ class ImportFwCvJson:
                 reversed=True,
             ).lower()
         )
+
+
+@dataclass
+class FwCvJsonDictionaries:
+    """
+    id справочников по названиям, только для строк одного куска
+    """
+    countries: Dict[str, int] = field(default_factory=dict)
+    cities: Dict[Tuple[str, int], int] = field(default_factory=dict)
+    """{ (город, id страны): id }"""
+    contact_types: Dict[str, int] = field(default_factory=dict)
+    competencies: Dict[str, int] = field(default_factory=dict)
+    organizations: Dict[str, int] = field(default_factory=dict)
+    education_places: Dict[str, int] = field(default_factory=dict)
+    education_specialities: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class FwCvJsonChunk(FwCvJsonRowParser):
+    """
+    Кусок строк: анкеты и их связанные объекты пачками в одной транзакции.
+    Справочники уже разрешены в родительском процессе, поэтому куски можно грузить параллельно
+    """
+    number: int
+    rows: List[Dict]
+    dictionaries: FwCvJsonDictionaries
+    organization_contractor_id: int
+    without_skills: bool
+    skip_exists: bool
+
+    BATCH_SIZE = 1000
+    CV_UPDATE_FIELDS = [
+        'organization_contractor', 'last_name', 'first_name', 'middle_name', 'attributes',
+        'birth_date', 'country', 'city', 'updated_at',
+    ]
+
+    @transaction.atomic
+    def do_import(self) -> int:
+        # строки с одним ident внутри куска - как при построчном импорте побеждает последняя
+        rows = {self._get_row_ident(row): row for row in self.rows}
+        cv_exists = {
+            cv.attributes['fw_json_import_ident']: cv
+            for cv in cv_models.CV.objects.nocache().filter(functools.reduce(operator.or_, [
+                models.Q(attributes__contains={'fw_json_import_ident': ident})
+                for ident in rows
+            ]))
+        }
+        if self.skip_exists:
+            rows = {ident: row for ident, row in rows.items() if ident not in cv_exists}
+        if not rows:
+            return 0
+
+        cv_by_ident = {}
+        for ident, row in rows.items():
+            cv = cv_exists.get(ident) or cv_models.CV(attributes={'fw_json_import_ident': ident})
+            self._fill_cv(cv, row)
+            cv_by_ident[ident] = cv
+        cv_for_update = [cv for cv in cv_by_ident.values() if cv.id]
+        cv_models.CV.objects.bulk_create(
+            [cv for cv in cv_by_ident.values() if not cv.id],
+            batch_size=self.BATCH_SIZE
+        )
+        if cv_for_update:
+            now = timezone.now()
+            for cv in cv_for_update:
+                cv.updated_at = now
+            cv_models.CV.objects.bulk_update(cv_for_update, self.CV_UPDATE_FIELDS, batch_size=self.BATCH_SIZE)
+            cv_for_update_ids = [cv.id for cv in cv_for_update]
+            for model in [
+                cv_models.CvContact, cv_models.CvPosition, cv_models.CvCareer,
+                cv_models.CvEducation, cv_models.CvCertificate,
+            ]:
+                model.objects.filter(cv_id__in=cv_for_update_ids).delete()
+
+        contacts_for_create = []
+        positions_for_create = []
+        positions_skills = []
+        career_for_create = []
+        education_for_create = []
+        certificate_for_create = []
+        for ident, row in rows.items():
+            cv = cv_by_ident[ident]
+            contacts_for_create.extend(self._get_contacts(cv, row))
+            position_name, position_year_started = self._get_row_position(row)
+            if position_name:
+                positions_for_create.append(cv_models.CvPosition(
+                    cv=cv, title=position_name, year_started=position_year_started))
+                positions_skills.append(set() if self.without_skills else self._get_row_skills(row))
+            career_for_create.extend(self._get_career(cv, row))
+            education_for_create.extend(self._get_education(cv, row))
+            certificate_for_create.extend(self._get_certificates(cv, row))
+
+        cv_models.CvContact.objects.bulk_create(contacts_for_create, batch_size=self.BATCH_SIZE)
+        cv_models.CvPosition.objects.bulk_create(positions_for_create, batch_size=self.BATCH_SIZE)
+        cv_models.CvPositionCompetence.objects.bulk_create(
+            [
+                cv_models.CvPositionCompetence(
+                    cv_position=cv_position,
+                    competence_id=self.dictionaries.competencies[skill]
+                )
+                for cv_position, skills in zip(positions_for_create, positions_skills)
+                for skill in skills
+            ],
+            batch_size=self.BATCH_SIZE
+        )
+        cv_models.CvCareer.objects.bulk_create(career_for_create, batch_size=self.BATCH_SIZE)
+        cv_models.CvEducation.objects.bulk_create(education_for_create, batch_size=self.BATCH_SIZE)
+        cv_models.CvCertificate.objects.bulk_create(certificate_for_create, batch_size=self.BATCH_SIZE)
+
+        cv_models.CV.objects.refresh_denormalized([cv.id for cv in cv_by_ident.values()])
+        return len(rows)
+
+    def _fill_cv(self, cv: cv_models.CV, row: Dict) -> None:
+        cv.organization_contractor_id = self.organization_contractor_id
+        cv.last_name = row['lastName'] or None
+        cv.first_name = row['firstName'] or None
+        cv.middle_name = row['middleName'] or None
+        cv.attributes['fw_json'] = row
+        if row['birthDate']:
+            cv.birth_date = date_parse(row['birthDate'])
+        country_id = None
+        if country_name := self._str_prepare(row['location']['countryName']):
+            country_id = cv.country_id = self.dictionaries.countries[country_name]
+        if city_name := self._str_prepare(row['location']['name']):
+            cv.city_id = self.dictionaries.cities[(city_name, country_id or 1)]
+
+    def _get_contacts(self, cv: cv_models.CV, row: Dict) -> List[cv_models.CvContact]:
+        return [
+            cv_models.CvContact(
+                cv=cv, value=contact_value, contact_type_id=self.dictionaries.contact_types[contact_type_name]
+            )
+            for contact_type_name, contact_value in self._get_row_contacts(row)
+        ]
+
+    def _get_career(self, cv: cv_models.CV, row: Dict) -> List[cv_models.CvCareer]:
+        return [
+            cv_models.CvCareer(
+                cv=cv,
+                organization_id=self.dictionaries.organizations[self._get_experience_organization_name(experience)],
+                title=experience['position'],
+                description=experience['description'],
+                date_from=(
+                    datetime.date(year=experience['fromYear'], month=max(experience['fromMonth'] or -1, 1), day=1)
+                    if experience['fromYear'] and experience['fromYear'] > 0
+                    else None
+                ),
+                date_to=(
+                    datetime.date(year=experience['toYear'], month=max(experience['toMonth'] or -1, 1), day=1)
+                    if experience['toYear'] and experience['toYear'] > 0
+                    else None
+                ),
+            )
+            for experience in row['experience']
+        ]
+
+    def _get_education(self, cv: cv_models.CV, row: Dict) -> List[cv_models.CvEducation]:
+        return [
+            cv_models.CvEducation(
+                cv=cv,
+                education_place_id=self.dictionaries.education_places.get(
+                    self._str_prepare(education['university'])),
+                education_speciality_id=self.dictionaries.education_specialities.get(
+                    self._str_prepare(education['faculty'])),
+                date_to=(
+                    datetime.date(year=education['graduateYear'], month=6, day=15)
+                    if education['graduateYear'] and education['graduateYear'] > 0 else None
+                )
+            )
+            for education in row['education']
+        ]
+
+    def _get_certificates(self, cv: cv_models.CV, row: Dict) -> List[cv_models.CvCertificate]:
+        return [
+            cv_models.CvCertificate(
+                cv=cv,
+                education_place_id=self.dictionaries.education_places.get(
+                    self._str_prepare(course['organization'])),
+                date=(
+                    datetime.date(year=course['year'], month=6, day=15)
+                    if course['year'] and course['year'] > -1
+                    else None
+                ),
+                name=course['name'],
+            )
+            for course in row['courses']
+        ]
+
+
+class ImportFwCvJson(FwCvJsonRowParser):
+    """
+    Импорт выгрузки FW: файл читается потоком, строки режутся на куски по `chunk_size`,
+    справочники куска разрешаются пачкой здесь, анкеты куска грузятся в пуле из `workers` процессов.
+    Номера загруженных кусков пишутся в checkpoint файл, повторный запуск их пропускает
+    """
+    filepath: Path
+    skip_exists: bool
+    without_skills: bool
+    workers: int
+    chunk_size: int
+    checkpoint_path: Path
+
+    organization_contractor: main_models.OrganizationContractor
+    fw_skills_root: dictionary_models.Competence
+
+    def __init__(
+            self,
+            filepath: Path,
+            without_skills: bool = False,
+            skip_exists: bool = False,
+            workers: int = 1,
+            chunk_size: int = 500,
+            checkpoint_path: Optional[Path] = None,
+    ):
+        self.filepath = filepath
+        self.without_skills = without_skills
+        self.skip_exists = skip_exists
+        self.workers = max(workers, 1)
+        self.chunk_size = chunk_size
+        self.checkpoint_path = checkpoint_path or filepath.with_name(f'{filepath.name}.checkpoint.json')
+        self.organization_contractor = main_models.OrganizationContractor.objects.get(id=42977)
+        self.fw_skills_root = dictionary_models.Competence.objects.get_or_create(name='FW import')[0]
+
+        self.idents: Dict[str, int] = {}
+        self.chunks_done: Set[int] = set()
+        self.rows_imported = 0
+        self.started_at = 0.0
+
+        self.countries: Dict[str, int] = {}
+        self.cities: Dict[Tuple[str, int], int] = {}
+        self.contact_types: Dict[str, int] = {}
+        self.competencies: Dict[str, int] = {}
+        self.organizations: Dict[str, int] = {}
+        self.education_places: Dict[str, int] = {}
+        self.education_specialities: Dict[str, int] = {}
+
+    def do_import(self) -> None:
+        logger.info('import FW .json', extra={'path': self.filepath})
+        self.started_at = time.monotonic()
+        self._load_checkpoint()
+        executor = None
+        if self.workers > 1:
+            # процессы пула форкаются по мере надобности, уже при открытом соединении родителя
+            executor = futures.ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=_forget_inherited_db_connections,
+            )
+        in_progress: Dict[futures.Future, int] = {}
+        # повтор ident из уже отданного куска - после всех кусков и по порядку, чтобы параллельные куски
+        # не создали две анкеты на один ident
+        rows_repeated = []
+        try:
+            number = -1
+            for number, rows in enumerate(self._iter_chunks(rows_repeated)):
+                if number in self.chunks_done:
+                    continue
+                chunk = self._get_chunk(number, rows)
+                if not executor:
+                    self._chunk_done(number, chunk.do_import())
+                    continue
+                in_progress[executor.submit(chunk.do_import)] = number
+                if len(in_progress) >= self.workers * 2:
+                    self._wait(in_progress, futures.FIRST_COMPLETED)
+            self._wait(in_progress, futures.ALL_COMPLETED)
+            for i in range(0, len(rows_repeated), self.chunk_size):
+                number += 1
+                if number not in self.chunks_done:
+                    self._chunk_done(number, self._get_chunk(number, rows_repeated[i:i + self.chunk_size]).do_import())
+        finally:
+            if executor:
+                self._wait(in_progress, futures.ALL_COMPLETED, raise_errors=False)
+                executor.shutdown()
+            self._save_checkpoint()
+            for model in [
+                cv_models.CV, cv_models.CvContact, cv_models.CvPosition, cv_models.CvPositionCompetence,
+                cv_models.CvCareer, cv_models.CvEducation, cv_models.CvCertificate,
+            ]:
+                invalidate_model(model)
+            CvFeaturesIndex.invalidate()
+
+        self.checkpoint_path.unlink(missing_ok=True)
+        for ident, ident_rows_count in self.idents.items():
+            if ident_rows_count < 2:
+                continue
+            logger.warning(f'{ident}: {ident_rows_count}')
+
+    def _iter_chunks(self, rows_repeated: List[Dict]) -> Iterator[List[Dict]]:
+        rows = []
+        for row in iter_json_array(self.filepath):
+            ident = self._get_row_ident(row)
+            self.idents[ident] = self.idents.get(ident, 0) + 1
+            if self.idents[ident] > 1:
+                rows_repeated.append(row)
+                continue
+            rows.append(row)
+            if len(rows) >= self.chunk_size:
+                yield rows
+                rows = []
+        if rows:
+            yield rows
+
+    def _get_chunk(self, number: int, rows: List[Dict]) -> FwCvJsonChunk:
+        return FwCvJsonChunk(
+            number=number,
+            rows=rows,
+            dictionaries=self._get_dictionaries(rows),
+            organization_contractor_id=self.organization_contractor.id,
+            without_skills=self.without_skills,
+            skip_exists=self.skip_exists,
+        )
+
+    def _wait(self, in_progress: Dict[futures.Future, int], return_when: str, raise_errors: bool = True) -> None:
+        done, _ = futures.wait(in_progress, return_when=return_when)
+        for future in done:
+            number = in_progress.pop(future)
+            if error := future.exception():
+                logger.error(f'chunk {number}: {error!r}')
+                if raise_errors:
+                    raise error
+                continue
+            self._chunk_done(number, future.result())
+
+    def _chunk_done(self, number: int, rows_count: int) -> None:
+        self.chunks_done.add(number)
+        self.rows_imported += rows_count
+        self._save_checkpoint()
+        seconds = time.monotonic() - self.started_at
+        logger.info(
+            f'chunk {number}\t{self.rows_imported} rows\t{self.rows_imported / max(seconds, 0.001):.1f} rows/sec'
+        )
+
+    def _load_checkpoint(self) -> None:
+        if not self.checkpoint_path.exists():
+            return
+        checkpoint = json.loads(self.checkpoint_path.read_text())
+        if checkpoint['chunk_size'] != self.chunk_size:
+            raise ValueError(
+                f'{self.checkpoint_path}: chunk size {checkpoint["chunk_size"]} expected, '
+                f'delete checkpoint to start over'
+            )
+        self.chunks_done = set(checkpoint['chunks_done'])
+        logger.info(f'resume from {self.checkpoint_path}, {len(self.chunks_done)} chunks done')
+
+    def _save_checkpoint(self) -> None:
+        path = self.checkpoint_path.with_name(f'{self.checkpoint_path.name}.tmp')
+        path.write_text(json.dumps({
+            'filepath': str(self.filepath),
+            'chunk_size': self.chunk_size,
+            'chunks_done': sorted(self.chunks_done),
+        }))
+        path.replace(self.checkpoint_path)
+
+    def _get_dictionaries(self, rows: List[Dict]) -> FwCvJsonDictionaries:
+        countries = set()
+        cities = set()
+        contact_types = set()
+        competencies = set()
+        organizations = set()
+        education_places = set()
+        education_specialities = set()
+        for row in rows:
+            country_name = self._str_prepare(row['location']['countryName'])
+            if country_name:
+                countries.add(country_name)
+            if city_name := self._str_prepare(row['location']['name']):
+                cities.add((city_name, country_name))
+            contact_types.update(contact_type_name for contact_type_name, _ in self._get_row_contacts(row))
+            if not self.without_skills and self._get_row_position(row)[0]:
+                competencies.update(self._get_row_skills(row))
+            organizations.update(map(self._get_experience_organization_name, row['experience']))
+            education_places.update(filter(None, [
+                *[self._str_prepare(_['university']) for _ in row['education']],
+                *[self._str_prepare(_['organization']) for _ in row['courses']],
+            ]))
+            education_specialities.update(filter(None, [self._str_prepare(_['faculty']) for _ in row['education']]))
+
+        dictionaries = FwCvJsonDictionaries(
+            countries=self._resolve(dictionary_models.Country, countries, self.countries),
+            contact_types=self._resolve(dictionary_models.ContactType, contact_types, self.contact_types),
+            organizations=self._resolve(dictionary_models.Organization, organizations, self.organizations),
+            education_places=self._resolve(dictionary_models.EducationPlace, education_places, self.education_places),
+            education_specialities=self._resolve(
+                dictionary_models.EducationSpecialty, education_specialities, self.education_specialities),
+        )
+        dictionaries.cities = self._resolve_cities({
+            (city_name, dictionaries.countries[country_name] if country_name else 1)  # 1 - Россия
+            for city_name, country_name in cities
+        })
+        dictionaries.competencies = self._resolve_competencies(competencies)
+        return dictionaries
+
+    @classmethod
+    def _resolve(cls, model, names: Set[str], cached: Dict[str, int]) -> Dict[str, int]:
+        """
+        Недостающие в `cached` названия одним запросом, не найденные создаются одним INSERT
+        """
+        if missing := names - cached.keys():
+            for name, pk in model.objects.nocache().filter(name__in=missing).order_by('-id').values_list('name', 'id'):
+                cached[name] = pk
+            if for_create := [model(name=name) for name in missing - cached.keys()]:
+                for o in model.objects.bulk_create(for_create):
+                    cached[o.name] = o.id
+                invalidate_model(model)
+        return {name: cached[name] for name in names}
+
+    def _resolve_cities(self, keys: Set[Tuple[str, int]]) -> Dict[Tuple[str, int], int]:
+        if missing := keys - self.cities.keys():
+            for name, country_id, pk in dictionary_models.City.objects.nocache().filter(
+                    name__in={name for name, _ in missing},
+                    country_id__in={country_id for _, country_id in missing},
+            ).order_by('-id').values_list('name', 'country_id', 'id'):
+                self.cities[(name, country_id)] = pk
+            if for_create := [
+                dictionary_models.City(name=name, country_id=country_id)
+                for name, country_id in missing - self.cities.keys()
+            ]:
+                for o in dictionary_models.City.objects.bulk_create(for_create):
+                    self.cities[(o.name, o.country_id)] = o.id
+                invalidate_model(dictionary_models.City)
+        return {key: self.cities[key] for key in keys}
+
+    def _resolve_competencies(self, names: Set[str]) -> Dict[str, int]:
+        if missing := names - self.competencies.keys():
+            for name, pk in dictionary_models.Competence.objects.nocache().filter(
+                    name__in=missing
+            ).order_by('-id').values_list('name', 'id'):
+                self.competencies[name] = pk
+            for o in dictionary_models.Competence.objects.bulk_create_children(
+                    self.fw_skills_root, sorted(missing - self.competencies.keys())
+            ):
+                self.competencies[o.name] = o.id
+        return {name: self.competencies[name] for name in names}
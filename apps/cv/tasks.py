@@ -0,0 +1,97 @@
+import logging
+from typing import Iterable
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, transaction
+from django_redis import get_redis_connection
+
+from project.celery import app
+from cv.services.cv_time_slot import CvTimeSlotService, CvTimeSlotSyncResult
+
+__all__ = [
+    'cv_time_slots_sync_enqueue',
+    'cv_time_slots_sync',
+]
+
+logger = logging.getLogger(__name__)
+
+CV_TIME_SLOTS_SYNC_QUEUE_KEY = 'cv:time-slots-sync:cv-ids'
+CV_TIME_SLOTS_SYNC_SCHEDULED_KEY = 'cv:time-slots-sync:scheduled'
+CV_TIME_SLOTS_SYNC_RETRIES_KEY = 'cv:time-slots-sync:retries'
+
+
+def cv_time_slots_sync_enqueue(cv_ids: Iterable[int]) -> None:
+    """
+    Пересчет таймслотов анкет после коммита. Анкеты копятся в redis множестве,
+    пока задача не запущена, новая не ставится - частые правки схлопываются в один пересчет на анкету
+    """
+    cv_ids = set(filter(None, cv_ids))
+    if not cv_ids:
+        return
+    if not settings.CV_TIME_SLOTS_SYNC_ASYNC:
+        CvTimeSlotService.sync_requests_slots_for_cv_ids(cv_ids)
+        return
+    transaction.on_commit(lambda: _enqueue(cv_ids))
+
+
+def _enqueue(cv_ids: Iterable[int]) -> None:
+    redis = get_redis_connection('default')
+    redis.sadd(CV_TIME_SLOTS_SYNC_QUEUE_KEY, *cv_ids)
+    if redis.set(CV_TIME_SLOTS_SYNC_SCHEDULED_KEY, 1, nx=True, ex=settings.CV_TIME_SLOTS_SYNC_SCHEDULED_TTL):
+        cv_time_slots_sync.apply_async(countdown=settings.CV_TIME_SLOTS_SYNC_COUNTDOWN)
+
+
+@app.task()
+def cv_time_slots_sync():
+    redis = get_redis_connection('default')
+    redis.delete(CV_TIME_SLOTS_SYNC_SCHEDULED_KEY)
+    with redis.pipeline() as pipe:
+        pipe.smembers(CV_TIME_SLOTS_SYNC_QUEUE_KEY)
+        pipe.delete(CV_TIME_SLOTS_SYNC_QUEUE_KEY)
+        cv_ids, _ = pipe.execute()
+    cv_ids = {int(cv_id) for cv_id in cv_ids}
+    if not cv_ids:
+        return
+    try:
+        result = CvTimeSlotService.sync_requests_slots_for_cv_ids(cv_ids)
+    except Exception:
+        logger.warning('cv_time_slots_sync batch failed, syncing each cv', exc_info=True)
+        result = _sync_each(cv_ids)
+    else:
+        redis.hdel(CV_TIME_SLOTS_SYNC_RETRIES_KEY, *cv_ids)
+    logger.info('cv_time_slots_sync', extra={
+        'cv_count': len(cv_ids),
+        'created': result.created,
+        'updated': result.updated,
+        'deleted': result.deleted,
+    })
+
+
+def _sync_each(cv_ids: Iterable[int]) -> CvTimeSlotSyncResult:
+    """
+    По одной анкете: ошибки БД/соединения - повтор, не больше `CV_TIME_SLOTS_SYNC_MAX_RETRIES` раз на анкету,
+    остальные ошибки постоянные - анкета пропускается, чтобы не валить пересчет остальных
+    """
+    redis = get_redis_connection('default')
+    result = CvTimeSlotSyncResult()
+    retry_cv_ids = []
+    for cv_id in cv_ids:
+        try:
+            cv_result = CvTimeSlotService.sync_requests_slots_for_cv_ids([cv_id])
+        except (OperationalError, InterfaceError):
+            retries = redis.hincrby(CV_TIME_SLOTS_SYNC_RETRIES_KEY, cv_id)
+            if retries <= settings.CV_TIME_SLOTS_SYNC_MAX_RETRIES:
+                retry_cv_ids.append(cv_id)
+                continue
+            logger.exception('cv_time_slots_sync retries exceeded', extra={'cv_id': cv_id, 'retries': retries})
+        except Exception:
+            logger.exception('cv_time_slots_sync failed', extra={'cv_id': cv_id})
+        else:
+            result.created += cv_result.created
+            result.updated += cv_result.updated
+            result.deleted += cv_result.deleted
+            result.cv_ids |= cv_result.cv_ids
+        redis.hdel(CV_TIME_SLOTS_SYNC_RETRIES_KEY, cv_id)
+    if retry_cv_ids:
+        _enqueue(retry_cv_ids)
+    return result
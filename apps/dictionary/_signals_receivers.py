@@ -0,0 +1,14 @@
+from django.db.models import signals
+
+from dictionary import models as dictionary_models
+
+__all__ = ['setup']
+
+
+def competence_tree_changed(sender, **kwargs) -> None:
+    dictionary_models.Competence.objects.bump_tree_version()
+
+
+def setup():
+    signals.post_save.connect(competence_tree_changed, sender=dictionary_models.Competence)
+    signals.post_delete.connect(competence_tree_changed, sender=dictionary_models.Competence)
@@ -7,3 +7,7 @@ class DictionaryConfig(AppConfig):
     name = 'dictionary'
     verbose_name = _('Справочники')
 
+
+    def ready(self):
+        from dictionary._signals_receivers import setup as signals_receivers_setup
+        signals_receivers_setup()
@@ -1,11 +1,12 @@
 import re
-from typing import List, Union
-from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple, Union
+from dataclasses import dataclass, field
 
 import datetime
 from openpyxl import load_workbook
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from django.db.models import Q
 
 from dictionary import models as dictionary_models
 
@@ -40,69 +41,151 @@ class Row:
         return ret
 
 
+@dataclass
+class CompetenciesPlan:
+    """
+    Что нужно создать / подтвердить: { компетенция: { подкомпетенция: [версии] } }
+    """
+    positions: Set[str] = field(default_factory=set)
+    competencies: Dict[str, Dict[str, List[str]]] = field(default_factory=dict)
+
+    def add(self, row: Row) -> None:
+        self.positions.add(row.role_name)
+        sub_competencies = self.competencies.setdefault(row.competence_name, {})
+        if not row.sub_competence_name:
+            return
+        versions = sub_competencies.setdefault(row.sub_competence_name, [])
+        versions.extend(v for v in row.sub_competence_versions if v not in versions)
+
+
 class Command(BaseCommand):
+    """
+    Роли и дерево компетенций (компетенция / подкомпетенция / версии) из Excel.
+    Книга читается в read-only режиме, существующие узлы ищутся по одной предзагруженной карте,
+    новые вставляются пачками по уровням и каждое затронутое дерево перестраивается один раз
+    """
+
     def add_arguments(self, parser):
         parser.add_argument('filepath')
+        parser.add_argument('--dry-run', dest='dry_run', action='store_true', help='только показать изменения')
 
-    @transaction.atomic
     def handle(self, *args, **options):
-        wb = load_workbook(options['filepath'])
-        for sheet in wb:
-            role_name = None
-            competence_name = None
-            for row_i, row in enumerate(sheet):
-                if not row_i:
-                    continue
-                row = [cell.value for cell in row]
-                if row[0]:
-                    role_name = row[0]
-                if row[1]:
-                    competence_name = row[1]
-                sub_competence_name = row[2]
-                sub_competence_versions = [v for v in row[3:] if v]
-                self.make_one(
-                    Row(
+        plan = self.read_plan(options['filepath'])
+
+        positions = {
+            name: (pk, is_verified)
+            for pk, name, is_verified in dictionary_models.Position.objects.nocache().filter(
+                name__in=plan.positions
+            ).order_by('-id').values_list('id', 'name', 'is_verified')
+        }
+        competencies = list(dictionary_models.Competence.objects.nocache().filter(
+            Q(name__in=plan.competencies.keys())
+            | Q(parent__name__in=plan.competencies.keys())
+            | Q(parent__parent__name__in=plan.competencies.keys())
+        ).order_by('-mptt_level', '-id'))
+        # компетенция ищется по названию где угодно в дереве (корни в приоритете), ниже - по (родитель, название)
+        roots = {o.name: o for o in competencies if o.name in plan.competencies}
+        children = {(o.parent_id, o.name): o for o in competencies if o.parent_id}
+
+        positions_for_create = sorted(name for name in plan.positions if name not in positions)
+        positions_for_verify = [pk for pk, is_verified in positions.values() if not is_verified]
+        competencies_for_verify = []
+        levels: List[List[Tuple[Optional[dictionary_models.Competence], str, List]]] = [[], [], []]
+        """по уровням: (существующий родитель или None, название, путь) для новых узлов"""
+
+        def _node(parent: Optional[dictionary_models.Competence], name: str, path: List[str], level: int):
+            if not level:
+                node = roots.get(name)
+            else:
+                # у нового родителя детей еще нет
+                node = children.get((parent.id, name)) if parent else None
+            if node is None:
+                levels[level].append((parent, name, path))
+            elif not node.is_verified:
+                competencies_for_verify.append(node)
+            return node
+
+        for competence_name, sub_competencies in plan.competencies.items():
+            competence = _node(None, competence_name, [competence_name], 0)
+            for sub_competence_name, versions in sub_competencies.items():
+                sub_path = [competence_name, sub_competence_name]
+                sub_competence = _node(competence, sub_competence_name, sub_path, 1)
+                for version_name in versions:
+                    _node(sub_competence, version_name, [*sub_path, version_name], 2)
+
+        self.print_diff(positions_for_create, positions_for_verify, competencies_for_verify, levels)
+        if options['dry_run']:
+            return
+        self.apply(positions_for_create, positions_for_verify, competencies_for_verify, levels)
+
+    @classmethod
+    def read_plan(cls, filepath: str) -> CompetenciesPlan:
+        plan = CompetenciesPlan()
+        wb = load_workbook(filepath, read_only=True, data_only=True)
+        try:
+            for sheet in wb.worksheets:
+                role_name = None
+                competence_name = None
+                for row in sheet.iter_rows(min_row=2, values_only=True):
+                    row = [*row, None, None, None]
+                    if row[0]:
+                        role_name = row[0]
+                    if row[1]:
+                        competence_name = row[1]
+                    if not role_name or not competence_name:
+                        continue
+                    plan.add(Row(
                         role_name=role_name,
                         competence_name=competence_name,
-                        sub_competence_name=sub_competence_name,
-                        sub_competence_versions=sub_competence_versions,
-                    )
-                )
+                        sub_competence_name=row[2],
+                        sub_competence_versions=[v for v in row[3:] if v],
+                    ))
+        finally:
+            wb.close()
+        return plan
 
-    @classmethod
-    def make_one(cls, row: Row) -> None:
-        print(
-            row.role_name,
-            row.competence_name,
-            row.sub_competence_name,
-            row.sub_competence_versions,
-            sep='\t|\t',
-        )
-        position, is_position_created = dictionary_models.Position.objects.get_or_create(name=row.role_name)
-        if not position.is_verified:
-            position.is_verified = True
-            position.save()
-        competence, is_competence_created = dictionary_models.Competence.objects.get_or_create(
-            name=row.competence_name,
+    def print_diff(self, positions_for_create, positions_for_verify, competencies_for_verify, levels) -> None:
+        for name in positions_for_create:
+            self.stdout.write(f'+ роль\t{name}')
+        if positions_for_verify:
+            self.stdout.write(f'~ роли подтвердить\t{len(positions_for_verify)}')
+        for level in levels:
+            for _, _, path in level:
+                self.stdout.write(f'+ компетенция\t{" / ".join(path)}')
+        for competence in competencies_for_verify:
+            self.stdout.write(f'~ компетенция подтвердить\t{competence.name} < {competence.id} >')
+        self.stdout.write(
+            f'роли: +{len(positions_for_create)} ~{len(positions_for_verify)}, '
+            f'компетенции: +{sum(map(len, levels))} ~{len(competencies_for_verify)}'
         )
-        if not competence.is_verified:
-            competence.is_verified = True
-            competence.save()
-        if not row.sub_competence_name:
-            return
-        sub_competence, is_sub_competence_created = dictionary_models.Competence.objects.get_or_create(
-            parent=competence,
-            name=row.sub_competence_name,
-        )
-        if not sub_competence.is_verified:
-            sub_competence.is_verified = True
-            sub_competence.save()
-        for v_name in row.sub_competence_versions:
-            v, is_v_created = dictionary_models.Competence.objects.get_or_create(
-                parent=sub_competence,
-                name=v_name,
-                is_verified=True,
-            )
-            if not v.is_verified:
-                v.is_verified = True
-                v.save()
+
+    @transaction.atomic
+    def apply(self, positions_for_create, positions_for_verify, competencies_for_verify, levels) -> None:
+        dictionary_models.Position.objects.bulk_create([
+            dictionary_models.Position(name=name, is_verified=True)
+            for name in positions_for_create
+        ])
+        dictionary_models.Position.objects.filter(id__in=positions_for_verify).update(is_verified=True)
+        dictionary_models.Competence.objects.filter(
+            id__in=[o.id for o in competencies_for_verify]
+        ).update(is_verified=True)
+
+        created: Dict[Tuple[str, ...], dictionary_models.Competence] = {}
+        tree_ids = set()
+        for level in levels:
+            nodes = [
+                dictionary_models.Competence(
+                    name=name,
+                    parent=parent or created.get(tuple(path[:-1])),
+                    is_verified=True,
+                )
+                for parent, name, path in level
+            ]
+            for node, (_, _, path) in zip(
+                    dictionary_models.Competence.objects.bulk_insert_nodes(nodes), level
+            ):
+                created[tuple(path)] = node
+                tree_ids.add(node.tree_id)
+        dictionary_models.Competence.objects.rebuild_trees(tree_ids)
+        if competencies_for_verify:
+            dictionary_models.Competence.objects.bump_tree_version()
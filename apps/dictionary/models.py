@@ -1,6 +1,13 @@
-from django.db import models
+import time
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 from django.contrib.postgres.fields import ArrayField
+from cacheops import invalidate_model
+from mptt.managers import TreeManager
 from mptt.models import MPTTModel, TreeForeignKey
 
 from project.contrib.db.models import DatesModelBase
@@ -116,9 +123,113 @@ class Competence(MPTTModel, DictionaryModelBase):
         level_attr = 'mptt_level'
         order_insertion_by = ['name']
 
+    class Manager(TreeManager):
+        TREE_VERSION_CACHE_KEY = 'dictionary:competence-tree:version'
+        SUBTREE_IDS_CACHE_KEY = 'dictionary:competence-tree:%s:subtree-ids:%s'
+
+        def get_tree_version(self) -> int:
+            """
+            Без ключа (вытеснен, сброс redis) версия начинается с текущего времени, а не с 1 -
+            иначе снова станут актуальны старые закэшированные деревья и ETag
+            """
+            return cache.get_or_set(self.TREE_VERSION_CACHE_KEY, time.time_ns, None)
+
+        def bump_tree_version(self) -> None:
+            def _bump():
+                try:
+                    cache.incr(self.TREE_VERSION_CACHE_KEY)
+                except ValueError:
+                    cache.set(self.TREE_VERSION_CACHE_KEY, time.time_ns(), None)
+
+            transaction.on_commit(_bump)
+
+        def bulk_create_children(self, parent: 'Competence', names: Iterable[str]) -> List['Competence']:
+            """
+            Новые дочерние узлы одним INSERT и одна перестройка дерева родителя
+            вместо сдвига lft/rght всего дерева на каждую вставку
+            """
+            created = self.bulk_insert_nodes([self.model(name=name, parent=parent) for name in names])
+            self.rebuild_trees([parent.tree_id] if created else [])
+            return created
+
+        def bulk_insert_nodes(self, nodes: List['Competence']) -> List['Competence']:
+            """
+            Вставка узлов одним INSERT без пересчета lft/rght, родители (`parent`) уже должны быть сохранены.
+            Корни получают новые tree_id. После всех вставок - `rebuild_trees` по затронутым деревьям
+            """
+            tree_id_next = None
+            for node in nodes:
+                node.lft = node.rght = 0
+                if node.parent:
+                    node.tree_id = node.parent.tree_id
+                    node.mptt_level = node.parent.mptt_level + 1
+                    continue
+                if tree_id_next is None:
+                    tree_id_max = self.nocache().aggregate(tree_id_max=models.Max('tree_id'))['tree_id_max']
+                    tree_id_next = (tree_id_max or 0) + 1
+                node.tree_id = tree_id_next
+                node.mptt_level = 0
+                tree_id_next += 1
+            with self.disable_mptt_updates():
+                return self.bulk_create(nodes)
+
+        def rebuild_trees(self, tree_ids: Iterable[int]) -> None:
+            tree_ids = sorted(set(tree_ids))
+            for tree_id in tree_ids:
+                self.partial_rebuild(tree_id)
+            if tree_ids:
+                invalidate_model(self.model)
+                self.bump_tree_version()
+
+        def get_tree(self, root_id: Optional[int] = None, depth: Optional[int] = None) -> List['Competence']:
+            """
+            Корни дерева (или узел root_id) одним запросом по (tree_id, lft), дети собраны в памяти
+            (`get_cached_trees`, `get_children()` без запросов). depth - сколько уровней отдать
+            """
+            queryset = self.nocache().order_by('tree_id', 'lft')
+            level_from = 0
+            if root_id:
+                root = self.nocache().get(id=root_id)
+                queryset = queryset.filter(tree_id=root.tree_id, lft__gte=root.lft, rght__lte=root.rght)
+                level_from = root.mptt_level
+            if depth:
+                queryset = queryset.filter(mptt_level__lt=level_from + depth)
+            return queryset.get_cached_trees()
+
+        def get_subtree_ids(self, ids: Iterable[int]) -> Dict[int, List[int]]:
+            """
+            { id: [id и id всех потомков] }, одним запросом по диапазонам lft/rght,
+            результат кешируется по версии дерева
+            """
+            version = self.get_tree_version()
+            keys = {competence_id: self.SUBTREE_IDS_CACHE_KEY % (version, competence_id) for competence_id in set(ids)}
+            cached = cache.get_many(keys.values())
+            result = {competence_id: cached[key] for competence_id, key in keys.items() if key in cached}
+            missing = [competence_id for competence_id in keys if competence_id not in result]
+            if not missing:
+                return result
+            ranges = list(self.filter(id__in=missing).values_list('id', 'tree_id', 'lft', 'rght'))
+            if ranges:
+                predicate = models.Q()
+                for _, tree_id, lft, rght in ranges:
+                    predicate |= models.Q(tree_id=tree_id, lft__gte=lft, rght__lte=rght)
+                nodes = list(self.filter(predicate).order_by().values_list('id', 'tree_id', 'lft'))
+                for competence_id, tree_id, lft, rght in ranges:
+                    result[competence_id] = [
+                        node_id
+                        for node_id, node_tree_id, node_lft in nodes
+                        if node_tree_id == tree_id and lft <= node_lft <= rght
+                    ]
+            cache.set_many(
+                {keys[competence_id]: result[competence_id] for competence_id in missing if competence_id in result},
+                settings.DICTIONARY_COMPETENCE_SUBTREE_CACHE_TIMEOUT
+            )
+            return result
+
     class ManagerFlat(models.Manager):
         pass
 
+    objects = Manager()
     objects_flat = ManagerFlat()
 
 
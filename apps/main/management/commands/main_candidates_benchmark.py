@@ -0,0 +1,41 @@
+import time
+
+import numpy
+from django.core.management.base import BaseCommand
+
+from acc.models import User
+from cv.services.cv_features_index import CvFeaturesIndex
+from main import models as main_models
+from main.services.request_requirement_candidates import RequestRequirementCandidatesService
+
+
+class Command(BaseCommand):
+    help = 'Замер подбора кандидатов под требование: сборка индекса анкет и p50/p95 ранжирования'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_id', type=int)
+        parser.add_argument('request_requirement_id', type=int)
+        parser.add_argument('--limit', dest='limit', type=int, default=20)
+        parser.add_argument('--repeat', dest='repeat', type=int, default=100)
+
+    def handle(self, *args, **options):
+        user = User.objects.get(id=options['user_id'])
+        service = RequestRequirementCandidatesService(
+            main_models.RequestRequirement.objects.get(id=options['request_requirement_id'])
+        )
+        started_at = time.perf_counter()
+        index = CvFeaturesIndex.build(version=0)
+        build_ms = (time.perf_counter() - started_at) * 1000
+        self.stdout.write('index: %s cv, build %.1f ms' % (len(index.cv_ids), build_ms))
+        CvFeaturesIndex._instance = index
+        timings = []
+        candidates = []
+        for _ in range(options['repeat']):
+            started_at = time.perf_counter()
+            candidates = service.get_candidates(user, options['limit'])
+            timings.append((time.perf_counter() - started_at) * 1000)
+        self.stdout.write('rank: p50 %.2f ms, p95 %.2f ms' % (
+            numpy.percentile(timings, 50), numpy.percentile(timings, 95),
+        ))
+        for candidate in candidates:
+            self.stdout.write(str(candidate))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from acc.models import User
+from main import models as main_models
+from main.models import permissions as main_permissions
+from main.models.roles import UserRoles
+
+
+class Command(BaseCommand):
+    help = 'Кол-во SQL запросов на проверку прав при записи N строк таймшита (должно быть постоянным)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_id', type=int)
+        parser.add_argument('request_id', type=int)
+        parser.add_argument('--rows', dest='rows', nargs='+', type=int, default=[1, 10, 100, 1000])
+
+    def handle(self, *args, **options):
+        user = User.objects.get(id=options['user_id'])
+        request = main_models.Request.objects.get(id=options['request_id'])
+        self.stdout.write('%8s %8s %12s %8s' % ('rows', 'queries', 'roles loads', 'allowed'))
+        for rows_count in options['rows']:
+            loads_count = UserRoles.statistics['loads']
+            with UserRoles.cached(), CaptureQueriesContext(connection) as context:
+                allowed = all([
+                    main_permissions.request_time_sheet_row_save(main_models.TimeSheetRow(request=request), user)
+                    for _ in range(rows_count)
+                ])
+            self.stdout.write('%8s %8s %12s %8s' % (
+                rows_count, len(context.captured_queries), UserRoles.statistics['loads'] - loads_count, allowed,
+            ))
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.11 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('main', '0028_round6'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='timesheetrow',
+            index=models.Index(
+                fields=['request', 'date_from'], include=('cv', 'work_time'), name='main_timesheetrow_report_idx'
+            ),
+        ),
+        migrations.AlterIndexTogether(
+            name='timesheetrow',
+            index_together={('request', 'task_name')},
+        ),
+    ]
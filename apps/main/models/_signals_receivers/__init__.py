@@ -7,6 +7,7 @@ from main.services import request_requirement
 from main import models as main_models
 from main.models._signals_receivers.organization import (
     OrganizationContractorSignalsReceiver,
+    OrganizationContractorUserRoleSignalsReceiver,
     OrganizationCustomerSignalsReceiver
 )
 from main.models._signals_receivers.project import (
@@ -52,6 +53,10 @@ class OrganizationContractorReceiver(Receiver):
     receiver_class = OrganizationContractorSignalsReceiver
 
 
+class OrganizationContractorUserRoleReceiver(Receiver):
+    receiver_class = OrganizationContractorUserRoleSignalsReceiver
+
+
 class OrganizationProjectReceiver(Receiver):
     receiver_class = OrganizationProjectSignalsReceiver
 
@@ -66,12 +71,18 @@ class FunPointTypeReceiver(Receiver):
 
 class RequestRequirementReceiver:
     def post_save(self, sender, instance: main_models.RequestRequirement, **kwargs) -> None:
+        if kwargs.get('created'):
+            return
         request_requirement.request_requirement_time_slots_setup(instance)
 
 
 class RequestRequirementCvReceiver:
     def post_save(self, sender, instance: main_models.RequestRequirementCv, **kwargs) -> None:
-        request_requirement.request_requirement_cv_time_slots_setup(instance)
+        request_requirement.request_requirement_cv_time_slots_setup(instance, force=kwargs.get('created', False))
+        request_requirement.request_requirement_cv_rating_setup(instance, force=kwargs.get('created', False))
+
+    def post_delete(self, sender, instance: main_models.RequestRequirementCv, **kwargs) -> None:
+        request_requirement.request_requirement_cv_rating_setup(instance, force=True)
 
 
 class ModuleReceiver(Receiver):
@@ -85,6 +96,7 @@ def setup():
     for model, receiver_class in [
         [main_models.OrganizationContractor, OrganizationContractorReceiver],
         [main_models.OrganizationCustomer, OrganizationCustomerReceiver],
+        [main_models.OrganizationContractorUserRole, OrganizationContractorUserRoleReceiver],
         [main_models.OrganizationProject, OrganizationProjectReceiver],
         [main_models.OrganizationProjectUserRole, OrganizationProjectUserRoleReceiver],
         [main_models.FunPointType, FunPointTypeReceiver],
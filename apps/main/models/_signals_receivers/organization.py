@@ -1,10 +1,31 @@
 from main import models as main_models
 from main.models._signals_receivers._base import SignalsReceiver
+from main.models.visibility import UserVisibilityScope
+from main.models.roles import UserRoles
 
 
 class OrganizationContractorSignalsReceiver(SignalsReceiver):
     instance: main_models.OrganizationContractor
 
+    def post_save(self, **kwargs) -> None:
+        super().post_save(**kwargs)
+        if 'is_contractor' in self.instance.diff:
+            UserVisibilityScope.invalidate(self.instance.users_roles.values_list('user_id', flat=True))
+
+
+class OrganizationContractorUserRoleSignalsReceiver(SignalsReceiver):
+    instance: main_models.OrganizationContractorUserRole
+
+    def post_save(self, **kwargs) -> None:
+        super().post_save(**kwargs)
+        UserVisibilityScope.invalidate([self.instance.user_id, self.instance.diff.get('user', [None])[0]])
+        UserRoles.invalidate([self.instance.user_id, self.instance.diff.get('user', [None])[0]])
+
+    def post_delete(self, **kwargs) -> None:
+        super().post_delete(**kwargs)
+        UserVisibilityScope.invalidate([self.instance.user_id])
+        UserRoles.invalidate([self.instance.user_id])
+
 
 class OrganizationCustomerSignalsReceiver(SignalsReceiver):
     instance: main_models.OrganizationCustomer
@@ -1,10 +1,42 @@
 from main import models as main_models
 from main.models._signals_receivers._base import SignalsReceiver
+from main.models.visibility import UserVisibilityScope
+from main.models.roles import UserRoles
 
 
 class OrganizationProjectSignalsReceiver(SignalsReceiver):
     instance: main_models.OrganizationProject
 
+    def post_save(self, **kwargs) -> None:
+        super().post_save(**kwargs)
+        if kwargs.get('created') or 'organization_contractor' in self.instance.diff:
+            self._invalidate_users_visibility_scopes(
+                self.instance.organization_contractor_id,
+                self.instance.diff.get('organization_contractor', [None])[0],
+            )
+
+    def post_delete(self, **kwargs) -> None:
+        super().post_delete(**kwargs)
+        self._invalidate_users_visibility_scopes(self.instance.organization_contractor_id)
+
+    @classmethod
+    def _invalidate_users_visibility_scopes(cls, *organization_contractor_ids: int) -> None:
+        UserVisibilityScope.invalidate(
+            main_models.OrganizationContractorUserRole.objects.filter(
+                organization_contractor_id__in=list(filter(None, organization_contractor_ids))
+            ).values_list('user_id', flat=True)
+        )
+
 
 class OrganizationProjectUserRoleSignalsReceiver(SignalsReceiver):
     instance: main_models.OrganizationProjectUserRole
+
+    def post_save(self, **kwargs) -> None:
+        super().post_save(**kwargs)
+        UserVisibilityScope.invalidate([self.instance.user_id, self.instance.diff.get('user', [None])[0]])
+        UserRoles.invalidate([self.instance.user_id, self.instance.diff.get('user', [None])[0]])
+
+    def post_delete(self, **kwargs) -> None:
+        super().post_delete(**kwargs)
+        UserVisibilityScope.invalidate([self.instance.user_id])
+        UserRoles.invalidate([self.instance.user_id])
@@ -8,6 +8,7 @@ from django.utils.translation import gettext_lazy as _
 from project.contrib.db.models import DatesModelBase, ModelDiffMixin
 from acc.models import User
 from main.models import permissions as main_permissions
+from main.models.visibility import UserVisibilityScope
 
 __all__ = [
     'FunPointType',
@@ -169,8 +170,7 @@ class Module(main_permissions.MainModelPermissionsMixin, ModelDiffMixin, DatesMo
 
     class QuerySet(models.QuerySet):
         def filter_by_user(self, user: User):
-            from main.models.organization import OrganizationProject
-            return self.filter(organization_project__in=OrganizationProject.objects.filter_by_user(user))
+            return UserVisibilityScope.for_user(user).filter_by_organization_project(self)
 
     class Manager(models.Manager.from_queryset(QuerySet)):
         @classmethod
@@ -198,6 +198,8 @@ class Module(main_permissions.MainModelPermissionsMixin, ModelDiffMixin, DatesMo
 
     @property
     def difficulty_factor(self) -> Optional[float]:
+        if hasattr(self, 'difficulty_factor_cached'):
+            return self.difficulty_factor_cached
         from main.services.module import get_module_difficulty_factor
         return get_module_difficulty_factor(self)
 
@@ -233,7 +235,8 @@ class ModuleFunPoint(main_permissions.MainModelPermissionsMixin, ModelDiffMixin,
 
     class QuerySet(models.QuerySet):
         def filter_by_user(self, user: User):
-            return self.filter(module__in=Module.objects.filter_by_user(user))
+            return UserVisibilityScope.for_user(user).filter_by_organization_project(
+                self, 'module__organization_project_id')
 
     class Manager(models.Manager.from_queryset(QuerySet)):
         ...
@@ -286,7 +289,8 @@ class ModulePositionLaborEstimate(main_permissions.MainModelPermissionsMixin, Da
 
     class QuerySet(models.QuerySet):
         def filter_by_user(self, user: User):
-            return self.filter(module__in=Module.objects.filter_by_user(user))
+            return UserVisibilityScope.for_user(user).filter_by_organization_project(
+                self, 'module__organization_project_id')
 
     class Manager(models.Manager.from_queryset(QuerySet)):
         ...
@@ -1,8 +1,8 @@
-from typing import List, Optional, TYPE_CHECKING
+from typing import Iterable, List, Optional, TYPE_CHECKING
 
 import reversion
-from cacheops import invalidate_model
-from django.db import models, transaction
+from cacheops import invalidate_dict, invalidate_model, invalidate_obj
+from django.db import connections, models, transaction
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
 from mptt import models as mptt_models
@@ -12,6 +12,8 @@ from project.contrib.db.models import DatesModelBase, ModelDiffMixin
 from project.contrib.is_call_from_admin import is_call_from_admin
 from acc.models import User, Role
 from main.models import permissions as main_permissions
+from main.models.visibility import UserVisibilityScope
+from main.models.roles import UserRoles
 
 if TYPE_CHECKING:
     from main.models.request import Request, RequestStatus, RequestRequirement, RequestRequirementStatus
@@ -94,14 +96,7 @@ class OrganizationContractor(Organization):
 
     class QuerySet(Organization.QuerySet):
         def filter_by_user(self, user: User):
-            if user.is_superuser or user.is_staff:
-                return self
-            return self.filter(
-                id__in=[
-                    row.organization_contractor.id
-                    for row in OrganizationContractorUserRole.objects.filter(user=user)
-                ]
-            )
+            return UserVisibilityScope.for_user(user).filter_by_organization_contractor(self, 'id')
 
     class Manager(models.Manager.from_queryset(QuerySet)):
         def get_queryset(self):
@@ -118,10 +113,10 @@ class OrganizationContractor(Organization):
     def get_user_roles(self, user: User) -> List[str]:
         if user.is_superuser or user.is_staff:
             return [Role.ADMIN.value]
-        return [row.role for row in self.users_roles.filter(user=user)]
+        return UserRoles.for_user(user).get_organization_contractor_roles(self.id)
 
 
-class OrganizationContractorUserRole(main_permissions.MainModelPermissionsMixin, models.Model):
+class OrganizationContractorUserRole(main_permissions.MainModelPermissionsMixin, ModelDiffMixin, models.Model):
     permission_save = main_permissions.organization_contractor_user_role_save
     permission_delete = main_permissions.organization_contractor_user_role_delete
 
@@ -199,15 +194,7 @@ class OrganizationProject(main_permissions.MainModelPermissionsMixin, ModelDiffM
 
     class QuerySet(models.QuerySet):
         def filter_by_user(self, user: User):
-            if user.is_superuser or user.is_staff:
-                return self
-            return self.filter(
-                models.Q(organization_contractor__in=OrganizationContractor.objects.filter_by_user(user))
-                | models.Q(id__in=[
-                    row.organization_project.id
-                    for row in OrganizationProjectUserRole.objects.filter(user=user)
-                ])
-            )
+            return UserVisibilityScope.for_user(user).filter_by_organization_project(self, 'id')
 
     class Manager(models.Manager.from_queryset(QuerySet)):
         @classmethod
@@ -241,9 +228,7 @@ class OrganizationProject(main_permissions.MainModelPermissionsMixin, ModelDiffM
     def get_user_roles(self, user: User) -> List[str]:
         if user.is_superuser or user.is_staff:
             return [Role.ADMIN.value]
-        if role := self.users_roles.filter(user=user).first():
-            return [role.role]
-        return self.organization_contractor.get_user_roles(user)
+        return UserRoles.for_user(user).get_organization_project_roles(self.id, self.organization_contractor_id)
 
     def get_requests(self, status: Optional['RequestStatus'] = None) -> List['Request']:
         requests = []
@@ -325,8 +310,28 @@ class OrganizationProjectCardItemAbstract(mptt_models.MPTTModel, DatesModelBase)
         return f'{self.name} < {self.id} >'
 
     def save(self, *args, **kwargs):
+        tree_id_before = self.tree_id
         super().save(*args, **kwargs)
-        invalidate_model(self.__class__)
+        if self.parent_id is None and tree_id_before != self.tree_id:
+            # новое дерево - MPTT сдвигает tree_id следующих за ним деревьев (order_insertion_by)
+            invalidate_model(self.__class__)
+        else:
+            self.invalidate_trees({tree_id_before, self.tree_id} - {None})
+
+    def delete(self, *args, **kwargs):
+        tree_id = self.tree_id
+        result = super().delete(*args, **kwargs)
+        self.invalidate_trees([tree_id])
+        return result
+
+    @classmethod
+    def invalidate_trees(cls, tree_ids: Iterable[int]) -> None:
+        """
+        Сброс кэша запросов по tree_id (деревья целиком, `get_trees`): MPTT сдвигает lft/rght соседних узлов
+        через update(), которые cacheops не отслеживает. Сам сохраненный/удаленный узел сбрасывают сигналы cacheops
+        """
+        for tree_id in set(tree_ids):
+            invalidate_dict(cls, {'tree_id': tree_id})
 
     # def clean(self):
     #     super().clean()
@@ -377,6 +382,19 @@ class OrganizationProjectCardItem(OrganizationProjectCardItemAbstract):
         def filter_by_user(self, user: User):
             return self
 
+        def get_trees(self) -> List['OrganizationProjectCardItem']:
+            """
+            Корни из queryset со всеми потомками: узлы деревьев одним запросом по (tree_id, lft),
+            дети собраны в памяти (`get_cached_trees`, `get_children()` без запросов)
+            """
+            # tree_id списком, а не подзапросом - так кэш узлов сбрасывается только по своим деревьям
+            tree_ids = list(self.filter(mptt_level=0).values_list('tree_id', flat=True))
+            if not tree_ids:
+                return []
+            return self.model.objects.filter(
+                tree_id__in=tree_ids
+            ).order_by('tree_id', 'lft').prefetch_related('positions').get_cached_trees()
+
     class TreeManager(
         models.Manager.from_queryset(TreeQuerySet),
         mptt_models.TreeManager
@@ -387,27 +405,65 @@ class OrganizationProjectCardItem(OrganizationProjectCardItemAbstract):
                 organization_project: OrganizationProject,
                 template_root_card_item: OrganizationProjectCardItemTemplate
         ) -> 'OrganizationProjectCardItem':
-            root_node = self.create(
-                organization_project=organization_project,
-                name=template_root_card_item.name,
-                description=template_root_card_item.description,
-            )
-            root_node.positions.add(*template_root_card_item.positions.all())
-            nodes_map = {template_root_card_item.id: root_node}
-
-            def create_children(template_parent):
-                for tpl_node in reversed(template_parent.get_children()):
-                    node = self.create(
-                        parent=nodes_map[tpl_node.parent_id],
-                        name=tpl_node.name,
-                        description=tpl_node.description,
-                    )
-                    nodes_map[tpl_node.id] = node
-                    create_children(tpl_node)
-
-            create_children(template_root_card_item)
-            # self.rebuild()
-            return root_node
+            """
+            Копия дерева шаблона новым деревом: lft/rght/mptt_level считаются обходом шаблона в памяти
+            (дети по name, как order_insertion_by), id берутся из sequence заранее -
+            все узлы одним `bulk_create`, должности одним INSERT в M2M, сброс кэша один раз в конце
+            """
+            template_root = template_root_card_item.get_descendants(
+                include_self=True
+            ).prefetch_related('positions').get_cached_trees()[0]
+            tree_id_max = self.nocache().aggregate(tree_id_max=models.Max('tree_id'))['tree_id_max']
+            tree_id = (tree_id_max or 0) + 1
+
+            nodes = []
+            nodes_positions = []
+
+            def clone(template_node, parent, lft: int) -> int:
+                node = self.model(
+                    parent=parent,
+                    organization_project=organization_project,
+                    name=template_node.name,
+                    description=template_node.description,
+                    tree_id=tree_id,
+                    mptt_level=template_node.mptt_level - template_root.mptt_level,
+                    lft=lft,
+                )
+                nodes.append(node)
+                nodes_positions.append((node, template_node.positions.all()))
+                rght = lft + 1
+                for template_child in sorted(template_node.get_children(), key=lambda n: n.name):
+                    rght = clone(template_child, node, rght) + 1
+                node.rght = rght
+                return rght
+
+            clone(template_root, None, 1)
+            with connections[self.db].cursor() as cursor:
+                cursor.execute(
+                    'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+                    [self.model._meta.db_table, self.model._meta.pk.column, len(nodes)]
+                )
+                for node, (node_id,) in zip(nodes, cursor.fetchall()):
+                    node.id = node_id
+            for node in nodes:
+                node.parent_id = node.parent.id if node.parent else None
+            with self.disable_mptt_updates():
+                self.bulk_create(nodes)
+
+            positions_field = self.model._meta.get_field('positions')
+            positions_through = positions_field.remote_field.through
+            positions_through.objects.bulk_create([
+                positions_through(**{
+                    f'{positions_field.m2m_field_name()}_id': node.id,
+                    f'{positions_field.m2m_reverse_field_name()}_id': position.id,
+                })
+                for node, positions in nodes_positions
+                for position in positions
+            ])
+            self.model.invalidate_trees([tree_id])
+            # bulk_create без сигналов: корень сбрасывает списки корней проекта
+            invalidate_obj(nodes[0])
+            return self.filter(id=nodes[0].id).get_trees()[0]
 
     class FlatQuerySet(models.QuerySet):
         def filter_by_user(self, user: User):
@@ -423,7 +479,6 @@ class OrganizationProjectCardItem(OrganizationProjectCardItemAbstract):
         if self.parent and self.organization_project != self.parent.organization_project:
             self.organization_project = self.parent.organization_project
         super().save(*args, **kwargs)
-        invalidate_model(OrganizationProjectCardItem)
 
     def clean(self):
         super().clean()
@@ -1,4 +1,4 @@
-from typing import List, Dict, Any, Union
+from typing import List, Dict, Any, Union, Set
 
 import reversion
 from django.core.exceptions import ValidationError
@@ -15,6 +15,7 @@ from main.models.base import ExperienceYears
 from main.models.module import Module
 from main.models.organization import OrganizationProjectCardItem
 from main.models import permissions as main_permissions
+from main.models.visibility import UserVisibilityScope
 
 __all__ = [
     'RequestType',
@@ -97,7 +98,8 @@ class Request(main_permissions.MainModelPermissionsMixin, DatesModelBase):
 
     class QuerySet(models.QuerySet):
         def filter_by_user(self, user: User):
-            return self.filter(module__in=Module.objects.filter_by_user(user))
+            return UserVisibilityScope.for_user(user).filter_by_organization_project(
+                self, 'module__organization_project_id')
 
     class Manager(models.Manager.from_queryset(QuerySet)):
         @classmethod
@@ -167,7 +169,7 @@ class RequestRequirementStatus(models.TextChoices):
 
 
 @reversion.register(follow=['request', 'competencies', 'cv_links'])
-class RequestRequirement(main_permissions.MainModelPermissionsMixin, DatesModelBase):
+class RequestRequirement(main_permissions.MainModelPermissionsMixin, ModelDiffMixin, DatesModelBase):
     permission_save = main_permissions.request_requirement_save
     permission_delete = main_permissions.request_requirement_delete
 
@@ -208,7 +210,8 @@ class RequestRequirement(main_permissions.MainModelPermissionsMixin, DatesModelB
 
     class QuerySet(models.QuerySet):
         def filter_by_user(self, user: User):
-            return self.filter(request__in=Request.objects.filter_by_user(user))
+            return UserVisibilityScope.for_user(user).filter_by_organization_project(
+                self, 'request__module__organization_project_id')
 
     class Manager(models.Manager.from_queryset(QuerySet)):
         @classmethod
@@ -237,6 +240,11 @@ class RequestRequirement(main_permissions.MainModelPermissionsMixin, DatesModelB
 
     objects = Manager()
 
+    def clean(self):
+        super().clean()
+        if self.date_from and self.date_to and self.date_from > self.date_to:
+            raise ValidationError({'date_to': _('Дата окончания периода не может быть раньше даты начала')})
+
     def __str__(self):
         return f'{self.name} < {self.id} / {self.request_id} >'
 
@@ -294,7 +302,8 @@ class RequestRequirementCv(main_permissions.MainModelPermissionsMixin, ModelDiff
 
     class QuerySet(models.QuerySet):
         def filter_by_user(self, user: User):
-            return self.filter(request_requirement__in=RequestRequirement.objects.filter_by_user(user))
+            return UserVisibilityScope.for_user(user).filter_by_organization_project(
+                self, 'request_requirement__request__module__organization_project_id')
 
     class Manager(models.Manager.from_queryset(QuerySet)):
         ...
@@ -314,6 +323,8 @@ class RequestRequirementCv(main_permissions.MainModelPermissionsMixin, ModelDiff
 
     def clean(self):
         super().clean()
+        if self.date_from and self.date_to and self.date_from > self.date_to:
+            raise ValidationError({'date_to': _('Дата окончания периода не может быть раньше даты начала')})
         organization_project_card_items = (self.attributes or {}).get('organization_project_card_items')
         if not organization_project_card_items:
             return
@@ -354,7 +365,8 @@ class RequestRequirementCompetence(main_permissions.MainModelPermissionsMixin, D
 
     class QuerySet(models.QuerySet):
         def filter_by_user(self, user: User):
-            return self.filter(request_requirement__in=RequestRequirement.objects.filter_by_user(user))
+            return UserVisibilityScope.for_user(user).filter_by_organization_project(
+                self, 'request_requirement__request__module__organization_project_id')
 
     class Manager(models.Manager.from_queryset(QuerySet)):
         @transaction.atomic
@@ -399,7 +411,8 @@ class TimeSheetRow(main_permissions.MainModelPermissionsMixin, DatesModelBase):
 
     class QuerySet(models.QuerySet):
         def filter_by_user(self, user: User):
-            return self.filter(request__in=Request.objects.filter_by_user(user))
+            return UserVisibilityScope.for_user(user).filter_by_organization_project(
+                self, 'request__module__organization_project_id')
 
     class Manager(models.Manager.from_queryset(QuerySet)):
         @transaction.atomic
@@ -408,8 +421,15 @@ class TimeSheetRow(main_permissions.MainModelPermissionsMixin, DatesModelBase):
                 self.model(cv_id=cv_id, **kwargs)
                 for cv_id in cv_ids
             ]
+            if not for_create:
+                return []
+            for_create[0].clean_permissions()
+            linked_cv_ids = set(CV.objects.filter(
+                requests_requirements_links__request_requirement__request=for_create[0].request,
+                id__in=cv_ids,
+            ).values_list('id', flat=True))
             for o in for_create:
-                o.clean()
+                o.clean_cv_linked(linked_cv_ids)
             return self.bulk_create(for_create)
 
         @classmethod
@@ -425,9 +445,14 @@ class TimeSheetRow(main_permissions.MainModelPermissionsMixin, DatesModelBase):
     class Meta:
         ordering = ['-date_from']
         index_together = [
-            ['request', 'date_from'],
             ['request', 'task_name'],
         ]
+        indexes = [
+            # покрывающий для отчета: сканы по запросу и периоду без обращения к таблице
+            models.Index(
+                fields=['request', 'date_from'], include=['cv', 'work_time'], name='main_timesheetrow_report_idx'
+            ),
+        ]
         verbose_name = _('запросы / таймшиты')
         verbose_name_plural = _('запросы / таймшиты')
 
@@ -438,10 +463,16 @@ class TimeSheetRow(main_permissions.MainModelPermissionsMixin, DatesModelBase):
 
     def clean(self):
         super().clean()
-        if not CV.objects.filter(
-                requests_requirements_links__request_requirement__request=self.request,
-                id=self.cv_id,
-        ).exists():
+        self.clean_cv_linked(set(CV.objects.filter(
+            requests_requirements_links__request_requirement__request=self.request,
+            id=self.cv_id,
+        ).values_list('id', flat=True)))
+
+    def clean_permissions(self):
+        super().clean()
+
+    def clean_cv_linked(self, linked_cv_ids: Set[int]):
+        if self.cv_id not in linked_cv_ids:
             raise ValidationError({
                 'cv': _(f'Анкета <{self.cv_id}> не связана с требованием проектного запроса')
             })
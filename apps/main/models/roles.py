@@ -0,0 +1,84 @@
+import collections
+import logging
+from dataclasses import dataclass, field
+from typing import ClassVar, Counter, Dict, Iterable, List
+
+from django.db import models
+
+from project.contrib.request_memo import RequestMemo
+from acc.models import User
+
+__all__ = [
+    'UserRoles',
+]
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class UserRoles:
+    """
+    Все роли пользователя в организациях исполнителях и проектах, загружаются одним запросом.
+    Живут в рамках HTTP запроса или блока `with UserRoles.cached():`
+    """
+    user_id: int
+    organization_contractor_roles: Dict[int, List[str]] = field(default_factory=dict)
+    organization_project_roles: Dict[int, List[str]] = field(default_factory=dict)
+
+    memo: ClassVar[RequestMemo] = RequestMemo('main_user_roles')
+    statistics: ClassVar[Counter[str]] = collections.Counter()
+
+    @classmethod
+    def for_user(cls, user: User) -> 'UserRoles':
+        memo = cls.memo.get()
+        if memo is not None and user.id in memo:
+            cls.statistics['hits'] += 1
+            return memo[user.id]
+        user_roles = cls._load(user)
+        if memo is not None:
+            memo[user.id] = user_roles
+        return user_roles
+
+    @classmethod
+    def invalidate(cls, user_ids: Iterable[int]) -> None:
+        if (memo := cls.memo.get()) is None:
+            return
+        for user_id in user_ids:
+            memo.pop(user_id, None)
+
+    @classmethod
+    def cached(cls):
+        return cls.memo.scope()
+
+    @classmethod
+    def _load(cls, user: User) -> 'UserRoles':
+        from main.models.organization import OrganizationContractorUserRole, OrganizationProjectUserRole
+
+        cls.statistics['loads'] += 1
+        user_roles = cls(user_id=user.id)
+        rows = OrganizationContractorUserRole.objects.filter(user_id=user.id).values_list(
+            models.Value(False, output_field=models.BooleanField()), 'organization_contractor_id', 'role', 'id',
+        ).union(
+            OrganizationProjectUserRole.objects.filter(user_id=user.id).values_list(
+                models.Value(True, output_field=models.BooleanField()), 'organization_project_id', 'role', 'id',
+            ),
+            all=True,
+        ).nocache()
+        # по id - как прежние `users_roles.filter(user=user)` и `.first()`: у моделей ролей нет Meta.ordering,
+        # `.first()` без сортировки берет наименьший pk
+        for is_project, organization_id, role, _ in sorted(rows, key=lambda row: row[3]):
+            roles = user_roles.organization_project_roles if is_project else user_roles.organization_contractor_roles
+            roles.setdefault(organization_id, []).append(role)
+        logger.debug('UserRoles.load', extra={'user_id': user.id, 'statistics': dict(cls.statistics)})
+        return user_roles
+
+    def get_organization_contractor_roles(self, organization_contractor_id: int) -> List[str]:
+        return list(self.organization_contractor_roles.get(organization_contractor_id, []))
+
+    def get_organization_project_roles(
+            self,
+            organization_project_id: int,
+            organization_contractor_id: int
+    ) -> List[str]:
+        if roles := self.organization_project_roles.get(organization_project_id):
+            return [roles[0]]
+        return self.get_organization_contractor_roles(organization_contractor_id)
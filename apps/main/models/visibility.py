@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+from typing import Iterable, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+
+from project.contrib.request_memo import RequestMemo
+from acc.models import User
+
+__all__ = [
+    'UserVisibilityScope',
+]
+
+
+@dataclass(frozen=True)
+class UserVisibilityScope:
+    """
+    Организации исполнители и проекты, которые видит пользователь.
+    Считается один раз на запрос, между запросами хранится в кеше (redis),
+    сбрасывается сигналами при изменении ролей
+    """
+    user_id: int
+    is_unrestricted: bool
+    organization_contractor_ids: Tuple[int, ...] = ()
+    organization_project_ids: Tuple[int, ...] = ()
+
+    CACHE_KEY = 'main:user-visibility-scope:%s'
+    memo = RequestMemo('main_user_visibility_scopes')
+
+    @classmethod
+    def for_user(cls, user: User) -> 'UserVisibilityScope':
+        if user.is_superuser or user.is_staff:
+            return cls(user_id=user.id, is_unrestricted=True)
+        request_scopes = cls._get_request_scopes()
+        if user.id in request_scopes:
+            return request_scopes[user.id]
+        scope = cache.get(cls.CACHE_KEY % user.id)
+        if scope is None:
+            scope = cls._build(user)
+            cache.set(cls.CACHE_KEY % user.id, scope, settings.MAIN_USER_VISIBILITY_SCOPE_CACHE_TIMEOUT)
+        request_scopes[user.id] = scope
+        return scope
+
+    @classmethod
+    def invalidate(cls, user_ids: Iterable[int]) -> None:
+        user_ids = set(filter(None, user_ids))
+        if not user_ids:
+            return
+        request_scopes = cls._get_request_scopes()
+        for user_id in user_ids:
+            request_scopes.pop(user_id, None)
+        transaction.on_commit(lambda: cache.delete_many([cls.CACHE_KEY % user_id for user_id in user_ids]))
+
+    @classmethod
+    def _build(cls, user: User) -> 'UserVisibilityScope':
+        from main.models.organization import OrganizationContractor, OrganizationProject
+
+        organization_contractor_ids = tuple(
+            OrganizationContractor.objects.filter(users_roles__user=user).values_list('id', flat=True).distinct()
+        )
+        organization_project_ids = tuple(
+            OrganizationProject.objects.filter(
+                models.Q(organization_contractor_id__in=organization_contractor_ids)
+                | models.Q(users_roles__user=user)
+            ).values_list('id', flat=True).distinct()
+        )
+        return cls(
+            user_id=user.id,
+            is_unrestricted=False,
+            organization_contractor_ids=organization_contractor_ids,
+            organization_project_ids=organization_project_ids,
+        )
+
+    @classmethod
+    def _get_request_scopes(cls) -> dict:
+        memo = cls.memo.get()
+        return {} if memo is None else memo
+
+    def filter_by_organization_contractor(
+            self,
+            queryset: models.QuerySet,
+            field_name: str = 'organization_contractor_id'
+    ) -> models.QuerySet:
+        if self.is_unrestricted:
+            return queryset
+        return queryset.filter(**{f'{field_name}__in': self.organization_contractor_ids})
+
+    def filter_by_organization_project(
+            self,
+            queryset: models.QuerySet,
+            field_name: str = 'organization_project_id'
+    ) -> models.QuerySet:
+        if self.is_unrestricted:
+            return queryset
+        return queryset.filter(**{f'{field_name}__in': self.organization_project_ids})
@@ -1,34 +1,94 @@
-from typing import Optional
+from typing import Dict, List
 
 from dataclasses import dataclass
 
+from django.utils.functional import cached_property
+
+from dictionary.models import Position
 from main import models as main_models
-from main.services.module import ModuleLaborEstimateService, LaborEstimate
+from main.services.module import (
+    LaborEstimate, PositionLaborEstimate, _prepare_positions_estimates,
+    get_modules_expected_hours, get_workers_count,
+    get_saved_positions_estimates, get_requested_positions_estimates,
+    get_expected_minus_saved_positions_estimates, get_saved_minus_requested_positions_estimates,
+)
 
 
 @dataclass
 class ProjectLaborEstimateService:
+    """
+    Оценки трудозатрат проекта по всем модулям сразу: суммы по должностям считаются агрегатами SQL
+    одним запросом на весь проект, а не сложением оценок каждого модуля
+    """
     instance: main_models.OrganizationProject
 
-    def get_expected_labor_estimate(self) -> Optional[LaborEstimate]:
-        ...
+    @cached_property
+    def modules(self) -> List[main_models.Module]:
+        return list(self.instance.modules.all())
+
+    @cached_property
+    def modules_ids(self) -> List[int]:
+        return [module.id for module in self.modules]
+
+    def get_expected_labor_estimate(self) -> LaborEstimate:
+        """
+        Часы по (модуль, должность) одним запросом, люди считаются по рабочим дням модуля и суммируются
+        """
+        modules_hours = get_modules_expected_hours(self.modules_ids)
+        positions_ids = {position_id for hours in modules_hours.values() for position_id in hours}
+        positions = Position.objects.in_bulk(positions_ids)
+        estimates: Dict[int, PositionLaborEstimate] = {}
+        for module in self.modules:
+            for position_id, hours_count in modules_hours.get(module.id, {}).items():
+                workers_count = get_workers_count(hours_count, module.work_days_count, module.work_days_hours_count)
+                if position_id not in estimates:
+                    estimates[position_id] = PositionLaborEstimate(
+                        position=positions[position_id],
+                        hours_count=0,
+                        workers_count=0,
+                    )
+                estimates[position_id].hours_count += hours_count
+                estimates[position_id].workers_count += workers_count
+        result = self._get_empty_labor_estimate()
+        result.positions_estimates = _prepare_positions_estimates(estimates)
+        return result
+
+    def get_saved_labor_estimate(self) -> LaborEstimate:
+        result = self._get_empty_labor_estimate()
+        result.positions_estimates = get_saved_positions_estimates(self.modules_ids)
+        return result
 
-    def get_saved_labor_estimate(self) -> Optional[LaborEstimate]:
-        project_estimate = None
-        for module in self.instance.modules.all():
-            module_service = ModuleLaborEstimateService(module)
-            module_estimate = module_service.get_saved_labor_estimate()
-            if not project_estimate:
-                project_estimate = module_estimate
-            else:
-                project_estimate += module_estimate
-        return project_estimate
+    def get_requested_labor_estimate(self) -> LaborEstimate:
+        result = self._get_empty_labor_estimate()
+        result.positions_estimates = get_requested_positions_estimates(self.modules_ids)
+        return result
 
-    def get_requested_labor_estimate(self) -> Optional[LaborEstimate]:
-        ...
+    def get_expected_minus_saved_labor_estimate(self) -> LaborEstimate:
+        result = self._get_empty_labor_estimate()
+        result.positions_estimates = get_expected_minus_saved_positions_estimates(
+            self.get_expected_labor_estimate().positions_estimates,
+            self.get_saved_labor_estimate().positions_estimates,
+        )
+        return result
 
-    def get_expected_minus_saved_labor_estimate(self) -> Optional[LaborEstimate]:
-        ...
+    def get_saved_minus_requested_labor_estimate(self) -> LaborEstimate:
+        result = self._get_empty_labor_estimate()
+        result.positions_estimates = get_saved_minus_requested_positions_estimates(
+            self.get_saved_labor_estimate().positions_estimates,
+            self.get_requested_labor_estimate().positions_estimates,
+        )
+        return result
 
-    def get_saved_minus_requested_labor_estimate(self) -> Optional[LaborEstimate]:
-        ...
+    def _get_empty_labor_estimate(self) -> LaborEstimate:
+        """
+        Сроки и рабочие дни - как при сложении оценок модулей (`LaborEstimate.__add__`)
+        """
+        dates_from = [module.start_date for module in self.modules if module.start_date]
+        dates_to = [module.deadline_date for module in self.modules if module.deadline_date]
+        return LaborEstimate(
+            date_from=min(dates_from, default=None),
+            date_to=max(dates_to, default=None),
+            work_days_count=sum(module.work_days_count or 0 for module in self.modules),
+            work_day_hours_count=sum(module.work_days_hours_count or 0 for module in self.modules),
+            positions_estimates={},
+        )
@@ -2,36 +2,164 @@ import math
 import numpy
 import datetime
 import itertools
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
 from dataclasses import dataclass
-from typing import Dict, Optional
+from typing import Dict, Iterable, Optional
 
-from django.db import transaction
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
 
 from dictionary.models import Position
 from main import models as main_models
 
 
+def get_modules_difficulty_factors(modules: Iterable[main_models.Module]) -> Dict[int, float]:
+    """
+    difficulty средневзвешанное от ф-х точек сразу по всем модулям: { module_id: difficulty }.
+    Ф-е точки берутся из prefetch, среднее по модулям - `numpy.bincount` без цикла по модулям
+    """
+    rows = [
+        (
+            module.id,
+            fun_point.difficulty_factor,
+            sum(est.hours for est in fun_point.fun_point_type.positions_labor_estimates.all()),
+        )
+        for module in modules
+        for fun_point in module.fun_points.all()
+    ]
+    rows = [row for row in rows if row[2]]
+    if not rows:
+        return {}
+    modules_ids, modules_idx = numpy.unique([row[0] for row in rows], return_inverse=True)
+    factors = numpy.array([row[1] for row in rows], dtype=float)
+    weights = numpy.array([row[2] for row in rows], dtype=float)
+    weights_sum = numpy.bincount(modules_idx, weights=weights)
+    factors_sum = numpy.bincount(modules_idx, weights=factors * weights)
+    return {
+        int(module_id): round(float(factor_sum / weight_sum), 2)
+        for module_id, factor_sum, weight_sum in zip(modules_ids, factors_sum, weights_sum)
+        if weight_sum
+    }
+
+
+def set_modules_difficulty_factors(modules: Iterable[main_models.Module]) -> None:
+    """
+    Один расчет на весь список (страницу) модулей, `Module.difficulty_factor` потом читает готовое значение
+    """
+    modules = list(modules)
+    factors = get_modules_difficulty_factors(modules)
+    for module in modules:
+        module.difficulty_factor_cached = factors.get(module.id)
+
+
 def get_module_difficulty_factor(instance: main_models.Module) -> Optional[float]:
     """
     difficulty средневзвешанное от ф-х точек
     """
-    fun_points_est = {}
-    for fun_point in instance.fun_points.all():
-        fun_points_est[fun_point.id] = [0, fun_point.difficulty_factor]
-        for est in fun_point.fun_point_type.positions_labor_estimates.all():
-            fun_points_est[fun_point.id][0] += est.hours
-    vals = [row for row in fun_points_est.values() if row[0]]
-    if not vals:
-        return
-    try:
-        result = numpy.average(
-            [v[1] for v in vals],
-            weights=[v[0] for v in vals]
+    return get_modules_difficulty_factors([instance]).get(instance.id)
+
+
+def get_modules_expected_hours(modules_ids: Iterable[int]) -> Dict[int, Dict[int, float]]:
+    """
+    { module_id: { position_id: часы } } одним запросом:
+    SUM(норматив типа ф-й точки * коэффициент сложности ф-й точки) GROUP BY модуль, должность
+    """
+    result = defaultdict(dict)
+    for row in main_models.FunPointTypePositionLaborEstimate.objects.filter(
+            fun_point_type__fun_points__module_id__in=modules_ids
+    ).order_by().values(
+        'position_id',
+        module_id=models.F('fun_point_type__fun_points__module_id'),
+    ).annotate(
+        hours_sum=models.Sum(
+            models.F('hours') * Coalesce(
+                models.F('fun_point_type__fun_points__difficulty_level__factor'), models.Value(1.0)
+            )
+        ),
+    ):
+        result[row['module_id']][row['position_id']] = row['hours_sum']
+    return result
+
+
+def get_workers_count(hours_count: float, work_days_count: Optional[int], work_day_hours_count: int) -> int:
+    days_count = math.ceil(hours_count / work_day_hours_count)
+    if not work_days_count:
+        return 1
+    return math.ceil(days_count / work_days_count)
+
+
+def get_saved_positions_estimates(modules_ids: Iterable[int]) -> Dict[int, 'PositionLaborEstimate']:
+    """
+    Сохраненные оценки модулей, суммы часов и людей по должностям одним запросом
+    """
+    rows = list(main_models.ModulePositionLaborEstimate.objects.filter(
+        module_id__in=modules_ids
+    ).order_by().values('position_id').annotate(
+        hours_sum=models.Sum('hours'),
+        count_sum=models.Sum('count'),
+    ))
+    positions = Position.objects.in_bulk([row['position_id'] for row in rows])
+    return _prepare_positions_estimates({
+        row['position_id']: PositionLaborEstimate(
+            position=positions[row['position_id']],
+            hours_count=row['hours_sum'],
+            workers_count=row['count_sum'],
+        )
+        for row in rows
+    })
+
+
+def get_requested_positions_estimates(modules_ids: Iterable[int]) -> Dict[int, 'PositionLaborEstimate']:
+    """
+    Запрошенное в требованиях проектных запросов модулей, суммы людей по должностям одним запросом
+    """
+    rows = list(main_models.RequestRequirement.objects.filter(
+        request__module_id__in=modules_ids,
+        position__isnull=False,
+    ).order_by().values('position_id').annotate(
+        count_sum=Coalesce(models.Sum('count'), 0),
+    ))
+    positions = Position.objects.in_bulk([row['position_id'] for row in rows])
+    return _prepare_positions_estimates({
+        row['position_id']: PositionLaborEstimate(
+            position=positions[row['position_id']],
+            hours_count=None,
+            workers_count=row['count_sum'],
+        )
+        for row in rows
+    }, 'workers_count')
+
+
+def get_expected_minus_saved_positions_estimates(
+        expected: Dict[int, 'PositionLaborEstimate'],
+        saved: Dict[int, 'PositionLaborEstimate'],
+) -> Dict[int, 'PositionLaborEstimate']:
+    diff = {}
+    for position_id in set(expected.keys()) | set(saved.keys()):
+        pos_expected = expected.get(position_id)
+        pos_saved = saved.get(position_id)
+        diff[position_id] = PositionLaborEstimate(
+            position=getattr(pos_expected, 'position', None) or getattr(pos_saved, 'position', None),
+            hours_count=getattr(pos_expected, 'hours_count', 0) - getattr(pos_saved, 'hours_count', 0),
+            workers_count=getattr(pos_expected, 'workers_count', 0) - getattr(pos_saved, 'workers_count', 0),
         )
-        return round(result, 2)
-    except Exception:
-        return
+    return _prepare_positions_estimates(diff, is_skip_zero=True)
+
+
+def get_saved_minus_requested_positions_estimates(
+        saved: Dict[int, 'PositionLaborEstimate'],
+        requested: Dict[int, 'PositionLaborEstimate'],
+) -> Dict[int, 'PositionLaborEstimate']:
+    diff = {}
+    for position_id in set(saved.keys()) | set(requested.keys()):
+        pos_saved = saved.get(position_id)
+        pos_requested = requested.get(position_id)
+        diff[position_id] = PositionLaborEstimate(
+            position=getattr(pos_saved, 'position', None) or getattr(pos_requested, 'position', None),
+            hours_count=None,
+            workers_count=getattr(pos_saved, 'workers_count', 0) - getattr(pos_requested, 'workers_count', 0),
+        )
+    return _prepare_positions_estimates(diff, 'workers_count', is_skip_zero=True)
 
 
 def _prepare_positions_estimates(
@@ -135,28 +263,16 @@ class ModuleLaborEstimateService:
         return request
 
     def get_expected_labor_estimate(self) -> LaborEstimate:
-        estimates = {}
-        positions = {}
-        for fun_point in self.instance.fun_points.all():
-            for position_labor_estimate in fun_point.fun_point_type.positions_labor_estimates.all():
-                position_id = position_labor_estimate.position_id
-                if position_id not in estimates:
-                    estimates[position_id] = 0
-                estimates[position_id] += position_labor_estimate.hours * fun_point.difficulty_factor
-                if position_id not in positions:
-                    positions[position_id] = position_labor_estimate.position
-        work_days = self.instance.work_days_count
-        work_day_hours = self.instance.work_days_hours_count
+        estimates = get_modules_expected_hours([self.instance.id]).get(self.instance.id, {})
+        positions = Position.objects.in_bulk(estimates.keys())
         result_estimates = []
         for position_id, estimate_hours_count in sorted(estimates.items(), key=lambda x: x[1], reverse=True):
-            estimate_days_count = math.ceil(estimate_hours_count / work_day_hours)
-            estimate_workers_count = 1
-            if work_days:
-                estimate_workers_count = math.ceil(estimate_days_count / work_days)
             result_estimates.append(PositionLaborEstimate(
                 position=positions[position_id],
                 hours_count=estimate_hours_count,
-                workers_count=estimate_workers_count,
+                workers_count=get_workers_count(
+                    estimate_hours_count, self.instance.work_days_count, self.instance.work_days_hours_count
+                ),
             ))
         result = self._get_empty_labor_estimate()
         result.positions_estimates = OrderedDict((row.position.id, row) for row in result_estimates)
@@ -164,61 +280,28 @@ class ModuleLaborEstimateService:
 
     def get_saved_labor_estimate(self) -> LaborEstimate:
         result = self._get_empty_labor_estimate()
-        result.positions_estimates = _prepare_positions_estimates({
-            row.position_id: PositionLaborEstimate(
-                position=row.position,
-                hours_count=row.hours,
-                workers_count=row.count,
-            )
-            for row in self.instance.positions_labor_estimates.all()
-        })
+        result.positions_estimates = get_saved_positions_estimates([self.instance.id])
         return result
 
     def get_requested_labor_estimate(self) -> LaborEstimate:
-        requested = {}
-        for request in self.instance.requests.all():
-            for requirement in request.requirements.all():
-                if requirement.position_id not in requested:
-                    requested[requirement.position_id] = PositionLaborEstimate(
-                        position=requirement.position,
-                        hours_count=None,
-                        workers_count=0,
-                    )
-                requested[requirement.position_id].workers_count += requirement.count
         result = self._get_empty_labor_estimate()
-        result.positions_estimates = _prepare_positions_estimates(requested, 'workers_count')
+        result.positions_estimates = get_requested_positions_estimates([self.instance.id])
         return result
 
     def get_expected_minus_saved_labor_estimate(self) -> LaborEstimate:
-        expected = self.get_expected_labor_estimate().positions_estimates
-        saved = self.get_saved_labor_estimate().positions_estimates
-        diff = {}
-        for position_id in set(expected.keys()) | set(saved.keys()):
-            pos_expected = expected.get(position_id)
-            pos_saved = saved.get(position_id)
-            diff[position_id] = PositionLaborEstimate(
-                position=getattr(pos_expected, 'position', None) or getattr(pos_saved, 'position', None),
-                hours_count=getattr(pos_expected, 'hours_count', 0) - getattr(pos_saved, 'hours_count', 0),
-                workers_count=getattr(pos_expected, 'workers_count', 0) - getattr(pos_saved, 'workers_count', 0),
-            )
         result = self._get_empty_labor_estimate()
-        result.positions_estimates = _prepare_positions_estimates(diff, is_skip_zero=True)
+        result.positions_estimates = get_expected_minus_saved_positions_estimates(
+            self.get_expected_labor_estimate().positions_estimates,
+            self.get_saved_labor_estimate().positions_estimates,
+        )
         return result
 
     def get_saved_minus_requested_labor_estimate(self) -> LaborEstimate:
-        saved = self.get_saved_labor_estimate().positions_estimates
-        requested = self.get_requested_labor_estimate().positions_estimates
-        diff = {}
-        for position_id in set(saved.keys()) | set(requested.keys()):
-            pos_saved = saved.get(position_id)
-            pos_requested = requested.get(position_id)
-            diff[position_id] = PositionLaborEstimate(
-                position=getattr(pos_saved, 'position', None) or getattr(pos_requested, 'position', None),
-                hours_count=None,
-                workers_count=getattr(pos_saved, 'workers_count', 0) - getattr(pos_requested, 'workers_count', 0),
-            )
         result = self._get_empty_labor_estimate()
-        result.positions_estimates = _prepare_positions_estimates(diff, 'workers_count', is_skip_zero=True)
+        result.positions_estimates = get_saved_minus_requested_positions_estimates(
+            self.get_saved_labor_estimate().positions_estimates,
+            self.get_requested_labor_estimate().positions_estimates,
+        )
         return result
 
     def _get_empty_labor_estimate(self) -> LaborEstimate:
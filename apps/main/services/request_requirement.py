@@ -1,23 +1,34 @@
 from django.db import transaction
 
-from cv.models import CV
+from cv.models import CvInfo
 from main.models import RequestRequirementCv, RequestRequirement
-from cv.services.cv_time_slot import CvTimeSlotService
+from cv.tasks import cv_time_slots_sync_enqueue
 
 __all__ = [
     'request_requirement_time_slots_setup',
     'request_requirement_cv_time_slots_setup',
+    'request_requirement_cv_rating_setup',
 ]
 
 
-@transaction.atomic
-def request_requirement_time_slots_setup(instance: RequestRequirement):
-    for cv_link in instance.cv_links.all():
-        request_requirement_cv_time_slots_setup(cv_link)
+REQUEST_REQUIREMENT_TIME_SLOTS_FIELDS = {'date_from', 'date_to', 'type_of_employment'}
+REQUEST_REQUIREMENT_CV_TIME_SLOTS_FIELDS = {'cv', 'status', 'date_from', 'date_to'}
 
 
-@transaction.atomic
-def request_requirement_cv_time_slots_setup(instance: RequestRequirementCv):
-    # if 'cv' in instance.diff:
-    #     CvTimeSlotService(CV.objects.get(id=instance.diff['cv'][1])).setup_requests_slots()
-    CvTimeSlotService(instance.cv).setup_requests_slots()
+def request_requirement_time_slots_setup(instance: RequestRequirement, force: bool = False):
+    if not force and instance.diff.keys().isdisjoint(REQUEST_REQUIREMENT_TIME_SLOTS_FIELDS):
+        return
+    cv_time_slots_sync_enqueue(instance.cv_links.values_list('cv_id', flat=True))
+
+
+def request_requirement_cv_time_slots_setup(instance: RequestRequirementCv, force: bool = False):
+    if not force and instance.diff.keys().isdisjoint(REQUEST_REQUIREMENT_CV_TIME_SLOTS_FIELDS):
+        return
+    cv_time_slots_sync_enqueue([instance.cv_id, instance.diff.get('cv', [None])[0]])
+
+
+def request_requirement_cv_rating_setup(instance: RequestRequirementCv, force: bool = False):
+    if not force and instance.diff.keys().isdisjoint(['rating', 'cv']):
+        return
+    cv_ids = [instance.cv_id, instance.diff.get('cv', [None])[0]]
+    transaction.on_commit(lambda: CvInfo.objects.refresh_rating(cv_ids))
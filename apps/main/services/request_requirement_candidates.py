@@ -0,0 +1,127 @@
+import logging
+from dataclasses import dataclass
+from typing import ClassVar, Dict, List, Optional
+
+import numpy
+
+from acc.models import User
+from cv.services.cv_features_index import CvFeaturesIndex
+from main import models as main_models
+from main.models.base import ExperienceYears
+from main.models.visibility import UserVisibilityScope
+
+__all__ = [
+    'CvCandidate',
+    'RequestRequirementCandidatesService',
+]
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CvCandidate:
+    cv_id: int
+    score: float
+    position_years: Optional[float]
+    competencies_matched_count: int
+    is_city_matched: bool
+    is_type_of_employment_matched: bool
+
+
+@dataclass
+class RequestRequirementCandidatesService:
+    """
+    Ранжирование анкет под требование по индексу признаков `CvFeaturesIndex`.
+    Жесткие условия: видимость анкеты, не привязана к требованию, ставка <= max_price, свободна в период требования
+    """
+    instance: main_models.RequestRequirement
+
+    WEIGHTS: ClassVar[Dict[str, float]] = {
+        'position': 3,
+        'experience': 2,
+        'competencies': 4,
+        'city': 1,
+        'type_of_employment': 1,
+    }
+    COMPETENCE_EXPERIENCE_YEARS: ClassVar[Dict[int, float]] = {
+        ExperienceYears.ZERO: 0.5,
+        ExperienceYears.THREE: 3,
+        ExperienceYears.FIVE: 5,
+        ExperienceYears.ONE_HUNDRED: 5,
+    }
+    """{ код `ExperienceYears`: лет опыта для полного совпадения }, "более 5 лет" - от 5 лет"""
+
+    def get_candidates(self, user: User, limit: int = 20) -> List[CvCandidate]:
+        index = CvFeaturesIndex.get()
+        requirement = self.instance
+        weights = self.WEIGHTS
+        n = len(index.cv_ids)
+
+        is_allowed = numpy.ones(n, dtype=bool)
+        scope = UserVisibilityScope.for_user(user)
+        if not scope.is_unrestricted:
+            is_allowed &= numpy.isin(index.organization_contractor_ids, scope.organization_contractor_ids)
+        is_allowed[index.get_rows(requirement.cv_links.values_list('cv_id', flat=True))] = False
+        if requirement.max_price:
+            is_allowed &= ~(index.prices > requirement.max_price)
+        if requirement.date_from or requirement.date_to:
+            is_allowed[index.get_busy_rows(requirement.date_from, requirement.date_to)] = False
+
+        score = numpy.zeros(n, dtype=numpy.float64)
+
+        position_years = numpy.full(n, numpy.nan)
+        if requirement.position_id:
+            rows, values = index.positions.get(requirement.position_id)
+            numpy.fmax.at(position_years, rows, values)
+            score += weights['position'] * ~numpy.isnan(position_years)
+            if requirement.experience_years:
+                score += weights['experience'] * numpy.clip(
+                    numpy.nan_to_num(position_years) / requirement.experience_years, 0, 1)
+
+        competencies_matched_count = numpy.zeros(n, dtype=numpy.int64)
+        competencies = list(requirement.competencies.values_list('competence_id', 'experience_years'))
+        if competencies:
+            competencies_score = numpy.zeros(n, dtype=numpy.float64)
+            for competence_id, experience_years in competencies:
+                competence_years = numpy.full(n, numpy.nan)
+                rows, values = index.competencies.get(competence_id)
+                numpy.fmax.at(competence_years, rows, values)
+                is_matched = ~numpy.isnan(competence_years)
+                competencies_matched_count += is_matched
+                if experience_years:
+                    experience_years = self.COMPETENCE_EXPERIENCE_YEARS.get(experience_years, experience_years)
+                    competencies_score += is_matched * (
+                        0.5 + 0.5 * numpy.clip(numpy.nan_to_num(competence_years) / experience_years, 0, 1)
+                    )
+                else:
+                    competencies_score += is_matched
+            score += weights['competencies'] * competencies_score / len(competencies)
+
+        is_city_matched = numpy.zeros(n, dtype=bool)
+        if requirement.work_location_city_id:
+            is_city_matched = index.city_ids == requirement.work_location_city_id
+            score += weights['city'] * is_city_matched
+
+        is_type_of_employment_matched = numpy.zeros(n, dtype=bool)
+        if requirement.type_of_employment_id:
+            rows, _ = index.types_of_employment.get(requirement.type_of_employment_id)
+            is_type_of_employment_matched[rows] = True
+            score += weights['type_of_employment'] * is_type_of_employment_matched
+
+        allowed_rows = numpy.flatnonzero(is_allowed)
+        limit = min(limit, len(allowed_rows))
+        if not limit:
+            return []
+        top = allowed_rows[numpy.argpartition(-score[allowed_rows], limit - 1)[:limit]]
+        top = top[numpy.argsort(-score[top], kind='stable')]
+        return [
+            CvCandidate(
+                cv_id=int(index.cv_ids[row]),
+                score=round(float(score[row]), 4),
+                position_years=None if numpy.isnan(position_years[row]) else float(position_years[row]),
+                competencies_matched_count=int(competencies_matched_count[row]),
+                is_city_matched=bool(is_city_matched[row]),
+                is_type_of_employment_matched=bool(is_type_of_employment_matched[row]),
+            )
+            for row in top
+        ]
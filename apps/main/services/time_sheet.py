@@ -0,0 +1,157 @@
+import logging
+from dataclasses import dataclass, field
+from typing import ClassVar, Dict, Iterator, List, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db import connections, models, transaction
+from django.utils.translation import gettext_lazy as _
+
+from acc.models import User
+from main import models as main_models
+from main.models import permissions as main_permissions
+from main.models.roles import UserRoles
+
+__all__ = [
+    'TimeSheetReportService',
+    'TimeSheetRowsBulkCreateResult',
+    'TimeSheetRowsBulkCreateService',
+]
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TimeSheetRowsBulkCreateResult:
+    created: List[main_models.TimeSheetRow] = field(default_factory=list)
+    errors: Dict[int, Dict[str, List[str]]] = field(default_factory=dict)
+    """{ индекс строки: ошибки }"""
+
+
+@dataclass
+class TimeSheetRowsBulkCreateService:
+    """
+    Пакетное создание строк таймшита по нескольким запросам.
+    Права и связь анкет с требованиями запросов проверяются для всех строк сразу,
+    строки с ошибками пропускаются, остальные создаются
+    """
+    user: User
+
+    BATCH_SIZE: ClassVar[int] = 500
+
+    def create(self, rows: Dict[int, Dict]) -> TimeSheetRowsBulkCreateResult:
+        """
+        rows - { индекс строки: данные строки (request_id, cv_id, date_from, ...) }
+        """
+        result = TimeSheetRowsBulkCreateResult()
+        requests_ids = {row['request_id'] for row in rows.values()}
+        requests = main_models.Request.objects.filter_by_user(self.user).select_related(
+            'module__organization_project'
+        ).in_bulk(requests_ids)
+        requests_cv_ids = set(main_models.RequestRequirementCv.objects.filter(
+            request_requirement__request_id__in=requests.keys(),
+            cv_id__in={row['cv_id'] for row in rows.values()},
+        ).values_list('request_requirement__request_id', 'cv_id').distinct())
+        with UserRoles.cached():
+            requests_allowed_ids = {
+                request_id
+                for request_id, request in requests.items()
+                if main_permissions.request_time_sheet_row_save(main_models.TimeSheetRow(request=request), self.user)
+            }
+
+        for_create = []
+        for i, row in rows.items():
+            instance = main_models.TimeSheetRow(**row)
+            if row['request_id'] not in requests:
+                result.errors[i] = {'request_id': [_('Проектный запрос не найден')]}
+                continue
+            if row['request_id'] not in requests_allowed_ids:
+                result.errors[i] = {'request_id': [_('У вас нет прав')]}
+                continue
+            if (row['request_id'], row['cv_id']) not in requests_cv_ids:
+                result.errors[i] = {
+                    'cv_id': [_(f'Анкета <{row["cv_id"]}> не связана с требованием проектного запроса')]
+                }
+                continue
+            try:
+                instance.clean_fields(exclude=['request', 'cv'])
+            except ValidationError as e:
+                result.errors[i] = e.message_dict
+                continue
+            for_create.append(instance)
+
+        with transaction.atomic():
+            result.created = main_models.TimeSheetRow.objects.bulk_create(for_create, batch_size=self.BATCH_SIZE)
+        logger.debug('TimeSheetRowsBulkCreateService.create', extra={
+            'rows': len(rows), 'created': len(result.created), 'errors': len(result.errors),
+        })
+        return result
+
+
+@dataclass
+class TimeSheetReportService:
+    """
+    Сводный отчет по таймшитам одним SQL запросом: отфильтрованные строки в CTE,
+    сумма `work_time` по `GROUP BY ROLLUP(измерения..., период)` - помимо детальных строк
+    отдаются промежуточные итоги по каждому префиксу измерений и общий итог.
+    У строк итогов незадействованные измерения = None, `grouping` - битовая маска `GROUPING()`
+    """
+    queryset: main_models.TimeSheetRow.QuerySet
+    group_by: List[str]
+    period: Optional[str] = None
+
+    GROUP_BY_COLUMNS: ClassVar[Dict[str, str]] = {
+        'organization_customer': 'request__module__organization_project__organization_customer_id',
+        'organization_project': 'request__module__organization_project_id',
+        'module': 'request__module_id',
+        'request': 'request_id',
+        'cv': 'cv_id',
+    }
+    PERIODS: ClassVar[List[str]] = ['day', 'week', 'month']
+    FETCH_SIZE: ClassVar[int] = 2000
+
+    def __post_init__(self):
+        if unknown := [g for g in self.group_by if g not in self.GROUP_BY_COLUMNS]:
+            raise ValidationError({'group_by': [_(f'Неизвестные измерения: {", ".join(unknown)}')]})
+        if len(set(self.group_by)) != len(self.group_by):
+            raise ValidationError({'group_by': [_('Измерения не должны повторяться')]})
+        if self.period and self.period not in self.PERIODS:
+            raise ValidationError({'period': [_(f'Ожидается одно из: {", ".join(self.PERIODS)}')]})
+
+    def get_columns(self) -> List[str]:
+        return [
+            *[f'{g}_id' for g in self.group_by],
+            *(['period'] if self.period else []),
+            'grouping', 'work_time', 'rows_count',
+        ]
+
+    def get_sql(self) -> Tuple[str, List]:
+        filtered_sql, filtered_params = self.queryset.order_by().values(
+            'work_time', 'date_from',
+            **{f'g{i}': models.F(self.GROUP_BY_COLUMNS[g]) for i, g in enumerate(self.group_by)},
+        ).query.sql_with_params()
+        dimensions = [f'r.g{i}' for i in range(len(self.group_by))]
+        if self.period:
+            # период подставляется литералом (он из PERIODS): выражения в SELECT, GROUPING() и ROLLUP
+            # должны совпадать, с разными плейсхолдерами Postgres их не сопоставит
+            dimensions.append(f"date_trunc('{self.period}', r.date_from)::date")
+        if dimensions:
+            select = ', '.join(dimensions)
+            sql = (
+                f'WITH r AS ({filtered_sql}) '
+                f'SELECT {select}, GROUPING({select}), SUM(r.work_time), COUNT(*) '
+                f'FROM r GROUP BY ROLLUP({select}) '
+                f'ORDER BY {", ".join(f"{i} NULLS LAST" for i in range(1, len(dimensions) + 1))}'
+            )
+        else:
+            sql = f'WITH r AS ({filtered_sql}) SELECT 0, SUM(r.work_time), COUNT(*) FROM r'
+        return sql, list(filtered_params)
+
+    def iterate(self) -> Iterator[Tuple]:
+        """
+        Строки отчета в порядке `get_columns()`, читаются курсором на сервере порциями
+        """
+        sql, params = self.get_sql()
+        with connections[self.queryset.db].chunked_cursor() as cursor:
+            cursor.execute(sql, params)
+            while rows := cursor.fetchmany(self.FETCH_SIZE):
+                yield from rows
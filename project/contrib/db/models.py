@@ -1,11 +1,21 @@
 from typing import Optional, Callable
 
 from django.db import models
+from django.contrib.postgres.fields import DateRangeField
 from django.forms.models import model_to_dict
 from django.core.exceptions import PermissionDenied
 from django.utils.translation import gettext_lazy as _
 
 
+class DateRangeFromTo(models.Func):
+    """
+    `daterange(date_from, date_to, '[]')`, NULL - открытая граница
+    """
+    function = 'daterange'
+    template = "%(function)s(%(expressions)s, '[]')"
+    output_field = DateRangeField()
+
+
 class DatesModelBase(models.Model):
     class Meta:
         abstract = True
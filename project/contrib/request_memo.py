@@ -0,0 +1,31 @@
+import contextlib
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from project.contrib.middleware.request import get_request
+
+
+class RequestMemo:
+    """
+    Словарь, который живет в рамках HTTP запроса (атрибут request)
+    или блока `with memo.scope():` вне запроса (команды, задачи). Вне обоих - None
+    """
+
+    def __init__(self, name: str):
+        self.request_attr = f'_{name}'
+        self._var: ContextVar[Optional[Dict]] = ContextVar(name, default=None)
+
+    def get(self) -> Optional[Dict]:
+        if (request := get_request()) is not None:
+            if not hasattr(request, self.request_attr):
+                setattr(request, self.request_attr, {})
+            return getattr(request, self.request_attr)
+        return self._var.get()
+
+    @contextlib.contextmanager
+    def scope(self):
+        token = self._var.set({})
+        try:
+            yield
+        finally:
+            self._var.reset(token)
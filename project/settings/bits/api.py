@@ -41,3 +41,13 @@ SWAGGER_SETTINGS = {
         ],
     ]
 }
+
+API_EXPORT_CHUNK_SIZE = 2000
+"""строк на порцию серверного курсора при выгрузке списков"""
+API_EXPORT_XLSX_MAX_ROWS = 200_000
+"""xlsx собирается целиком до отдачи первого байта, больше - только csv.
+Для `.../export` uwsgi поднимает harakiri до `UWSGI_EXPORT_HARAKIRI` (`--route` в docker/entry-point)"""
+
+API_PAGINATION_TOTAL_CACHE_TIMEOUT = 60 * 60
+API_PAGINATION_TOTAL_ESTIMATE_THRESHOLD = 100_000
+"""выше по оценке планировщика итог списка не считается точно"""
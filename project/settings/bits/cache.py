@@ -31,8 +31,14 @@ CACHEOPS = {
     'auth.*': {'ops': 'all'},
     'acc.*': {'ops': 'all'},
     'cv.*': {'ops': 'all'},
-    'cv.CvInfo': None,
     'dictionary.*': {'ops': 'all'},
     'main.*': {'ops': 'all'},
     'sorl.thumbnail.*': {'ops': 'all'},
 }
+
+MAIN_USER_VISIBILITY_SCOPE_CACHE_TIMEOUT = 60 * 60
+
+CV_FEATURES_INDEX_MAX_AGE = 60
+
+DICTIONARY_COMPETENCE_SUBTREE_CACHE_TIMEOUT = 60 * 60 * 24
+DICTIONARY_COMPETENCE_TREE_CACHE_TIMEOUT = 60 * 60 * 24
@@ -1,5 +1,5 @@
 from project.settings.bits import redis as redis_settings
-from project.settings import TIME_ZONE
+from project.settings import TIME_ZONE, DJANGO_TEST
 
 CELERY = {
     'broker_url': 'redis://%s:%s/%s' % (
@@ -18,3 +18,8 @@ CELERY = {
     'result_expires': 60 * 60 * 4,
     'beat_scheduler': 'django_celery_beat.schedulers.DatabaseScheduler',
 }
+
+CV_TIME_SLOTS_SYNC_ASYNC = not DJANGO_TEST
+CV_TIME_SLOTS_SYNC_COUNTDOWN = 2
+CV_TIME_SLOTS_SYNC_SCHEDULED_TTL = 60 * 5
+CV_TIME_SLOTS_SYNC_MAX_RETRIES = 5